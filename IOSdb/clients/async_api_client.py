@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Optional
+
+import httpx
+
+from IOSdb.config.settings import IOSApiSettings, load_settings
+
+
+class AsyncIOSApiClient:
+    """Cliente IOS con httpx.AsyncClient sobre un event loop propio en un hilo aparte.
+
+    Las tasks de Prefect siguen siendo sincronicas: post_json_many bloquea el hilo
+    llamador mientras el loop envia los payloads. Como todas las tasks comparten este
+    loop, el limite global de requests en vuelo, el rate limit y el token son comunes
+    a todas las sucursales.
+    """
+
+    def __init__(
+        self,
+        settings: IOSApiSettings,
+        max_in_flight: int,
+        rate_limit_per_second: int = 0,
+    ) -> None:
+        self._settings = settings
+        self._max_in_flight = max(1, max_in_flight)
+        self._rate_limit_per_second = rate_limit_per_second
+        self._token: Optional[str] = None
+        self._next_request_at = 0.0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever,
+            name="iosdb-async-http",
+            daemon=True,
+        )
+        self._thread.start()
+        self._run(self._open())
+
+    async def _open(self) -> None:
+        # Semaforos, locks y el cliente httpx quedan atados al loop del hilo.
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self._max_in_flight,
+                max_keepalive_connections=self._max_in_flight,
+            )
+        )
+        self._in_flight = asyncio.Semaphore(self._max_in_flight)
+        self._token_lock = asyncio.Lock()
+        self._rate_lock = asyncio.Lock()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def get_token(self, stale_token: Optional[str] = None) -> str:
+        # Con stale_token solo se renueva si nadie lo renovo mientras se esperaba el
+        # lock, asi varios 401 simultaneos disparan un unico login.
+        async with self._token_lock:
+            if self._token and self._token != stale_token:
+                return self._token
+
+            response = await self._client.post(
+                self._settings.login_url,
+                json={
+                    "username": self._settings.username,
+                    "company": self._settings.company,
+                    "password": self._settings.password,
+                },
+                timeout=self._settings.login_timeout_seconds,
+            )
+            response.raise_for_status()
+
+            token = response.json().get("token_api", "").strip()
+            if not token:
+                raise RuntimeError("La autenticacion IOS no devolvio token_api")
+
+            self._token = token
+            return token
+
+    async def _wait_rate_limit(self) -> None:
+        if self._rate_limit_per_second <= 0:
+            return
+        async with self._rate_lock:
+            now = self._loop.time()
+            wait_seconds = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + 1.0 / self._rate_limit_per_second
+        if wait_seconds > 0:
+            await asyncio.sleep(wait_seconds)
+
+    async def post_json(
+        self,
+        url: str,
+        payload: list[dict[str, Any]],
+        timeout_seconds: Optional[int] = None,
+    ) -> None:
+        async with self._in_flight:
+            token = await self.get_token()
+            await self._wait_rate_limit()
+            response = await self._client.post(
+                url,
+                json=payload,
+                headers={"Authorization": f"Bearer {token}"},
+                timeout=timeout_seconds or self._settings.request_timeout_seconds,
+            )
+
+            if response.status_code == 401:
+                token = await self.get_token(stale_token=token)
+                await self._wait_rate_limit()
+                response = await self._client.post(
+                    url,
+                    json=payload,
+                    headers={"Authorization": f"Bearer {token}"},
+                    timeout=timeout_seconds or self._settings.request_timeout_seconds,
+                )
+
+            response.raise_for_status()
+
+    async def _post_many(
+        self,
+        url: str,
+        payloads: list[list[dict[str, Any]]],
+        max_in_flight: int,
+    ) -> list[Optional[Exception]]:
+        caller_slots = asyncio.Semaphore(max(1, max_in_flight))
+
+        async def send(payload: list[dict[str, Any]]) -> Optional[Exception]:
+            async with caller_slots:
+                try:
+                    await self.post_json(url, payload)
+                except Exception as exc:
+                    return exc
+                return None
+
+        return await asyncio.gather(*(send(payload) for payload in payloads))
+
+    def post_json_many(
+        self,
+        url: str,
+        payloads: list[list[dict[str, Any]]],
+        max_in_flight: int,
+    ) -> list[Optional[Exception]]:
+        """Envia payloads con hasta max_in_flight en vuelo para este llamador.
+
+        Devuelve, en el orden de payloads, None si el envio fue OK o la excepcion.
+        """
+        if not payloads:
+            return []
+        return self._run(self._post_many(url, payloads, max_in_flight))
+
+
+_client: Optional[AsyncIOSApiClient] = None
+_client_lock = threading.Lock()
+
+
+def get_async_api_client() -> AsyncIOSApiClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                settings = load_settings()
+                _client = AsyncIOSApiClient(
+                    settings.api,
+                    max_in_flight=settings.runtime.http_max_in_flight,
+                    rate_limit_per_second=settings.runtime.http_rate_limit_per_second,
+                )
+    return _client
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from IOSdb.config.settings import load_settings
+
+FINGERPRINT_DB_NAME = "stock_fingerprints.sqlite3"
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS stock_fingerprint (
+    entity_key TEXT NOT NULL,
+    branch_id TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    sent_at TEXT NOT NULL,
+    PRIMARY KEY (entity_key, branch_id, product_id)
+);
+CREATE TABLE IF NOT EXISTS stock_full_sync (
+    entity_key TEXT NOT NULL,
+    branch_id TEXT NOT NULL,
+    synced_at TEXT NOT NULL,
+    PRIMARY KEY (entity_key, branch_id)
+);
+"""
+
+
+def payload_fingerprint(item: dict[str, Any]) -> str:
+    encoded = json.dumps(item, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.md5(encoded.encode("utf-8")).hexdigest()
+
+
+class StockFingerprintStore:
+    """Hash del ultimo payload enviado por (entity_key, branch_id, product_id) en SQLite.
+
+    Cada llamada abre su propia conexion, asi las tasks de sucursal pueden usarlo
+    desde hilos distintos; WAL y busy_timeout serializan las escrituras concurrentes.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA_SQL)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._path, timeout=30)
+
+    def load(self, entity_key: str, branch_id: str) -> dict[str, str]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT product_id, fingerprint FROM stock_fingerprint WHERE entity_key = ? AND branch_id = ?",
+                (entity_key, branch_id),
+            ).fetchall()
+        return dict(rows)
+
+    def needs_full_sync(self, entity_key: str, branch_id: str, max_age_days: int) -> bool:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT synced_at FROM stock_full_sync WHERE entity_key = ? AND branch_id = ?",
+                (entity_key, branch_id),
+            ).fetchone()
+        if row is None:
+            return True
+        return datetime.fromisoformat(row[0]) < datetime.now() - timedelta(days=max_age_days)
+
+    def save(
+        self,
+        entity_key: str,
+        branch_id: str,
+        sent: dict[str, str],
+        current_ids: Iterable[str],
+        full_sync: bool,
+    ) -> None:
+        """Guarda los hashes enviados OK y borra los de productos que ya no vienen en origen."""
+        now = datetime.now().isoformat(timespec="seconds")
+        current = set(current_ids)
+        with closing(self._connect()) as conn, conn:
+            stored_ids = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT product_id FROM stock_fingerprint WHERE entity_key = ? AND branch_id = ?",
+                    (entity_key, branch_id),
+                )
+            ]
+            conn.executemany(
+                "DELETE FROM stock_fingerprint WHERE entity_key = ? AND branch_id = ? AND product_id = ?",
+                [(entity_key, branch_id, product_id) for product_id in stored_ids if product_id not in current],
+            )
+            conn.executemany(
+                """
+                INSERT INTO stock_fingerprint (entity_key, branch_id, product_id, fingerprint, sent_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (entity_key, branch_id, product_id) DO UPDATE
+                SET fingerprint = excluded.fingerprint, sent_at = excluded.sent_at
+                """,
+                [(entity_key, branch_id, product_id, fingerprint, now) for product_id, fingerprint in sent.items()],
+            )
+            if full_sync:
+                conn.execute(
+                    """
+                    INSERT INTO stock_full_sync (entity_key, branch_id, synced_at)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT (entity_key, branch_id) DO UPDATE SET synced_at = excluded.synced_at
+                    """,
+                    (entity_key, branch_id, now),
+                )
+
+
+_store: Optional[StockFingerprintStore] = None
+_store_lock = threading.Lock()
+
+
+def get_fingerprint_store() -> StockFingerprintStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = StockFingerprintStore(load_settings().runtime.state_dir / FINGERPRINT_DB_NAME)
+    return _store
@@ -52,6 +52,27 @@ def _get_int_env(*keys: str, default: int) -> int:
         raise RuntimeError(f"Valor invalido para {joined}: {raw_value}") from exc
 
 
+def _get_http_engine() -> str:
+    value = _get_env("IOSDB_HTTP_ENGINE", default="sync").lower()
+    if value not in ("sync", "async"):
+        raise RuntimeError(f"Valor invalido para IOSDB_HTTP_ENGINE: {value}")
+    return value
+
+
+def _get_stock_sync_mode() -> str:
+    value = _get_env("IOSDB_STOCK_SYNC_MODE", default="full").lower()
+    if value not in ("full", "delta"):
+        raise RuntimeError(f"Valor invalido para IOSDB_STOCK_SYNC_MODE: {value}")
+    return value
+
+
+def _get_stock_extraction() -> str:
+    value = _get_env("IOSDB_STOCK_EXTRACTION", default="per_branch").lower()
+    if value not in ("per_branch", "grouped"):
+        raise RuntimeError(f"Valor invalido para IOSDB_STOCK_EXTRACTION: {value}")
+    return value
+
+
 @dataclass(frozen=True)
 class SQLServerSettings:
     server: str
@@ -101,7 +122,18 @@ class RuntimeSettings:
     product_batch_size: int
     max_workers: int
     max_retries: int
+    http_engine: str
+    http_max_in_flight: int
+    http_branch_in_flight: int
+    http_rate_limit_per_second: int
+    stock_sync_mode: str
+    full_resync_days: int
+    stream_queue_batches: int
+    stock_extraction: str
+    stock_branch_groups: int
+    group_senders: int
     logs_dir: Path
+    state_dir: Path
     discord_webhook: str
 
 
@@ -172,7 +204,18 @@ def load_settings() -> IOSdbSettings:
         product_batch_size=_get_int_env("IOSDB_PRODUCT_BATCH_SIZE", default=100),
         max_workers=_get_int_env("IOSDB_MAX_WORKERS", default=10),
         max_retries=_get_int_env("IOSDB_MAX_RETRIES", default=2),
+        http_engine=_get_http_engine(),
+        http_max_in_flight=_get_int_env("IOSDB_HTTP_MAX_IN_FLIGHT", default=8),
+        http_branch_in_flight=_get_int_env("IOSDB_HTTP_BRANCH_IN_FLIGHT", default=4),
+        http_rate_limit_per_second=_get_int_env("IOSDB_HTTP_RATE_LIMIT_PER_SECOND", default=0),
+        stock_sync_mode=_get_stock_sync_mode(),
+        full_resync_days=_get_int_env("IOSDB_FULL_RESYNC_DAYS", default=7),
+        stream_queue_batches=_get_int_env("IOSDB_STREAM_QUEUE_BATCHES", default=4),
+        stock_extraction=_get_stock_extraction(),
+        stock_branch_groups=_get_int_env("IOSDB_STOCK_BRANCH_GROUPS", default=1),
+        group_senders=_get_int_env("IOSDB_GROUP_SENDERS", default=4),
         logs_dir=Path(_get_env("IOSDB_LOGS_DIR", default=str(project_root / "logs"))),
+        state_dir=Path(_get_env("IOSDB_STATE_DIR", default=str(project_root / "state"))),
         discord_webhook=_get_env("IOSDB_DISCORD_WEBHOOK", "DISCORD_WEBHOOK"),
     )
 
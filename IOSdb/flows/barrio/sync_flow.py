@@ -6,7 +6,7 @@ from prefect import flow
 
 from IOSdb.config.settings import load_settings
 from IOSdb.flows.barrio.query import GET_BRANCHES, GET_STOCK
-from IOSdb.flows.stock_shared import StockFlowDefinition, run_branch_stock_flow
+from IOSdb.flows.stock_shared import StockFlowDefinition, build_branch_group_query, run_branch_stock_flow
 
 
 DEFINITION = StockFlowDefinition(
@@ -14,14 +14,15 @@ DEFINITION = StockFlowDefinition(
     entity_label="Barrio",
     branches_query=GET_BRANCHES,
     stock_query=GET_STOCK,
+    group_stock_query=build_branch_group_query(GET_STOCK),
     stock_url=load_settings().api.stock_url,
     failed_prefix="barrio_failed",
 )
 
 
 @flow(name="iosdb_barrio_sync", log_prints=True)
-def sync_all(max_workers: Optional[int] = None) -> dict[str, int]:
-    return run_branch_stock_flow(DEFINITION, max_workers=max_workers)
+def sync_all(max_workers: Optional[int] = None, full_resync: bool = False) -> dict[str, int]:
+    return run_branch_stock_flow(DEFINITION, max_workers=max_workers, full_resync=full_resync)
 
 
 if __name__ == "__main__":
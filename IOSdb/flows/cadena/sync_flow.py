@@ -18,8 +18,8 @@ DEFINITION = StockFlowDefinition(
 
 
 @flow(name="iosdb_cadena_sync", log_prints=True)
-def sync_all() -> dict[str, int]:
-    return run_chain_stock_flow(DEFINITION)
+def sync_all(full_resync: bool = False) -> dict[str, int]:
+    return run_chain_stock_flow(DEFINITION, full_resync=full_resync)
 
 
 if __name__ == "__main__":
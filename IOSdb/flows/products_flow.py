@@ -5,10 +5,10 @@ from typing import Any, Iterable
 
 from prefect import flow, get_run_logger, task
 
-from IOSdb.clients.api_client import get_api_client
 from IOSdb.clients.postgres import open_postgres_connection
 from IOSdb.clients.sqlserver import open_sqlserver_connection
 from IOSdb.config.settings import load_settings
+from IOSdb.flows.retry_utils import post_with_bisection
 
 QUERY_SQLSERVER_COMPARE = """
 WITH ArticulosProcesados AS (
@@ -217,20 +217,33 @@ def fetch_sqlserver_product_details(ids: list[str]) -> dict[str, dict[str, Any]]
 def send_products(items: list[dict[str, Any]], label: str) -> dict[str, int]:
     logger = get_run_logger()
     settings = load_settings()
-    client = get_api_client()
     failed: list[dict[str, Any]] = []
     batches = list(_chunked_payload(items, settings.runtime.product_batch_size))
+    batch_errors, isolated, failed_groups = post_with_bisection(
+        settings.api.products_url, batches, lambda products: products
+    )
 
-    for batch_index, batch in enumerate(batches, start=1):
-        try:
-            client.post_json(settings.api.products_url, batch)
+    for batch_index, exc in enumerate(batch_errors, start=1):
+        if exc is None:
             logger.info("[Productos | %s] Batch %s/%s OK", label, batch_index, len(batches))
-        except Exception as exc:
-            logger.error("[Productos | %s] Batch %s fallo: %s", label, batch_index, exc)
-            response = getattr(exc, "response", None)
-            if response is not None:
-                logger.error("[Productos | %s] Detalle respuesta: %s", label, response.text)
-            failed.extend(batch)
+        else:
+            logger.warning(
+                "[Productos | %s] Batch %s fallo: %s",
+                label,
+                batch_index,
+                exc,
+            )
+
+    for item, item_exc in isolated:
+        logger.error("[Productos | %s] Producto %s fallo: %s", label, item.get("id", "?"), item_exc)
+        response = getattr(item_exc, "response", None)
+        if response is not None:
+            logger.error("[Productos | %s] Detalle respuesta: %s", label, response.text)
+        failed.append(item)
+
+    for group, group_exc in failed_groups:
+        logger.error("[Productos | %s] %s productos fallidos sin partir: %s", label, len(group), group_exc)
+        failed.extend(group)
 
     return {"total": len(items), "sent": len(items) - len(failed), "failed": len(failed)}
 
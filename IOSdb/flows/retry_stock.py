@@ -8,6 +8,7 @@ from prefect import flow, get_run_logger, task
 
 from IOSdb.clients.api_client import get_api_client
 from IOSdb.config.settings import load_settings
+from IOSdb.flows.retry_utils import strip_error_detail
 
 
 def _find_failed_files(logs_dir: Path) -> list[Path]:
@@ -38,7 +39,7 @@ def retry_file(filepath: str) -> bool:
     target_path = Path(filepath)
 
     with target_path.open("r", encoding="utf-8") as handle:
-        payload: list[dict[str, Any]] = json.load(handle)
+        payload: list[dict[str, Any]] = strip_error_detail(json.load(handle))
 
     try:
         client.post_json(load_settings().api.stock_url, payload)
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, Callable, Optional
 
 from IOSdb.clients.api_client import get_api_client
 from IOSdb.config.settings import load_settings
 
+ERROR_DETAIL_KEY = "_error"
+
 
 def get_token() -> str:
     return get_api_client().get_token()
@@ -17,3 +19,101 @@ def send_batch(batch: Any, token: str | None = None, url: str | None = None) ->
     if not url:
         url = load_settings().api.stock_url
     client.post_json(url, payload)
+
+
+def post_payloads(url: str, payloads: list[list[dict[str, Any]]]) -> list[Optional[Exception]]:
+    """Envia payloads y devuelve, en orden, None o la excepcion de cada envio."""
+    runtime = load_settings().runtime
+    if runtime.http_engine == "async":
+        # Import diferido: httpx solo hace falta con IOSDB_HTTP_ENGINE=async.
+        from IOSdb.clients.async_api_client import get_async_api_client
+
+        return get_async_api_client().post_json_many(url, payloads, runtime.http_branch_in_flight)
+
+    api_client = get_api_client()
+    errors: list[Optional[Exception]] = []
+    for payload in payloads:
+        try:
+            api_client.post_json(url, payload)
+        except Exception as exc:
+            errors.append(exc)
+        else:
+            errors.append(None)
+    return errors
+
+
+def is_item_rejection(exc: Exception) -> bool:
+    """True si la API rechazo el contenido del batch (4xx salvo 401/403/429).
+
+    Timeouts, errores de conexion, 5xx y errores de auth o rate limit no dependen de
+    los items enviados: partir el batch solo multiplicaria los requests.
+    """
+    status_code = getattr(getattr(exc, "response", None), "status_code", None)
+    return status_code is not None and 400 <= status_code < 500 and status_code not in (401, 403, 429)
+
+
+def post_with_bisection(
+    url: str,
+    batches: list[list[dict[str, Any]]],
+    build_payload: Callable[[list[dict[str, Any]]], list[dict[str, Any]]],
+) -> tuple[
+    list[Optional[Exception]],
+    list[tuple[dict[str, Any], Exception]],
+    list[tuple[list[dict[str, Any]], Exception]],
+]:
+    """Envia batches y aisla los items rechazados partiendo en mitades los que fallan.
+
+    Solo se parten los grupos con rechazo de contenido (ver is_item_rejection); cada
+    ronda reenvia juntas las mitades de todos ellos, asi k items malos cuestan
+    O(k log n) requests. Si fallan todos los batches del primer envio (mas de uno) se
+    asume caida de la API y no se parte nada. Devuelve el resultado del primer envio
+    de cada batch, los (item, excepcion) que fallan solos y los (grupo, excepcion)
+    que quedaron fallidos completos sin partir.
+    """
+    batch_errors = post_payloads(url, [build_payload(batch) for batch in batches])
+    pending = [(batch, exc) for batch, exc in zip(batches, batch_errors) if exc is not None]
+
+    isolated: list[tuple[dict[str, Any], Exception]] = []
+    failed_groups: list[tuple[list[dict[str, Any]], Exception]] = []
+    if len(batches) > 1 and len(pending) == len(batches):
+        return batch_errors, isolated, pending
+
+    while pending:
+        halves: list[list[dict[str, Any]]] = []
+        for group, exc in pending:
+            if not is_item_rejection(exc):
+                failed_groups.append((group, exc))
+                continue
+            if len(group) == 1:
+                isolated.append((group[0], exc))
+                continue
+            middle = len(group) // 2
+            halves.extend([group[:middle], group[middle:]])
+        if not halves:
+            break
+        errors = post_payloads(url, [build_payload(half) for half in halves])
+        pending = [(half, exc) for half, exc in zip(halves, errors) if exc is not None]
+
+    return batch_errors, isolated, failed_groups
+
+
+def describe_error(exc: Exception) -> dict[str, Any]:
+    response = getattr(exc, "response", None)
+    return {
+        "error": str(exc),
+        "status_code": getattr(response, "status_code", None),
+        "body": response.text if response is not None else None,
+    }
+
+
+def with_error_detail(item: dict[str, Any], exc: Exception) -> dict[str, Any]:
+    return {**item, ERROR_DETAIL_KEY: describe_error(exc)}
+
+
+def strip_error_detail(payload: Any) -> Any:
+    """Quita el detalle de error agregado a los items antes de reenviar un archivo de fallidos."""
+    if isinstance(payload, list):
+        return [strip_error_detail(item) for item in payload]
+    if isinstance(payload, dict):
+        return {key: strip_error_detail(value) for key, value in payload.items() if key != ERROR_DETAIL_KEY}
+    return payload
@@ -1,16 +1,25 @@
 from __future__ import annotations
 
+import contextvars
+import itertools
 import json
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from datetime import date, datetime
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Iterator, Optional
 
 from prefect import flow, get_run_logger, task
 
-from IOSdb.clients.api_client import get_api_client
+from IOSdb.clients.fingerprint_store import get_fingerprint_store, payload_fingerprint
 from IOSdb.clients.sqlserver import open_sqlserver_connection
 from IOSdb.config.settings import load_settings
+from IOSdb.flows.retry_utils import post_with_bisection, with_error_detail
+
+QUEUE_PUT_TIMEOUT_SECONDS = 0.5
+BRANCH_IDS_PLACEHOLDER = "{branch_ids}"
 
 
 @dataclass(frozen=True)
@@ -21,6 +30,26 @@ class StockFlowDefinition:
     stock_query: str
     stock_url: str
     failed_prefix: str
+    group_stock_query: Optional[str] = None
+
+
+def build_branch_group_query(stock_query: str) -> str:
+    """Adapta la consulta de stock por sucursal para leer varias sucursales en una sola ejecucion.
+
+    Cada filtro `C_SUCU_EMPR = ?` pasa a `C_SUCU_EMPR IN ({branch_ids})` y el ORDER BY
+    final se antepone con id_branch_office, asi las filas de cada sucursal llegan juntas.
+    """
+    filter_count = stock_query.count("C_SUCU_EMPR = ?")
+    if filter_count == 0:
+        raise ValueError("La consulta de stock no filtra por C_SUCU_EMPR = ?")
+    query = stock_query.replace("C_SUCU_EMPR = ?", f"C_SUCU_EMPR IN ({BRANCH_IDS_PLACEHOLDER})")
+    if "?" in query:
+        raise ValueError("La consulta de stock tiene parametros que no son de sucursal")
+
+    head, separator, order_by = query.rpartition("ORDER BY")
+    if not separator or ")" in order_by:
+        raise ValueError("La consulta de stock no termina con un ORDER BY")
+    return f"{head}ORDER BY id_branch_office, {order_by.lstrip()}"
 
 
 def format_date(value: Any) -> str:
@@ -73,11 +102,6 @@ def build_stock_payload(row: Any) -> dict[str, Any]:
     }
 
 
-def _chunked(items: list[dict[str, Any]], size: int):
-    for index in range(0, len(items), size):
-        yield items[index : index + size]
-
-
 def _failed_file_path(prefix: str, suffix: str) -> Path:
     settings = load_settings()
     settings.runtime.logs_dir.mkdir(parents=True, exist_ok=True)
@@ -90,6 +114,263 @@ def _write_failed_payload(path: Path, payload: list[dict[str, Any]]) -> None:
         json.dump(payload, handle, ensure_ascii=False, indent=2)
 
 
+def _branch_payload(branch_id: int, branch_name: str, products: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    return [
+        {
+            "branch_office": {
+                "id": str(branch_id),
+                "name": branch_name.strip() if branch_name else "",
+            },
+            "products": products,
+        }
+    ]
+
+
+def _iter_stock_item_chunks(query: str, params: tuple[Any, ...], fetch_size: int) -> Iterator[list[dict[str, Any]]]:
+    conn = open_sqlserver_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, *params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                return
+            yield [build_stock_payload(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def _iter_branch_item_chunks(query: str, fetch_size: int) -> Iterator[list[tuple[int, dict[str, Any]]]]:
+    conn = open_sqlserver_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                return
+            yield [(int(row.id_branch_office), build_stock_payload(row)) for row in rows]
+    finally:
+        conn.close()
+
+
+def _iter_in_background(source: Iterator[Any], max_queued: int, thread_name: str) -> Iterator[Any]:
+    """Consume source en un hilo lector y entrega sus elementos por una cola acotada.
+
+    Un error del lector se relanza en el consumidor; si el consumidor corta antes,
+    el lector se detiene sin quedar bloqueado en la cola.
+    """
+    items: "queue.Queue[tuple[str, Any]]" = queue.Queue(maxsize=max(1, max_queued))
+    stop = threading.Event()
+
+    def put(kind: str, payload: Any) -> bool:
+        while not stop.is_set():
+            try:
+                items.put((kind, payload), timeout=QUEUE_PUT_TIMEOUT_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in source:
+                if not put("item", item):
+                    return
+        except BaseException as exc:  # noqa: BLE001 - se relanza en el consumidor
+            put("error", exc)
+            return
+        finally:
+            # Cierra el cursor y la conexion ya, sin esperar al GC del generador.
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()
+        put("done", None)
+
+    reader = threading.Thread(target=produce, name=thread_name, daemon=True)
+    reader.start()
+    try:
+        while True:
+            kind, payload = items.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise payload
+            yield payload
+    finally:
+        stop.set()
+        reader.join()
+
+
+class _BranchFeed:
+    """Cola acotada entre el lector de un grupo de sucursales y el envio de una de ellas."""
+
+    def __init__(self, max_queued: int) -> None:
+        self._items: "queue.Queue[Optional[list[dict[str, Any]]]]" = queue.Queue(maxsize=max(1, max_queued))
+        self._finished = threading.Event()
+        self._cancelled = threading.Event()
+
+    def bind(self, sender: Future) -> None:
+        # El fin del envio se marca desde el future: si falla antes de pedir el primer
+        # chunk, el generador nunca arranca y su finally no correria.
+        sender.add_done_callback(lambda _: self._finished.set())
+
+    def put(self, chunk: Optional[list[dict[str, Any]]]) -> None:
+        # Si el envio ya termino (por error) los chunks restantes se descartan.
+        while not self._finished.is_set():
+            try:
+                self._items.put(chunk, timeout=QUEUE_PUT_TIMEOUT_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def close(self) -> None:
+        self.put(None)
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def iter_chunks(self) -> Iterator[list[dict[str, Any]]]:
+        try:
+            while True:
+                try:
+                    chunk = self._items.get(timeout=QUEUE_PUT_TIMEOUT_SECONDS)
+                except queue.Empty:
+                    if self._cancelled.is_set():
+                        raise RuntimeError("Lectura del grupo de sucursales interrumpida")
+                    continue
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self._finished.set()
+
+
+def _stream_stock(
+    definition: StockFlowDefinition,
+    *,
+    chunks: Iterator[list[dict[str, Any]]],
+    branch_key: str,
+    build_payload: Callable[[list[dict[str, Any]]], list[dict[str, Any]]],
+    tag: str,
+    full_resync: bool,
+) -> dict[str, Any]:
+    """Envia los chunks de stock en batches a medida que se completan.
+
+    chunks viene de una cola acotada, asi en memoria quedan a lo sumo
+    IOSDB_STREAM_QUEUE_BATCHES chunks mas los batches del envio en curso. En modo
+    delta solo se envian los productos cuyo payload cambio desde el ultimo envio OK;
+    cada IOSDB_FULL_RESYNC_DAYS (o con full_resync) se reenvia todo.
+    """
+    logger = get_run_logger()
+    runtime = load_settings().runtime
+    delta = runtime.stock_sync_mode == "delta"
+    full_sync = True
+    stored: dict[str, str] = {}
+
+    # Con el engine async se juntan varios batches por envio para tenerlos en vuelo a la vez.
+    group_size = runtime.http_branch_in_flight if runtime.http_engine == "async" else 1
+    fingerprints: dict[str, str] = {}
+    sent_fingerprints: dict[str, str] = {}
+    failed: list[dict[str, Any]] = []
+    stats = {"total": 0, "to_send": 0, "sent": 0, "batches": 0}
+    pending_items: list[dict[str, Any]] = []
+    pending_batches: list[list[dict[str, Any]]] = []
+
+    def flush() -> None:
+        batch_errors, isolated, failed_groups = post_with_bisection(
+            definition.stock_url, pending_batches, build_payload
+        )
+        for exc in batch_errors:
+            stats["batches"] += 1
+            if exc is None:
+                logger.info("%s Batch %s OK", tag, stats["batches"])
+            else:
+                logger.warning("%s Batch %s fallo: %s", tag, stats["batches"], exc)
+
+        failed_ids = {item["product_id"] for item, _ in isolated}
+        for item, item_exc in isolated:
+            logger.error("%s Producto %s fallo: %s", tag, item.get("product_id", "?"), item_exc)
+            response = getattr(item_exc, "response", None)
+            if response is not None:
+                logger.error("%s Detalle respuesta: %s", tag, response.text)
+            failed.append(with_error_detail(item, item_exc))
+
+        for group, group_exc in failed_groups:
+            logger.error("%s %s productos fallidos sin partir: %s", tag, len(group), group_exc)
+            for item in group:
+                failed_ids.add(item["product_id"])
+                failed.append(with_error_detail(item, group_exc))
+
+        for batch in pending_batches:
+            for item in batch:
+                if item["product_id"] in failed_ids:
+                    continue
+                stats["sent"] += 1
+                if delta:
+                    sent_fingerprints[item["product_id"]] = fingerprints[item["product_id"]]
+        pending_batches.clear()
+
+    try:
+        # Dentro del try: si el store falla, chunks se cierra y el lector no queda colgado.
+        if delta:
+            store = get_fingerprint_store()
+            full_sync = full_resync or store.needs_full_sync(
+                definition.entity_key, branch_key, runtime.full_resync_days
+            )
+            if not full_sync:
+                stored = store.load(definition.entity_key, branch_key)
+
+        for chunk in chunks:
+            stats["total"] += len(chunk)
+            for item in chunk:
+                if delta:
+                    fingerprint = payload_fingerprint(item)
+                    fingerprints[item["product_id"]] = fingerprint
+                    if not full_sync and stored.get(item["product_id"]) == fingerprint:
+                        continue
+                pending_items.append(item)
+                stats["to_send"] += 1
+                if len(pending_items) >= runtime.batch_size:
+                    pending_batches.append(pending_items)
+                    pending_items = []
+                    if len(pending_batches) >= group_size:
+                        flush()
+        if pending_items:
+            pending_batches.append(pending_items)
+        if pending_batches:
+            flush()
+    finally:
+        chunks.close()
+
+    if delta:
+        # Los fallidos salen del store para que la proxima corrida los vuelva a enviar.
+        failed_ids = {item["product_id"] for item in failed}
+        store.save(
+            definition.entity_key,
+            branch_key,
+            sent=sent_fingerprints,
+            current_ids=[product_id for product_id in fingerprints if product_id not in failed_ids],
+            full_sync=full_sync,
+        )
+
+    logger.info(
+        "%s %s items obtenidos | enviados: %s | sin cambios: %s | fallidos: %s | batches: %s",
+        tag,
+        stats["total"],
+        stats["sent"],
+        stats["total"] - stats["to_send"],
+        len(failed),
+        stats["batches"],
+    )
+    return {
+        "total": stats["total"],
+        "sent": stats["sent"],
+        "unchanged": stats["total"] - stats["to_send"],
+        "failed": failed,
+    }
+
+
 @task
 def fetch_branches_task(branches_query: str, entity_label: str) -> list[tuple[int, str]]:
     logger = get_run_logger()
@@ -108,108 +389,27 @@ def fetch_branches_task(branches_query: str, entity_label: str) -> list[tuple[in
     return branches
 
 
-@task(retries=2, retry_delay_seconds=30)
-def process_branch_stock_task(
+def _send_branch_stock(
     definition: StockFlowDefinition,
     branch_id: int,
     branch_name: str,
+    chunks: Iterator[list[dict[str, Any]]],
+    full_resync: bool,
 ) -> dict[str, Any]:
     logger = get_run_logger()
-    settings = load_settings()
-
-    logger.info("[%s | %s] Consultando SQL...", definition.entity_label, branch_name)
-    conn = open_sqlserver_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute(definition.stock_query, branch_id, branch_id, branch_id, branch_id)
-        rows = cursor.fetchall()
-    finally:
-        conn.close()
 
-    items = [build_stock_payload(row) for row in rows]
-    logger.info(
-        "[%s | %s] %s items obtenidos",
-        definition.entity_label,
-        branch_name,
-        len(items),
+    result = _stream_stock(
+        definition,
+        chunks=chunks,
+        branch_key=str(branch_id),
+        build_payload=lambda products: _branch_payload(branch_id, branch_name, products),
+        tag=f"[{definition.entity_label} | {branch_name}]",
+        full_resync=full_resync,
     )
-
-    failed: list[dict[str, Any]] = []
-    api_client = get_api_client()
-    batches = list(_chunked(items, settings.runtime.batch_size))
-
-    for batch_index, batch in enumerate(batches, start=1):
-        payload = [
-            {
-                "branch_office": {
-                    "id": str(branch_id),
-                    "name": branch_name.strip() if branch_name else "",
-                },
-                "products": batch,
-            }
-        ]
-        try:
-            api_client.post_json(definition.stock_url, payload)
-            logger.info(
-                "[%s | %s] Batch %s/%s OK",
-                definition.entity_label,
-                branch_name,
-                batch_index,
-                len(batches),
-            )
-        except Exception as exc:
-            logger.warning(
-                "[%s | %s] Batch %s fallo, reintentando 1x1...",
-                definition.entity_label,
-                branch_name,
-                batch_index,
-            )
-            for item in batch:
-                single_payload = [
-                    {
-                        "branch_office": {
-                            "id": str(branch_id),
-                            "name": branch_name.strip() if branch_name else "",
-                        },
-                        "products": [item],
-                    }
-                ]
-                try:
-                    api_client.post_json(definition.stock_url, single_payload)
-                except Exception as single_exc:
-                    logger.error(
-                        "[%s | %s] Producto %s fallo: %s",
-                        definition.entity_label,
-                        branch_name,
-                        item.get("product_id", "?"),
-                        single_exc,
-                    )
-                    response = getattr(single_exc, "response", None)
-                    if response is not None:
-                        logger.error(
-                            "[%s | %s] Detalle respuesta: %s",
-                            definition.entity_label,
-                            branch_name,
-                            response.text,
-                        )
-                    failed.append(item)
-            logger.debug(
-                "[%s | %s] Error batch original: %s",
-                definition.entity_label,
-                branch_name,
-                exc,
-            )
+    failed = result["failed"]
 
     if failed:
-        failed_payload = [
-            {
-                "branch_office": {
-                    "id": str(branch_id),
-                    "name": branch_name.strip() if branch_name else "",
-                },
-                "products": failed,
-            }
-        ]
+        failed_payload = _branch_payload(branch_id, branch_name, failed)
         failed_path = _failed_file_path(definition.failed_prefix, str(branch_id))
         _write_failed_payload(failed_path, failed_payload)
         logger.warning(
@@ -223,53 +423,166 @@ def process_branch_stock_task(
     return {
         "branch_id": branch_id,
         "branch_name": branch_name,
-        "total": len(items),
-        "sent": len(items) - len(failed),
+        "total": result["total"],
+        "sent": result["sent"],
+        "unchanged": result["unchanged"],
         "failed": len(failed),
     }
 
 
 @task(retries=2, retry_delay_seconds=30)
-def process_chain_stock_task(definition: StockFlowDefinition) -> dict[str, Any]:
+def process_branch_stock_task(
+    definition: StockFlowDefinition,
+    branch_id: int,
+    branch_name: str,
+    full_resync: bool = False,
+) -> dict[str, Any]:
     logger = get_run_logger()
-    settings = load_settings()
+    runtime = load_settings().runtime
 
-    logger.info("[%s] Consultando SQL...", definition.entity_label)
-    conn = open_sqlserver_connection()
+    logger.info("[%s | %s] Consultando SQL...", definition.entity_label, branch_name)
+    chunks = _iter_in_background(
+        _iter_stock_item_chunks(definition.stock_query, (branch_id, branch_id, branch_id, branch_id), runtime.batch_size),
+        max_queued=runtime.stream_queue_batches,
+        thread_name=f"{definition.entity_key}-sql-{branch_id}",
+    )
+    return _send_branch_stock(definition, branch_id, branch_name, chunks, full_resync)
+
+
+@task
+def process_branch_group_stock_task(
+    definition: StockFlowDefinition,
+    branches: list[tuple[int, str]],
+    full_resync: bool = False,
+) -> dict[str, Any]:
+    """Corre la consulta de stock una sola vez para el grupo y reparte las filas por sucursal.
+
+    El resultado viene ordenado por sucursal: cuando cambia C_SUCU_EMPR se cierra la
+    cola de la sucursal anterior y se arranca el envio de la siguiente. A lo sumo
+    IOSDB_GROUP_SENDERS sucursales se envian a la vez; con todas ocupadas la lectura
+    espera, asi la memoria no crece con la cantidad de sucursales del grupo.
+
+    Sin reintentos a nivel grupo: repetirlo relanzaria la consulta y el envio de todas
+    las sucursales. Devuelve los resultados OK y en failed_branches las sucursales cuyo
+    envio fallo o que la lectura no llego a completar, para reintentarlas una por una.
+    """
+    logger = get_run_logger()
+    runtime = load_settings().runtime
+    names = dict(branches)
+    group_tag = f"[{definition.entity_label} | sucursales {branches[0][0]}..{branches[-1][0]}]"
+
+    branch_ids = ", ".join(str(int(branch_id)) for branch_id, _ in branches)
+    query = (definition.group_stock_query or "").replace(BRANCH_IDS_PLACEHOLDER, branch_ids)
+
+    logger.info("%s Consultando SQL para %s sucursales...", group_tag, len(branches))
+    rows = _iter_in_background(
+        _iter_branch_item_chunks(query, runtime.batch_size),
+        max_queued=runtime.stream_queue_batches,
+        thread_name=f"{definition.entity_key}-sql-group-{branches[0][0]}",
+    )
+    sender_slots = max(1, runtime.group_senders)
+    feeds: dict[int, _BranchFeed] = {}
+    futures: dict[int, Future] = {}
+    executor = ThreadPoolExecutor(
+        max_workers=sender_slots,
+        thread_name_prefix=f"{definition.entity_key}-send",
+    )
+
+    def start_branch(branch_id: int) -> _BranchFeed:
+        if branch_id not in names:
+            raise RuntimeError(f"{group_tag} La consulta devolvio la sucursal {branch_id} fuera del grupo")
+
+        running = [future for future in futures.values() if not future.done()]
+        if len(running) >= sender_slots:
+            wait(running, return_when=FIRST_COMPLETED)
+
+        feed = _BranchFeed(runtime.stream_queue_batches)
+        feeds[branch_id] = feed
+        # copy_context mantiene el contexto de la task para get_run_logger en el hilo de envio.
+        futures[branch_id] = executor.submit(
+            contextvars.copy_context().run,
+            _send_branch_stock,
+            definition,
+            branch_id,
+            names[branch_id],
+            feed.iter_chunks(),
+            full_resync,
+        )
+        feed.bind(futures[branch_id])
+        return feed
+
+    current: Optional[_BranchFeed] = None
+    incomplete: set[int] = set()
     try:
-        cursor = conn.cursor()
-        cursor.execute(definition.stock_query)
-        rows = cursor.fetchall()
+        try:
+            for chunk in rows:
+                for branch_id, group in itertools.groupby(chunk, key=lambda pair: pair[0]):
+                    if current is None or feeds.get(branch_id) is not current:
+                        if branch_id in feeds:
+                            # Su envio ya se cerro con parte de las filas: se reintenta aparte.
+                            incomplete.add(branch_id)
+                            raise RuntimeError(
+                                f"{group_tag} El resultado no viene ordenado por sucursal "
+                                f"(sucursal {branch_id} repetida)"
+                            )
+                        if current is not None:
+                            current.close()
+                        current = start_branch(branch_id)
+                    current.put([item for _, item in group])
+            if current is not None:
+                current.close()
+        finally:
+            rows.close()
+
+        # Sin filas en origen: igual se envia vacio para que el store descarte sus hashes.
+        for branch_id, _ in branches:
+            if branch_id not in feeds:
+                start_branch(branch_id).close()
+    except Exception as exc:
+        # Las sucursales ya cerradas terminan su envio; la que estaba en curso se corta.
+        logger.error("%s Fallo la lectura agrupada: %s", group_tag, exc)
+        for feed in feeds.values():
+            feed.cancel()
+    except BaseException:
+        for feed in feeds.values():
+            feed.cancel()
+        raise
     finally:
-        conn.close()
+        executor.shutdown(wait=True)
+
+    results: list[dict[str, Any]] = []
+    failed_branches: list[tuple[int, str]] = []
+    for branch_id, branch_name in branches:
+        future = futures.get(branch_id)
+        error = future.exception() if future is not None else None
+        if future is not None and error is None and branch_id not in incomplete:
+            results.append(future.result())
+            continue
+        if error is not None:
+            logger.error("%s Fallo el envio de %s: %s", group_tag, branch_name, error)
+        failed_branches.append((branch_id, branch_name))
+    return {"results": results, "failed_branches": failed_branches}
 
-    items = [build_stock_payload(row) for row in rows]
-    logger.info("[%s] %s items obtenidos", definition.entity_label, len(items))
 
-    api_client = get_api_client()
-    failed: list[dict[str, Any]] = []
-    batches = list(_chunked(items, settings.runtime.batch_size))
+@task(retries=2, retry_delay_seconds=30)
+def process_chain_stock_task(definition: StockFlowDefinition, full_resync: bool = False) -> dict[str, Any]:
+    logger = get_run_logger()
+    runtime = load_settings().runtime
 
-    for batch_index, batch in enumerate(batches, start=1):
-        try:
-            api_client.post_json(definition.stock_url, batch)
-            logger.info(
-                "[%s] Batch %s/%s OK",
-                definition.entity_label,
-                batch_index,
-                len(batches),
-            )
-        except Exception as exc:
-            logger.error(
-                "[%s] Batch %s fallo: %s",
-                definition.entity_label,
-                batch_index,
-                exc,
-            )
-            response = getattr(exc, "response", None)
-            if response is not None:
-                logger.error("[%s] Detalle respuesta: %s", definition.entity_label, response.text)
-            failed.extend(batch)
+    logger.info("[%s] Consultando SQL...", definition.entity_label)
+    result = _stream_stock(
+        definition,
+        chunks=_iter_in_background(
+            _iter_stock_item_chunks(definition.stock_query, (), runtime.batch_size),
+            max_queued=runtime.stream_queue_batches,
+            thread_name=f"{definition.entity_key}-sql-chain",
+        ),
+        branch_key="chain",
+        build_payload=lambda products: products,
+        tag=f"[{definition.entity_label}]",
+        full_resync=full_resync,
+    )
+    failed = result["failed"]
 
     if failed:
         failed_path = _failed_file_path(definition.failed_prefix, "chain")
@@ -282,13 +595,26 @@ def process_chain_stock_task(definition: StockFlowDefinition) -> dict[str, Any]:
         )
 
     return {
-        "total": len(items),
-        "sent": len(items) - len(failed),
+        "total": result["total"],
+        "sent": result["sent"],
+        "unchanged": result["unchanged"],
         "failed": len(failed),
     }
 
 
-def run_branch_stock_flow(definition: StockFlowDefinition, max_workers: Optional[int] = None) -> dict[str, int]:
+def _split_branch_groups(branches: list[tuple[int, str]], group_count: int) -> list[list[tuple[int, str]]]:
+    ordered = sorted(branches)
+    if not ordered:
+        return []
+    group_size = -(-len(ordered) // max(1, group_count))
+    return [ordered[start:start + group_size] for start in range(0, len(ordered), group_size)]
+
+
+def run_branch_stock_flow(
+    definition: StockFlowDefinition,
+    max_workers: Optional[int] = None,
+    full_resync: bool = False,
+) -> dict[str, int]:
     logger = get_run_logger()
     settings = load_settings()
 
@@ -296,41 +622,84 @@ def run_branch_stock_flow(definition: StockFlowDefinition, max_workers: Optional
         name=f"{definition.entity_key}_get_branches"
     )(definition.branches_query or "", definition.entity_label)
 
-    futures = [
-        process_branch_stock_task.with_options(
-            name=f"{definition.entity_key}_process_branch"
-        ).submit(definition, branch_id, branch_name)
-        for branch_id, branch_name in branches
-    ]
+    grouped = settings.runtime.stock_extraction == "grouped"
+    if grouped and not definition.group_stock_query:
+        logger.warning(
+            "[%s] Sin consulta agrupada definida, se consulta sucursal por sucursal",
+            definition.entity_label,
+        )
+        grouped = False
+
+    if grouped:
+        groups = _split_branch_groups(branches, settings.runtime.stock_branch_groups)
+        logger.info(
+            "[%s] Extraccion agrupada: %s sucursales en %s consultas",
+            definition.entity_label,
+            len(branches),
+            len(groups),
+        )
+        group_futures = [
+            process_branch_group_stock_task.with_options(
+                name=f"{definition.entity_key}_process_branch_group"
+            ).submit(definition, group, full_resync)
+            for group in groups
+        ]
+        group_results = [future.result() for future in group_futures]
+        results = [result for group_result in group_results for result in group_result["results"]]
+        retry_branches = [branch for group_result in group_results for branch in group_result["failed_branches"]]
+        if retry_branches:
+            # Solo se reintentan las sucursales que fallaron, con su propia consulta.
+            logger.warning(
+                "[%s] %s sucursales se reintentan con extraccion por sucursal",
+                definition.entity_label,
+                len(retry_branches),
+            )
+            retry_futures = [
+                process_branch_stock_task.with_options(
+                    name=f"{definition.entity_key}_process_branch"
+                ).submit(definition, branch_id, branch_name, full_resync)
+                for branch_id, branch_name in retry_branches
+            ]
+            results.extend(future.result() for future in retry_futures)
+    else:
+        futures = [
+            process_branch_stock_task.with_options(
+                name=f"{definition.entity_key}_process_branch"
+            ).submit(definition, branch_id, branch_name, full_resync)
+            for branch_id, branch_name in branches
+        ]
 
-    # Fuerza la materializacion de los resultados para que el flujo falle si falla una rama.
-    results = [future.result() for future in futures]
+        # Fuerza la materializacion de los resultados para que el flujo falle si falla una rama.
+        results = [future.result() for future in futures]
 
     total = sum(result["total"] for result in results)
     sent = sum(result["sent"] for result in results)
+    unchanged = sum(result["unchanged"] for result in results)
     failed = sum(result["failed"] for result in results)
 
     logger.info(
-        "[%s] Completado | Total: %s | Enviados: %s | Fallidos: %s | Max workers config: %s",
+        "[%s] Completado | Total: %s | Enviados: %s | Sin cambios: %s | Fallidos: %s | Max workers config: %s",
         definition.entity_label,
         total,
         sent,
+        unchanged,
         failed,
         max_workers or settings.runtime.max_workers,
     )
-    return {"total": total, "sent": sent, "failed": failed}
+    return {"total": total, "sent": sent, "unchanged": unchanged, "failed": failed}
 
 
-def run_chain_stock_flow(definition: StockFlowDefinition) -> dict[str, int]:
+def run_chain_stock_flow(definition: StockFlowDefinition, full_resync: bool = False) -> dict[str, int]:
     logger = get_run_logger()
     result = process_chain_stock_task.with_options(
         name=f"{definition.entity_key}_process_chain"
-    )(definition)
+    )(definition, full_resync)
     logger.info(
-        "[%s] Completado | Total: %s | Enviados: %s | Fallidos: %s",
+        "[%s] Completado | Total: %s | Enviados: %s | Sin cambios: %s | Fallidos: %s",
         definition.entity_label,
         result["total"],
         result["sent"],
+        result["unchanged"],
         result["failed"],
     )
     return result
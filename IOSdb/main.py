@@ -15,24 +15,32 @@ from IOSdb.flows.retry_stock import retry_products
 
 
 @flow(name="iosdb_mayorista_with_notify", log_prints=True)
-def mayorista_flow(notify: bool = True, max_workers: Optional[int] = None) -> dict[str, int]:
-    result = mayorista_sync(max_workers=max_workers)
+def mayorista_flow(
+    notify: bool = True,
+    max_workers: Optional[int] = None,
+    full_resync: bool = False,
+) -> dict[str, int]:
+    result = mayorista_sync(max_workers=max_workers, full_resync=full_resync)
     if notify:
         notify_discord(build_summary_message("IOSdb Mayorista", result))
     return result
 
 
 @flow(name="iosdb_barrio_with_notify", log_prints=True)
-def barrio_flow(notify: bool = True, max_workers: Optional[int] = None) -> dict[str, int]:
-    result = barrio_sync(max_workers=max_workers)
+def barrio_flow(
+    notify: bool = True,
+    max_workers: Optional[int] = None,
+    full_resync: bool = False,
+) -> dict[str, int]:
+    result = barrio_sync(max_workers=max_workers, full_resync=full_resync)
     if notify:
         notify_discord(build_summary_message("IOSdb Barrio", result))
     return result
 
 
 @flow(name="iosdb_cadena_with_notify", log_prints=True)
-def cadena_flow(notify: bool = True) -> dict[str, int]:
-    result = cadena_sync()
+def cadena_flow(notify: bool = True, full_resync: bool = False) -> dict[str, int]:
+    result = cadena_sync(full_resync=full_resync)
     if notify:
         notify_discord(build_summary_message("IOSdb Cadena", result))
     return result
@@ -79,6 +87,7 @@ def iosdb_master_flow(
     run_categories: bool = False,
     run_cadena: bool = False,
     notify: bool = True,
+    full_resync: bool = False,
 ) -> dict[str, dict[str, int]]:
     logger = get_run_logger()
     result: dict[str, dict[str, int]] = {}
@@ -88,11 +97,11 @@ def iosdb_master_flow(
     if run_products:
         result["products"] = products_flow(notify=False)
     if run_mayorista:
-        result["mayorista"] = mayorista_flow(notify=False)
+        result["mayorista"] = mayorista_flow(notify=False, full_resync=full_resync)
     if run_barrio:
-        result["barrio"] = barrio_flow(notify=False)
+        result["barrio"] = barrio_flow(notify=False, full_resync=full_resync)
     if run_cadena:
-        result["cadena"] = cadena_flow(notify=False)
+        result["cadena"] = cadena_flow(notify=False, full_resync=full_resync)
     if run_retry:
         result["retry"] = retry_flow(notify=False)
 
@@ -36,23 +36,37 @@ FROM etl.v_cdc_monitor_status
 WHERE health_status IN ('critical', 'warning')
 ORDER BY config_name;
 
--- 3. Ultimas corridas registradas por piloto
+-- 3. Ultimas corridas registradas por piloto (lectura acotada por indice)
+SELECT
+    cfg.config_name,
+    rl.status,
+    rl.run_count,
+    rl.rows_read,
+    rl.rows_upserted,
+    rl.rows_deleted,
+    rl.duration_ms,
+    rl.created_at,
+    rl.last_run_at
+FROM etl.cdc_table_config cfg
+CROSS JOIN LATERAL (
+    SELECT *
+    FROM etl.cdc_run_log r
+    WHERE r.config_name = cfg.config_name
+    ORDER BY r.run_id DESC
+    LIMIT 5
+) rl
+WHERE cfg.mode = 'cdc'
+ORDER BY cfg.config_name, rl.created_at DESC;
+
+-- 4. Resumen de los ultimos 7 dias (rollup diario + particion actual)
 SELECT
     config_name,
+    run_date,
     status,
+    runs,
     rows_read,
-    rows_upserted,
-    rows_deleted,
-    duration_ms,
-    created_at
-FROM (
-    SELECT
-        rl.*,
-        row_number() OVER (
-            PARTITION BY rl.config_name
-            ORDER BY rl.run_id DESC
-        ) AS rn
-    FROM etl.cdc_run_log rl
-) ranked
-WHERE rn <= 5
-ORDER BY config_name, created_at DESC;
+    p95_duration_ms,
+    p95_lag_ms
+FROM etl.v_cdc_run_log_daily
+WHERE run_date >= current_date - 7
+ORDER BY config_name, run_date DESC, status;
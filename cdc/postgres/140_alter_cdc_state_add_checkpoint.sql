@@ -0,0 +1,14 @@
+ALTER TABLE etl.cdc_state
+    ADD COLUMN IF NOT EXISTS checkpoint_lsn bytea,
+    ADD COLUMN IF NOT EXISTS checkpoint_seqval bytea,
+    ADD COLUMN IF NOT EXISTS checkpoint_at timestamptz;
+
+SELECT
+    config_name,
+    last_status,
+    last_end_lsn,
+    checkpoint_lsn,
+    checkpoint_seqval,
+    checkpoint_at
+FROM etl.cdc_state
+ORDER BY config_name;
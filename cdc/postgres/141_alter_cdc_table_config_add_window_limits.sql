@@ -0,0 +1,33 @@
+ALTER TABLE etl.cdc_table_config
+    ADD COLUMN IF NOT EXISTS max_window_changes integer,
+    ADD COLUMN IF NOT EXISTS max_window_minutes integer;
+
+ALTER TABLE etl.cdc_table_config
+    DROP CONSTRAINT IF EXISTS cdc_table_config_window_limits_chk;
+
+ALTER TABLE etl.cdc_table_config
+    ADD CONSTRAINT cdc_table_config_window_limits_chk CHECK (
+        (max_window_changes IS NULL OR max_window_changes > 0)
+        AND (max_window_minutes IS NULL OR max_window_minutes > 0)
+    );
+
+-- Tablas de mayor volumen: acotar cada ventana para que el ORDER BY sobre
+-- fn_cdc_get_all_changes_* no crezca con el backlog acumulado.
+UPDATE etl.cdc_table_config
+SET
+    max_window_changes = 200000,
+    updated_at = now()
+WHERE config_name IN (
+    'pilot_t051_articulos_sucursal',
+    'pilot_t055_articulos_condcompra_costos'
+)
+  AND max_window_changes IS NULL;
+
+SELECT
+    config_name,
+    batch_size,
+    max_window_changes,
+    max_window_minutes,
+    updated_at
+FROM etl.cdc_table_config
+ORDER BY config_name;
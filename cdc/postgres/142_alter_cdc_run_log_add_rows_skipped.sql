@@ -0,0 +1,18 @@
+ALTER TABLE etl.cdc_run_log
+    ADD COLUMN IF NOT EXISTS rows_skipped integer NOT NULL DEFAULT 0;
+
+-- Amplificacion de escritura evitada por config en los ultimos 7 dias
+SELECT
+    config_name,
+    sum(rows_read) AS rows_read,
+    sum(rows_upserted) AS rows_upserted,
+    sum(rows_skipped) AS rows_skipped,
+    round(
+        100.0 * sum(rows_skipped) / NULLIF(sum(rows_upserted) + sum(rows_skipped), 0),
+        2
+    ) AS pct_skipped
+FROM etl.cdc_run_log
+WHERE created_at >= now() - interval '7 days'
+  AND status = 'success'
+GROUP BY config_name
+ORDER BY pct_skipped DESC NULLS LAST;
@@ -0,0 +1,18 @@
+ALTER TABLE etl.cdc_state
+    ADD COLUMN IF NOT EXISTS snapshot_lsn bytea,
+    ADD COLUMN IF NOT EXISTS snapshot_last_pk jsonb,
+    ADD COLUMN IF NOT EXISTS snapshot_rows bigint,
+    ADD COLUMN IF NOT EXISTS snapshot_started_at timestamptz;
+
+-- Snapshots en curso (una fila por tabla que se esta re-sembrando)
+SELECT
+    config_name,
+    snapshot_lsn,
+    snapshot_last_pk,
+    snapshot_rows,
+    snapshot_started_at,
+    last_status,
+    last_error
+FROM etl.cdc_state
+WHERE snapshot_lsn IS NOT NULL
+ORDER BY config_name;
@@ -0,0 +1,52 @@
+ALTER TABLE etl.cdc_run_log
+    ADD COLUMN IF NOT EXISTS read_lsn_window_ms bigint,
+    ADD COLUMN IF NOT EXISTS fetch_ms bigint,
+    ADD COLUMN IF NOT EXISTS collapse_ms bigint,
+    ADD COLUMN IF NOT EXISTS apply_deletes_ms bigint,
+    ADD COLUMN IF NOT EXISTS apply_upserts_ms bigint,
+    ADD COLUMN IF NOT EXISTS commit_ms bigint,
+    ADD COLUMN IF NOT EXISTS source_commit_time timestamp,
+    ADD COLUMN IF NOT EXISTS replication_lag_ms bigint;
+
+-- Throughput y lag por config y hora (solo corridas con cambios aplicados)
+CREATE OR REPLACE VIEW etl.v_cdc_throughput_hourly AS
+SELECT
+    rl.config_name,
+    date_trunc('hour', rl.created_at) AS hour_bucket,
+    count(*) AS runs,
+    sum(rl.rows_read) AS rows_read,
+    sum(rl.rows_upserted) AS rows_upserted,
+    sum(rl.rows_deleted) AS rows_deleted,
+    percentile_cont(0.5) WITHIN GROUP (
+        ORDER BY rl.rows_read * 1000.0 / NULLIF(rl.duration_ms, 0)
+    ) AS p50_rows_per_sec,
+    percentile_cont(0.95) WITHIN GROUP (
+        ORDER BY rl.rows_read * 1000.0 / NULLIF(rl.duration_ms, 0)
+    ) AS p95_rows_per_sec,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY rl.replication_lag_ms) AS p50_lag_ms,
+    percentile_cont(0.95) WITHIN GROUP (ORDER BY rl.replication_lag_ms) AS p95_lag_ms,
+    max(rl.replication_lag_ms) AS max_lag_ms,
+    sum(rl.read_lsn_window_ms) AS read_lsn_window_ms,
+    sum(rl.fetch_ms) AS fetch_ms,
+    sum(rl.collapse_ms) AS collapse_ms,
+    sum(rl.apply_deletes_ms) AS apply_deletes_ms,
+    sum(rl.apply_upserts_ms) AS apply_upserts_ms,
+    sum(rl.commit_ms) AS commit_ms
+FROM etl.cdc_run_log rl
+WHERE rl.status = 'success'
+GROUP BY rl.config_name, date_trunc('hour', rl.created_at);
+
+-- Donde se va el tiempo en las ultimas 24 horas
+SELECT
+    config_name,
+    sum(rows_read) AS rows_read,
+    max(p95_rows_per_sec) AS peor_hora_p95_rows_per_sec,
+    max(p95_lag_ms) AS peor_hora_p95_lag_ms,
+    sum(fetch_ms) AS fetch_ms,
+    sum(collapse_ms) AS collapse_ms,
+    sum(apply_deletes_ms) + sum(apply_upserts_ms) AS apply_ms,
+    sum(commit_ms) AS commit_ms
+FROM etl.v_cdc_throughput_hourly
+WHERE hour_bucket >= now() - interval '24 hours'
+GROUP BY config_name
+ORDER BY rows_read DESC;
@@ -0,0 +1,278 @@
+-- Indice para leer las ultimas N corridas de cada config sin recorrer todo el historial
+CREATE INDEX IF NOT EXISTS cdc_run_log_config_run_idx
+    ON etl.cdc_run_log (config_name, run_id DESC);
+
+-- Salud CDC calculada en PostgreSQL. Cada config lee a lo sumo p_lookback_runs filas
+-- de etl.cdc_run_log por indice, asi el costo no depende del historial acumulado.
+-- El filtro por created_at (mes en curso y anterior) permite podar las particiones
+-- viejas una vez particionado run_log (146).
+CREATE OR REPLACE FUNCTION etl.fn_cdc_health(
+    p_config_names text[] DEFAULT NULL,
+    p_include_disabled boolean DEFAULT false,
+    p_stale_factor numeric DEFAULT 3.0,
+    p_min_stale_minutes integer DEFAULT 15,
+    p_failure_threshold integer DEFAULT 2,
+    p_lookback_runs integer DEFAULT 5,
+    p_timezone text DEFAULT 'America/Argentina/Buenos_Aires',
+    p_window_start time DEFAULT TIME '08:00',
+    p_window_end time DEFAULT TIME '18:00'
+)
+RETURNS TABLE (
+    config_name text,
+    enabled boolean,
+    source_label text,
+    target_label text,
+    poll_seconds integer,
+    last_status varchar(30),
+    last_rowcount integer,
+    last_error text,
+    last_run_status varchar(30),
+    last_run_created_at timestamptz,
+    last_run_error text,
+    consecutive_failures integer,
+    stale_minutes numeric,
+    stale_threshold_minutes numeric,
+    monitor_window_active boolean,
+    health_level text,
+    issues text[]
+)
+LANGUAGE sql
+STABLE
+AS $$
+WITH window_state AS (
+    SELECT
+        CASE
+            WHEN p_window_start <= p_window_end THEN
+                (now() AT TIME ZONE p_timezone)::time >= p_window_start
+                AND (now() AT TIME ZONE p_timezone)::time < p_window_end
+            ELSE
+                (now() AT TIME ZONE p_timezone)::time >= p_window_start
+                OR (now() AT TIME ZONE p_timezone)::time < p_window_end
+        END AS active
+),
+base AS (
+    SELECT
+        cfg.config_name,
+        cfg.enabled,
+        cfg.source_server || '.' || cfg.source_database || '.' || cfg.source_schema || '.' || cfg.source_table
+            AS source_label,
+        cfg.target_schema || '.' || cfg.target_table AS target_label,
+        cfg.poll_seconds,
+        st.last_status,
+        st.last_rowcount,
+        st.last_error,
+        runs.last_run_status,
+        runs.last_run_created_at,
+        runs.last_run_error,
+        COALESCE(runs.consecutive_failures, 0)::integer AS consecutive_failures,
+        round(
+            EXTRACT(EPOCH FROM (now() - COALESCE(st.last_finished_at, st.last_started_at, st.updated_at))) / 60.0,
+            2
+        ) AS stale_minutes,
+        round(GREATEST((cfg.poll_seconds * p_stale_factor) / 60.0, p_min_stale_minutes::numeric), 2)
+            AS stale_threshold_minutes,
+        ws.active AS monitor_window_active
+    FROM etl.cdc_table_config cfg
+    CROSS JOIN window_state ws
+    LEFT JOIN etl.cdc_state st
+        ON st.config_name = cfg.config_name
+    LEFT JOIN LATERAL (
+        SELECT
+            max(recent.status) FILTER (WHERE recent.rn = 1) AS last_run_status,
+            max(recent.created_at) FILTER (WHERE recent.rn = 1) AS last_run_created_at,
+            max(recent.error_text) FILTER (WHERE recent.rn = 1) AS last_run_error,
+            COALESCE(min(recent.rn) FILTER (WHERE recent.status <> 'failed') - 1, count(*))
+                AS consecutive_failures
+        FROM (
+            SELECT
+                rl.status,
+                rl.created_at,
+                rl.error_text,
+                row_number() OVER (ORDER BY rl.run_id DESC) AS rn
+            FROM (
+                SELECT rl_inner.run_id, rl_inner.status, rl_inner.created_at, rl_inner.error_text
+                FROM etl.cdc_run_log rl_inner
+                WHERE rl_inner.config_name = cfg.config_name
+                  AND rl_inner.created_at >= date_trunc('month', now()) - interval '1 month'
+                ORDER BY rl_inner.run_id DESC
+                LIMIT p_lookback_runs
+            ) rl
+        ) recent
+    ) runs
+        ON true
+    WHERE cfg.mode = 'cdc'
+      AND (p_include_disabled OR cfg.enabled)
+      AND (p_config_names IS NULL OR cfg.config_name = ANY(p_config_names))
+),
+rules AS (
+    SELECT
+        b.*,
+        b.enabled AND (b.last_status IS NULL OR b.last_status = 'never_run') AS is_never_run,
+        b.consecutive_failures >= p_failure_threshold AS has_failure_streak,
+        b.last_status = 'failed' AS last_failed,
+        b.last_status = 'bootstrapped' AS is_bootstrapped,
+        b.stale_minutes IS NULL AS without_timestamp,
+        b.monitor_window_active AND b.stale_minutes > b.stale_threshold_minutes AS is_stale
+    FROM base b
+)
+SELECT
+    r.config_name,
+    r.enabled,
+    r.source_label,
+    r.target_label,
+    r.poll_seconds,
+    r.last_status,
+    r.last_rowcount,
+    r.last_error,
+    r.last_run_status,
+    r.last_run_created_at,
+    r.last_run_error,
+    r.consecutive_failures,
+    r.stale_minutes,
+    r.stale_threshold_minutes,
+    r.monitor_window_active,
+    CASE
+        WHEN NOT r.enabled THEN 'disabled'
+        WHEN r.is_never_run THEN 'warning'
+        WHEN r.has_failure_streak OR r.last_failed OR r.is_stale THEN 'critical'
+        WHEN r.is_bootstrapped OR r.without_timestamp THEN 'warning'
+        ELSE 'ok'
+    END AS health_level,
+    CASE
+        WHEN NOT r.enabled THEN ARRAY[]::text[]
+        WHEN r.is_never_run THEN ARRAY['sin bootstrap o sin corrida registrada']
+        ELSE array_remove(
+            ARRAY[
+                CASE WHEN r.has_failure_streak
+                    THEN r.consecutive_failures || ' fallas consecutivas' END,
+                CASE WHEN r.last_failed
+                    THEN 'ultima corrida fallida: ' || CASE
+                        WHEN length(COALESCE(r.last_error, r.last_run_error, 'sin detalle')) <= 160
+                            THEN COALESCE(r.last_error, r.last_run_error, 'sin detalle')
+                        ELSE left(COALESCE(r.last_error, r.last_run_error), 157) || '...'
+                    END END,
+                CASE WHEN r.is_bootstrapped
+                    THEN 'tabla bootstrapped pero sin corrida success posterior' END,
+                CASE WHEN r.without_timestamp
+                    THEN 'sin marca temporal de ultima corrida' END,
+                CASE WHEN r.is_stale
+                    THEN 'atraso de ' || round(r.stale_minutes, 1) || ' min > umbral '
+                        || round(r.stale_threshold_minutes, 1) || ' min' END
+            ],
+            NULL
+        )
+    END AS issues
+FROM rules r
+ORDER BY r.config_name;
+$$;
+
+-- Retencion de etl.cdc_run_log: borra corridas anteriores a p_keep_days dias
+-- y devuelve la cantidad de filas eliminadas.
+CREATE OR REPLACE FUNCTION etl.fn_cdc_purge_run_log(p_keep_days integer DEFAULT 90)
+RETURNS bigint
+LANGUAGE sql
+AS $$
+    WITH deleted AS (
+        DELETE FROM etl.cdc_run_log
+        WHERE created_at < now() - make_interval(days => p_keep_days)
+        RETURNING 1
+    )
+    SELECT count(*) FROM deleted;
+$$;
+
+-- Misma vista de 030, con lectura acotada por indice de las ultimas corridas
+CREATE OR REPLACE VIEW etl.v_cdc_monitor_status AS
+WITH monitor_config AS (
+    SELECT
+        now() AT TIME ZONE 'America/Argentina/Buenos_Aires' AS local_now,
+        TIME '08:00' AS active_window_start,
+        TIME '18:00' AS active_window_end
+)
+SELECT
+    cfg.config_name,
+    cfg.enabled,
+    cfg.mode,
+    cfg.source_server,
+    cfg.source_database,
+    cfg.source_schema,
+    cfg.source_table,
+    cfg.target_schema,
+    cfg.target_table,
+    cfg.poll_seconds,
+    st.last_status,
+    st.last_rowcount,
+    st.last_error,
+    st.last_started_at,
+    st.last_finished_at,
+    st.updated_at,
+    mc.local_now,
+    (mc.local_now::time >= mc.active_window_start AND mc.local_now::time < mc.active_window_end)
+        AS monitor_window_active,
+    round(EXTRACT(EPOCH FROM (now() - COALESCE(st.last_finished_at, st.last_started_at, st.updated_at))) / 60.0, 2)
+        AS minutes_since_last_activity,
+    GREATEST(round((cfg.poll_seconds * 3.0) / 60.0, 2), 15.0) AS stale_threshold_minutes,
+    lr.last_run_status,
+    lr.rows_read AS last_run_rows_read,
+    lr.rows_upserted AS last_run_rows_upserted,
+    lr.rows_deleted AS last_run_rows_deleted,
+    lr.duration_ms AS last_run_duration_ms,
+    lr.last_run_error,
+    lr.last_run_created_at,
+    COALESCE(rf.failed_runs_last_5, 0) AS failed_runs_last_5,
+    CASE
+        WHEN cfg.enabled = false THEN 'disabled'
+        WHEN st.config_name IS NULL OR st.last_status = 'never_run' THEN 'warning'
+        WHEN st.last_status = 'failed' THEN 'critical'
+        WHEN COALESCE(rf.failed_runs_last_5, 0) >= 2 THEN 'critical'
+        WHEN COALESCE(st.last_finished_at, st.last_started_at, st.updated_at) IS NULL THEN 'warning'
+        WHEN (mc.local_now::time >= mc.active_window_start AND mc.local_now::time < mc.active_window_end)
+             AND EXTRACT(EPOCH FROM (now() - COALESCE(st.last_finished_at, st.last_started_at, st.updated_at))) / 60.0
+             > GREATEST((cfg.poll_seconds * 3.0) / 60.0, 15.0) THEN 'critical'
+        WHEN st.last_status = 'bootstrapped' THEN 'warning'
+        ELSE 'ok'
+    END AS health_status
+FROM etl.cdc_table_config cfg
+CROSS JOIN monitor_config mc
+LEFT JOIN etl.cdc_state st
+    ON st.config_name = cfg.config_name
+LEFT JOIN LATERAL (
+    SELECT
+        rl.status AS last_run_status,
+        rl.rows_read,
+        rl.rows_upserted,
+        rl.rows_deleted,
+        rl.duration_ms,
+        rl.error_text AS last_run_error,
+        rl.created_at AS last_run_created_at
+    FROM etl.cdc_run_log rl
+    WHERE rl.config_name = cfg.config_name
+      AND rl.created_at >= date_trunc('month', now()) - interval '1 month'
+    ORDER BY rl.run_id DESC
+    LIMIT 1
+) lr
+    ON true
+LEFT JOIN LATERAL (
+    SELECT count(*) FILTER (WHERE recent.status = 'failed') AS failed_runs_last_5
+    FROM (
+        SELECT rl.status
+        FROM etl.cdc_run_log rl
+        WHERE rl.config_name = cfg.config_name
+          AND rl.created_at >= date_trunc('month', now()) - interval '1 month'
+        ORDER BY rl.run_id DESC
+        LIMIT 5
+    ) recent
+) rf
+    ON true
+WHERE cfg.mode = 'cdc';
+
+-- Salud actual con los parametros por defecto del monitor
+SELECT config_name, health_level, consecutive_failures, stale_minutes, issues
+FROM etl.fn_cdc_health()
+ORDER BY
+    CASE health_level
+        WHEN 'critical' THEN 1
+        WHEN 'warning' THEN 2
+        WHEN 'ok' THEN 3
+        ELSE 4
+    END,
+    config_name;
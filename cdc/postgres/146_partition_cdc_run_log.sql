@@ -0,0 +1,451 @@
+-- Convierte etl.cdc_run_log en tabla particionada por mes (created_at), agrega el
+-- contador de corridas idle coalescidas y el rollup diario etl.cdc_run_log_daily.
+-- Correr en una ventana sin corridas CDC activas (pausar deployments y daemon).
+BEGIN;
+
+DROP VIEW IF EXISTS etl.v_cdc_monitor_status;
+DROP VIEW IF EXISTS etl.v_cdc_throughput_hourly;
+
+ALTER TABLE etl.cdc_run_log RENAME TO cdc_run_log_legacy;
+ALTER INDEX IF EXISTS etl.cdc_run_log_pkey RENAME TO cdc_run_log_legacy_pkey;
+ALTER INDEX IF EXISTS etl.cdc_run_log_config_created_idx RENAME TO cdc_run_log_legacy_config_created_idx;
+ALTER INDEX IF EXISTS etl.cdc_run_log_config_run_idx RENAME TO cdc_run_log_legacy_config_run_idx;
+
+CREATE TABLE etl.cdc_run_log (
+    run_id bigint NOT NULL DEFAULT nextval('etl.cdc_run_log_run_id_seq'),
+    config_name text NOT NULL
+        REFERENCES etl.cdc_table_config(config_name)
+        ON DELETE CASCADE,
+    source_table text NOT NULL,
+    from_lsn bytea,
+    to_lsn bytea,
+    rows_read integer NOT NULL DEFAULT 0,
+    rows_upserted integer NOT NULL DEFAULT 0,
+    rows_deleted integer NOT NULL DEFAULT 0,
+    status varchar(30) NOT NULL,
+    duration_ms bigint,
+    error_text text,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    rows_skipped integer NOT NULL DEFAULT 0,
+    read_lsn_window_ms bigint,
+    fetch_ms bigint,
+    collapse_ms bigint,
+    apply_deletes_ms bigint,
+    apply_upserts_ms bigint,
+    commit_ms bigint,
+    source_commit_time timestamp,
+    replication_lag_ms bigint,
+    run_count integer NOT NULL DEFAULT 1,
+    last_run_at timestamptz,
+    PRIMARY KEY (run_id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE etl.cdc_run_log_run_id_seq OWNED BY etl.cdc_run_log.run_id;
+
+CREATE INDEX IF NOT EXISTS cdc_run_log_config_created_idx
+    ON etl.cdc_run_log (config_name, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS cdc_run_log_config_run_idx
+    ON etl.cdc_run_log (config_name, run_id DESC);
+
+-- Particion DEFAULT: si el flow de retencion deja de correr mas alla del horizonte de
+-- particiones creadas, las corridas CDC siguen registrandose en lugar de fallar el INSERT.
+CREATE TABLE IF NOT EXISTS etl.cdc_run_log_default PARTITION OF etl.cdc_run_log DEFAULT;
+
+-- Crea las particiones mensuales faltantes desde p_from hasta p_months_ahead meses adelante.
+-- Si la particion DEFAULT ya tiene filas de ese mes, se mueven a la particion nueva
+-- antes de adjuntarla (ATTACH falla si el DEFAULT conserva filas del rango).
+CREATE OR REPLACE FUNCTION etl.fn_cdc_ensure_run_log_partitions(
+    p_from date DEFAULT current_date,
+    p_months_ahead integer DEFAULT 2
+)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_month date;
+    v_name text;
+    v_created integer := 0;
+BEGIN
+    FOR v_month IN
+        SELECT generate_series(
+            date_trunc('month', p_from),
+            date_trunc('month', current_date) + make_interval(months => p_months_ahead),
+            interval '1 month'
+        )::date
+    LOOP
+        v_name := format('cdc_run_log_p%s', to_char(v_month, 'YYYYMM'));
+        IF to_regclass(format('etl.%I', v_name)) IS NULL THEN
+            IF EXISTS (
+                SELECT 1
+                FROM etl.cdc_run_log_default
+                WHERE created_at >= v_month
+                  AND created_at < v_month + interval '1 month'
+            ) THEN
+                EXECUTE format('CREATE TABLE etl.%I (LIKE etl.cdc_run_log INCLUDING DEFAULTS)', v_name);
+                EXECUTE format(
+                    'WITH moved AS (
+                        DELETE FROM etl.cdc_run_log_default
+                        WHERE created_at >= %L AND created_at < %L
+                        RETURNING *
+                    )
+                    INSERT INTO etl.%I SELECT * FROM moved',
+                    v_month,
+                    (v_month + interval '1 month')::date,
+                    v_name
+                );
+                EXECUTE format(
+                    'ALTER TABLE etl.cdc_run_log ATTACH PARTITION etl.%I FOR VALUES FROM (%L) TO (%L)',
+                    v_name,
+                    v_month,
+                    (v_month + interval '1 month')::date
+                );
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE etl.%I PARTITION OF etl.cdc_run_log FOR VALUES FROM (%L) TO (%L)',
+                    v_name,
+                    v_month,
+                    (v_month + interval '1 month')::date
+                );
+            END IF;
+            v_created := v_created + 1;
+        END IF;
+    END LOOP;
+    RETURN v_created;
+END;
+$$;
+
+SELECT etl.fn_cdc_ensure_run_log_partitions(
+    COALESCE((SELECT min(created_at)::date FROM etl.cdc_run_log_legacy), current_date)
+);
+
+INSERT INTO etl.cdc_run_log (
+    run_id,
+    config_name,
+    source_table,
+    from_lsn,
+    to_lsn,
+    rows_read,
+    rows_upserted,
+    rows_deleted,
+    status,
+    duration_ms,
+    error_text,
+    created_at,
+    rows_skipped,
+    read_lsn_window_ms,
+    fetch_ms,
+    collapse_ms,
+    apply_deletes_ms,
+    apply_upserts_ms,
+    commit_ms,
+    source_commit_time,
+    replication_lag_ms
+)
+SELECT
+    run_id,
+    config_name,
+    source_table,
+    from_lsn,
+    to_lsn,
+    rows_read,
+    rows_upserted,
+    rows_deleted,
+    status,
+    duration_ms,
+    error_text,
+    created_at,
+    rows_skipped,
+    read_lsn_window_ms,
+    fetch_ms,
+    collapse_ms,
+    apply_deletes_ms,
+    apply_upserts_ms,
+    commit_ms,
+    source_commit_time,
+    replication_lag_ms
+FROM etl.cdc_run_log_legacy;
+
+DROP TABLE etl.cdc_run_log_legacy;
+
+-- Rollup diario: conserva conteos y percentiles aunque se eliminen las particiones.
+CREATE TABLE IF NOT EXISTS etl.cdc_run_log_daily (
+    config_name text NOT NULL,
+    run_date date NOT NULL,
+    status varchar(30) NOT NULL,
+    runs bigint NOT NULL,
+    rows_read bigint NOT NULL DEFAULT 0,
+    rows_upserted bigint NOT NULL DEFAULT 0,
+    rows_deleted bigint NOT NULL DEFAULT 0,
+    rows_skipped bigint NOT NULL DEFAULT 0,
+    duration_ms_total bigint,
+    p50_duration_ms double precision,
+    p95_duration_ms double precision,
+    max_duration_ms bigint,
+    p50_lag_ms double precision,
+    p95_lag_ms double precision,
+    max_lag_ms bigint,
+    updated_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (config_name, run_date, status)
+);
+
+-- Recalcula el rollup de un dia. Las filas idle coalescidas pesan run_count corridas
+-- y aportan su duracion promedio a los percentiles.
+CREATE OR REPLACE FUNCTION etl.fn_cdc_rollup_run_log(p_day date)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_rows integer;
+BEGIN
+    DELETE FROM etl.cdc_run_log_daily
+    WHERE run_date = p_day;
+
+    INSERT INTO etl.cdc_run_log_daily (
+        config_name,
+        run_date,
+        status,
+        runs,
+        rows_read,
+        rows_upserted,
+        rows_deleted,
+        rows_skipped,
+        duration_ms_total,
+        p50_duration_ms,
+        p95_duration_ms,
+        max_duration_ms,
+        p50_lag_ms,
+        p95_lag_ms,
+        max_lag_ms
+    )
+    SELECT
+        rl.config_name,
+        p_day,
+        rl.status,
+        sum(rl.run_count),
+        sum(rl.rows_read),
+        sum(rl.rows_upserted),
+        sum(rl.rows_deleted),
+        sum(rl.rows_skipped),
+        sum(rl.duration_ms),
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY rl.duration_ms::double precision / rl.run_count),
+        percentile_cont(0.95) WITHIN GROUP (ORDER BY rl.duration_ms::double precision / rl.run_count),
+        max(rl.duration_ms / rl.run_count),
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY rl.replication_lag_ms),
+        percentile_cont(0.95) WITHIN GROUP (ORDER BY rl.replication_lag_ms),
+        max(rl.replication_lag_ms)
+    FROM etl.cdc_run_log rl
+    WHERE rl.created_at >= p_day
+      AND rl.created_at < p_day + 1
+    GROUP BY rl.config_name, rl.status;
+
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RETURN v_rows;
+END;
+$$;
+
+-- Retencion por particion: consolida en el rollup y elimina los meses anteriores a
+-- p_keep_months meses completos. Reemplaza el DELETE por fecha de 145.
+DROP FUNCTION IF EXISTS etl.fn_cdc_purge_run_log(integer);
+
+CREATE OR REPLACE FUNCTION etl.fn_cdc_purge_run_log(p_keep_months integer DEFAULT 3)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_partition record;
+    v_month date;
+    v_day date;
+    v_dropped integer := 0;
+BEGIN
+    FOR v_partition IN
+        SELECT child.relname
+        FROM pg_inherits inh
+        JOIN pg_class parent ON parent.oid = inh.inhparent
+        JOIN pg_namespace nsp ON nsp.oid = parent.relnamespace
+        JOIN pg_class child ON child.oid = inh.inhrelid
+        WHERE nsp.nspname = 'etl'
+          AND parent.relname = 'cdc_run_log'
+          AND child.relname ~ '^cdc_run_log_p[0-9]{6}$'
+        ORDER BY child.relname
+    LOOP
+        v_month := to_date(right(v_partition.relname, 6), 'YYYYMM');
+        IF v_month >= date_trunc('month', current_date) - make_interval(months => p_keep_months) THEN
+            CONTINUE;
+        END IF;
+
+        FOR v_day IN
+            SELECT generate_series(v_month, (v_month + interval '1 month' - interval '1 day')::date, interval '1 day')::date
+        LOOP
+            PERFORM etl.fn_cdc_rollup_run_log(v_day);
+        END LOOP;
+
+        EXECUTE format('DROP TABLE etl.%I', v_partition.relname);
+        v_dropped := v_dropped + 1;
+    END LOOP;
+
+    PERFORM etl.fn_cdc_ensure_run_log_partitions();
+    RETURN v_dropped;
+END;
+$$;
+
+-- Las ultimas corridas se buscan solo en las particiones del mes en curso y el anterior
+CREATE OR REPLACE VIEW etl.v_cdc_monitor_status AS
+WITH monitor_config AS (
+    SELECT
+        now() AT TIME ZONE 'America/Argentina/Buenos_Aires' AS local_now,
+        TIME '08:00' AS active_window_start,
+        TIME '18:00' AS active_window_end
+)
+SELECT
+    cfg.config_name,
+    cfg.enabled,
+    cfg.mode,
+    cfg.source_server,
+    cfg.source_database,
+    cfg.source_schema,
+    cfg.source_table,
+    cfg.target_schema,
+    cfg.target_table,
+    cfg.poll_seconds,
+    st.last_status,
+    st.last_rowcount,
+    st.last_error,
+    st.last_started_at,
+    st.last_finished_at,
+    st.updated_at,
+    mc.local_now,
+    (mc.local_now::time >= mc.active_window_start AND mc.local_now::time < mc.active_window_end)
+        AS monitor_window_active,
+    round(EXTRACT(EPOCH FROM (now() - COALESCE(st.last_finished_at, st.last_started_at, st.updated_at))) / 60.0, 2)
+        AS minutes_since_last_activity,
+    GREATEST(round((cfg.poll_seconds * 3.0) / 60.0, 2), 15.0) AS stale_threshold_minutes,
+    lr.last_run_status,
+    lr.rows_read AS last_run_rows_read,
+    lr.rows_upserted AS last_run_rows_upserted,
+    lr.rows_deleted AS last_run_rows_deleted,
+    lr.duration_ms AS last_run_duration_ms,
+    lr.last_run_error,
+    lr.last_run_created_at,
+    COALESCE(rf.failed_runs_last_5, 0) AS failed_runs_last_5,
+    CASE
+        WHEN cfg.enabled = false THEN 'disabled'
+        WHEN st.config_name IS NULL OR st.last_status = 'never_run' THEN 'warning'
+        WHEN st.last_status = 'failed' THEN 'critical'
+        WHEN COALESCE(rf.failed_runs_last_5, 0) >= 2 THEN 'critical'
+        WHEN COALESCE(st.last_finished_at, st.last_started_at, st.updated_at) IS NULL THEN 'warning'
+        WHEN (mc.local_now::time >= mc.active_window_start AND mc.local_now::time < mc.active_window_end)
+             AND EXTRACT(EPOCH FROM (now() - COALESCE(st.last_finished_at, st.last_started_at, st.updated_at))) / 60.0
+             > GREATEST((cfg.poll_seconds * 3.0) / 60.0, 15.0) THEN 'critical'
+        WHEN st.last_status = 'bootstrapped' THEN 'warning'
+        ELSE 'ok'
+    END AS health_status
+FROM etl.cdc_table_config cfg
+CROSS JOIN monitor_config mc
+LEFT JOIN etl.cdc_state st
+    ON st.config_name = cfg.config_name
+LEFT JOIN LATERAL (
+    SELECT
+        rl.status AS last_run_status,
+        rl.rows_read,
+        rl.rows_upserted,
+        rl.rows_deleted,
+        rl.duration_ms,
+        rl.error_text AS last_run_error,
+        rl.created_at AS last_run_created_at
+    FROM etl.cdc_run_log rl
+    WHERE rl.config_name = cfg.config_name
+      AND rl.created_at >= date_trunc('month', now()) - interval '1 month'
+    ORDER BY rl.run_id DESC
+    LIMIT 1
+) lr
+    ON true
+LEFT JOIN LATERAL (
+    SELECT count(*) FILTER (WHERE recent.status = 'failed') AS failed_runs_last_5
+    FROM (
+        SELECT rl.status
+        FROM etl.cdc_run_log rl
+        WHERE rl.config_name = cfg.config_name
+          AND rl.created_at >= date_trunc('month', now()) - interval '1 month'
+        ORDER BY rl.run_id DESC
+        LIMIT 5
+    ) recent
+) rf
+    ON true
+WHERE cfg.mode = 'cdc';
+
+-- Throughput horario acotado a la particion del mes en curso
+CREATE OR REPLACE VIEW etl.v_cdc_throughput_hourly AS
+SELECT
+    rl.config_name,
+    date_trunc('hour', rl.created_at) AS hour_bucket,
+    count(*) AS runs,
+    sum(rl.rows_read) AS rows_read,
+    sum(rl.rows_upserted) AS rows_upserted,
+    sum(rl.rows_deleted) AS rows_deleted,
+    percentile_cont(0.5) WITHIN GROUP (
+        ORDER BY rl.rows_read * 1000.0 / NULLIF(rl.duration_ms, 0)
+    ) AS p50_rows_per_sec,
+    percentile_cont(0.95) WITHIN GROUP (
+        ORDER BY rl.rows_read * 1000.0 / NULLIF(rl.duration_ms, 0)
+    ) AS p95_rows_per_sec,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY rl.replication_lag_ms) AS p50_lag_ms,
+    percentile_cont(0.95) WITHIN GROUP (ORDER BY rl.replication_lag_ms) AS p95_lag_ms,
+    max(rl.replication_lag_ms) AS max_lag_ms,
+    sum(rl.read_lsn_window_ms) AS read_lsn_window_ms,
+    sum(rl.fetch_ms) AS fetch_ms,
+    sum(rl.collapse_ms) AS collapse_ms,
+    sum(rl.apply_deletes_ms) AS apply_deletes_ms,
+    sum(rl.apply_upserts_ms) AS apply_upserts_ms,
+    sum(rl.commit_ms) AS commit_ms
+FROM etl.cdc_run_log rl
+WHERE rl.status = 'success'
+  AND rl.created_at >= date_trunc('month', now())
+GROUP BY rl.config_name, date_trunc('hour', rl.created_at);
+
+-- Resumen diario para monitoreo: rollup para dias cerrados y particion actual para hoy
+CREATE OR REPLACE VIEW etl.v_cdc_run_log_daily AS
+SELECT
+    d.config_name,
+    d.run_date,
+    d.status,
+    d.runs,
+    d.rows_read,
+    d.rows_upserted,
+    d.rows_deleted,
+    d.rows_skipped,
+    d.p50_duration_ms,
+    d.p95_duration_ms,
+    d.p50_lag_ms,
+    d.p95_lag_ms
+FROM etl.cdc_run_log_daily d
+WHERE d.run_date < current_date
+UNION ALL
+SELECT
+    rl.config_name,
+    current_date AS run_date,
+    rl.status,
+    sum(rl.run_count) AS runs,
+    sum(rl.rows_read) AS rows_read,
+    sum(rl.rows_upserted) AS rows_upserted,
+    sum(rl.rows_deleted) AS rows_deleted,
+    sum(rl.rows_skipped) AS rows_skipped,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY rl.duration_ms::double precision / rl.run_count),
+    percentile_cont(0.95) WITHIN GROUP (ORDER BY rl.duration_ms::double precision / rl.run_count),
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY rl.replication_lag_ms),
+    percentile_cont(0.95) WITHIN GROUP (ORDER BY rl.replication_lag_ms)
+FROM etl.cdc_run_log rl
+WHERE rl.created_at >= current_date
+GROUP BY rl.config_name, rl.status;
+
+COMMIT;
+
+-- Particiones actuales y volumen por mes
+SELECT
+    child.relname AS particion,
+    pg_size_pretty(pg_total_relation_size(child.oid)) AS tamano
+FROM pg_inherits inh
+JOIN pg_class parent ON parent.oid = inh.inhparent
+JOIN pg_class child ON child.oid = inh.inhrelid
+WHERE parent.relname = 'cdc_run_log'
+ORDER BY child.relname;
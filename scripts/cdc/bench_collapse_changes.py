@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Iterable
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from scripts.cdc.cdc_replicar_tabla import (  # noqa: E402
+    TableConfig,
+    build_projection_plan,
+    collapse_changes,
+    normalize_lsn,
+)
+
+
+def collapse_changes_legacy(
+    columns: list[str],
+    rows: Iterable[tuple[Any, ...]],
+    config: TableConfig,
+    target_columns: list[str],
+) -> tuple[list[dict[str, Any]], list[tuple[Any, ...]], int]:
+    # Implementacion previa (row_map + payload por fila), conservada solo como referencia.
+    extracted_at = datetime.now()
+    normalized_columns = [column.lower() for column in columns]
+    pending: dict[tuple[Any, ...], tuple[str, dict[str, Any] | tuple[Any, ...]]] = {}
+    rowcount = 0
+
+    for row in rows:
+        rowcount += 1
+        row_map = {
+            normalized_columns[idx]: row[idx]
+            for idx in range(len(normalized_columns))
+        }
+        operation = row_map["__$operation"]
+        pk_value = tuple(row_map[column] for column in config.pk_columns)
+
+        if operation == 1:
+            pending[pk_value] = ("delete", pk_value)
+            continue
+
+        if operation not in (2, 4):
+            continue
+
+        payload: dict[str, Any] = {}
+        for column in target_columns:
+            if column == "fuente_origen":
+                payload[column] = config.source_label
+            elif column == "fecha_extraccion":
+                payload[column] = extracted_at
+            elif column == "cdc_lsn":
+                payload[column] = normalize_lsn(row_map["__$start_lsn"])
+            elif column == "estado_sincronizacion":
+                payload[column] = 0
+            else:
+                payload[column] = row_map.get(column)
+
+        pending[pk_value] = ("upsert", payload)
+
+    upserts: list[dict[str, Any]] = []
+    deletes: list[tuple[Any, ...]] = []
+    for action, data in pending.values():
+        if action == "upsert":
+            upserts.append(data)  # type: ignore[arg-type]
+        else:
+            deletes.append(data)  # type: ignore[arg-type]
+    return upserts, deletes, rowcount
+
+
+def build_synthetic_feed(
+    rows: int,
+    data_columns: int,
+    distinct_keys: int,
+    seed: int,
+) -> tuple[list[str], list[str], list[tuple[Any, ...]], TableConfig]:
+    rng = random.Random(seed)
+    data_names = [f"c_dato_{idx:02d}" for idx in range(data_columns)]
+    columns = [
+        "__$start_lsn",
+        "__$end_lsn",
+        "__$seqval",
+        "__$operation",
+        "__$update_mask",
+        "C_SUCU_EMPR",
+        "C_ARTICULO",
+        *[name.upper() for name in data_names],
+    ]
+    target_columns = [
+        "c_sucu_empr",
+        "c_articulo",
+        *data_names,
+        "fuente_origen",
+        "fecha_extraccion",
+        "cdc_lsn",
+        "estado_sincronizacion",
+    ]
+    feed: list[tuple[Any, ...]] = []
+    for idx in range(rows):
+        lsn = (idx // 10).to_bytes(10, "big")
+        key = rng.randrange(distinct_keys)
+        operation = 1 if rng.random() < 0.05 else rng.choice((2, 4))
+        feed.append(
+            (
+                lsn,
+                None,
+                idx.to_bytes(10, "big"),
+                operation,
+                b"\xff",
+                key % 400,
+                key,
+                *[rng.random() for _ in range(data_columns)],
+            )
+        )
+
+    config = TableConfig(
+        config_name="bench_t051_articulos_sucursal",
+        source_server="bench",
+        source_database="DiarcoP",
+        source_schema="dbo",
+        source_table="T051_ARTICULOS_SUCURSAL",
+        capture_instance="dbo_T051_ARTICULOS_SUCURSAL",
+        source_driver_env="SQLP_DRIVER",
+        source_port_env=None,
+        source_user_env="SQLP_USER",
+        source_password_env="SQLP_PASSWORD",
+        target_schema="src",
+        target_table="t051_articulos_sucursal",
+        pk_columns=("c_sucu_empr", "c_articulo"),
+        enabled=True,
+        mode="cdc",
+        poll_seconds=600,
+        batch_size=5000,
+        notes=None,
+    )
+    return columns, target_columns, feed, config
+
+
+def run_benchmark(rows: int, batch_size: int, data_columns: int, distinct_keys: int, seed: int) -> None:
+    columns, target_columns, feed, config = build_synthetic_feed(rows, data_columns, distinct_keys, seed)
+    batches = [feed[idx: idx + batch_size] for idx in range(0, len(feed), batch_size)]
+
+    started = perf_counter()
+    legacy_upserts = 0
+    for batch in batches:
+        upserts, _, _ = collapse_changes_legacy(columns, batch, config, target_columns)
+        legacy_upserts += len(upserts)
+    legacy_seconds = perf_counter() - started
+
+    started = perf_counter()
+    plan = build_projection_plan(columns, config, target_columns)
+    plan_upserts = 0
+    for batch in batches:
+        upserts, _, _ = collapse_changes(plan, batch, config)
+        plan_upserts += len(upserts)
+    plan_seconds = perf_counter() - started
+
+    if legacy_upserts != plan_upserts:
+        raise RuntimeError(f"Resultados distintos: legacy={legacy_upserts} plan={plan_upserts}")
+
+    print(
+        f"rows={rows} | batch_size={batch_size} | columnas={len(columns)} | "
+        f"upserts={plan_upserts}"
+    )
+    print(f"legacy : {legacy_seconds:8.2f}s | {rows / legacy_seconds:12,.0f} rows/s")
+    print(f"plan   : {plan_seconds:8.2f}s | {rows / plan_seconds:12,.0f} rows/s")
+    print(f"speedup: {legacy_seconds / plan_seconds:8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark de collapse_changes")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--data-columns", type=int, default=40)
+    parser.add_argument("--distinct-keys", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.batch_size, args.data_columns, args.distinct_keys, args.seed)
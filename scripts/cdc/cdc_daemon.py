@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from time import monotonic, sleep
+from typing import Any
+
+import psycopg2
+import pyodbc
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from scripts.cdc.cdc_replicar_tabla import (  # noqa: E402
+    ConnectionPool,
+    TableConfig,
+    format_lsn,
+    get_env_int,
+    group_configs_by_source,
+    load_enabled_configs,
+    load_run_metadata,
+    open_pg_conn,
+    open_sqlserver_conn,
+    procesar_tabla_cdc,
+    resolve_resume_lsn,
+    utc_now,
+    write_heartbeat,
+)
+
+
+@dataclass
+class TableSchedule:
+    config: TableConfig
+    interval_seconds: float
+    next_due: float
+    caught_up_lsn: bytes | None
+    needs_run: bool = True
+    last_heartbeat: float = 0.0
+
+
+def load_recent_activity(
+    pg_conn: psycopg2.extensions.connection,
+    config_names: list[str],
+    lookback_minutes: int,
+) -> dict[str, float]:
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT config_name, sum(rows_read)::float / NULLIF(sum(run_count), 0)
+            FROM etl.cdc_run_log
+            WHERE config_name = ANY(%s)
+              AND created_at >= date_trunc('month', now() - make_interval(mins => %s))
+              AND COALESCE(last_run_at, created_at) >= now() - make_interval(mins => %s)
+              AND status IN ('success', 'idle')
+            GROUP BY config_name
+            """,
+            (config_names, lookback_minutes, lookback_minutes),
+        )
+        rows = cur.fetchall()
+    return {config_name: avg_rows or 0.0 for config_name, avg_rows in rows}
+
+
+def check_pending_changes(
+    sql_conn: pyodbc.Connection,
+    schedules: list[TableSchedule],
+) -> tuple[bytes, list[bool]]:
+    # Un solo round trip por origen: max LSN mas un EXISTS por tabla sobre el
+    # indice clustered de cada tabla _CT, a partir del ultimo LSN aplicado.
+    probes = [schedule for schedule in schedules if schedule.caught_up_lsn is not None]
+    select_parts = ["sys.fn_cdc_get_max_lsn()"]
+    params: list[Any] = []
+    for schedule in probes:
+        select_parts.append(
+            "CASE WHEN EXISTS ("
+            f"SELECT 1 FROM cdc.[{schedule.config.capture_instance}_CT] WHERE __$start_lsn > ?"
+            ") THEN 1 ELSE 0 END"
+        )
+        params.append(schedule.caught_up_lsn)
+
+    cur = sql_conn.cursor()
+    cur.execute(f"SELECT {', '.join(select_parts)}", *params)
+    row = cur.fetchone()
+    if row is None or row[0] is None:
+        raise RuntimeError("No se pudo obtener max LSN")
+
+    flags = iter(row[1:])
+    pending = [
+        True if schedule.caught_up_lsn is None else bool(next(flags))
+        for schedule in schedules
+    ]
+    return row[0], pending
+
+
+def next_interval(
+    schedule: TableSchedule,
+    *,
+    rows_read: int,
+    min_poll_seconds: float,
+    backoff_factor: float,
+) -> float:
+    max_poll_seconds = max(float(schedule.config.poll_seconds), min_poll_seconds)
+    if rows_read > 0:
+        return max(min_poll_seconds, schedule.interval_seconds / backoff_factor)
+    return min(max_poll_seconds, schedule.interval_seconds * backoff_factor)
+
+
+class CdcDaemon:
+    def __init__(
+        self,
+        *,
+        config_names: tuple[str, ...] | None,
+        max_workers: int,
+        min_poll_seconds: float,
+        backoff_factor: float,
+        heartbeat_seconds: float,
+        config_refresh_seconds: float,
+        activity_lookback_minutes: int,
+        logger: logging.Logger,
+    ) -> None:
+        self.config_names = config_names
+        self.max_workers = max_workers
+        self.min_poll_seconds = min_poll_seconds
+        self.backoff_factor = backoff_factor
+        self.heartbeat_seconds = heartbeat_seconds
+        self.config_refresh_seconds = config_refresh_seconds
+        self.activity_lookback_minutes = activity_lookback_minutes
+        self.logger = logger
+        self.pg_pool = ConnectionPool()
+        self.sql_pool = ConnectionPool()
+        self.schedules: dict[str, TableSchedule] = {}
+        self.last_config_refresh = 0.0
+
+    def refresh_configs(self) -> None:
+        now = monotonic()
+        with self.pg_pool.acquire("pg", open_pg_conn) as pg_conn:
+            configs = load_enabled_configs(pg_conn, self.config_names)
+            new_names = [config.config_name for config in configs if config.config_name not in self.schedules]
+            activity = (
+                load_recent_activity(pg_conn, new_names, self.activity_lookback_minutes)
+                if new_names
+                else {}
+            )
+            resume_points = {
+                name: resolve_resume_lsn(load_run_metadata(pg_conn, name).state)
+                for name in new_names
+            }
+            pg_conn.commit()
+
+        current = {config.config_name: config for config in configs}
+        for name in list(self.schedules):
+            if name not in current:
+                self.logger.info("CDC daemon | config=%s deshabilitada; se deja de sondear", name)
+                del self.schedules[name]
+
+        for config in configs:
+            schedule = self.schedules.get(config.config_name)
+            if schedule is not None:
+                schedule.config = config
+                continue
+            busy = activity.get(config.config_name, 0.0) > 0
+            interval = self.min_poll_seconds if busy else float(config.poll_seconds)
+            self.schedules[config.config_name] = TableSchedule(
+                config=config,
+                interval_seconds=max(self.min_poll_seconds, interval),
+                next_due=now,
+                caught_up_lsn=resume_points.get(config.config_name),
+            )
+            self.logger.info(
+                "CDC daemon | config=%s | intervalo_inicial=%.0fs | resume_lsn=%s",
+                config.config_name,
+                interval,
+                format_lsn(resume_points.get(config.config_name)),
+            )
+        self.last_config_refresh = now
+
+    def run_table(self, schedule: TableSchedule, max_lsn: bytes) -> dict[str, Any]:
+        config = schedule.config
+        with self.pg_pool.acquire("pg", open_pg_conn) as pg_conn, self.sql_pool.acquire(
+            config.source_key,
+            lambda: open_sqlserver_conn(config),
+        ) as sql_conn:
+            return procesar_tabla_cdc(
+                config.config_name,
+                pg_conn=pg_conn,
+                sql_conn=sql_conn,
+                bootstrap_mode="current_max_lsn",
+                logger=self.logger,
+                max_lsn=max_lsn,
+            )
+
+    def heartbeat(self, schedule: TableSchedule, now: float) -> None:
+        if now - schedule.last_heartbeat < self.heartbeat_seconds:
+            return
+        heartbeat_at = utc_now()
+        with self.pg_pool.acquire("pg", open_pg_conn) as pg_conn:
+            write_heartbeat(pg_conn, schedule.config.config_name, heartbeat_at=heartbeat_at)
+            pg_conn.commit()
+        schedule.last_heartbeat = now
+
+    def reschedule(self, schedule: TableSchedule, rows_read: int, now: float) -> None:
+        schedule.interval_seconds = next_interval(
+            schedule,
+            rows_read=rows_read,
+            min_poll_seconds=self.min_poll_seconds,
+            backoff_factor=self.backoff_factor,
+        )
+        schedule.next_due = now + schedule.interval_seconds
+
+    def tick(self, executor: ThreadPoolExecutor) -> None:
+        now = monotonic()
+        due = [schedule for schedule in self.schedules.values() if schedule.next_due <= now]
+        if not due:
+            return
+
+        # Primero se sondean y lanzan todos los origenes; recien despues se esperan los
+        # resultados, asi una tabla lenta de un origen no demora el sondeo de los demas.
+        running: dict[Future, tuple[TableSchedule, bytes]] = {}
+        for source_key, configs in group_configs_by_source(schedule.config for schedule in due).items():
+            group = [self.schedules[config.config_name] for config in configs]
+            try:
+                with self.sql_pool.acquire(source_key, lambda: open_sqlserver_conn(configs[0])) as sql_conn:
+                    max_lsn, pending = check_pending_changes(sql_conn, group)
+            except Exception:
+                self.logger.exception(
+                    "CDC daemon | no se pudo sondear el origen %s.%s; se reintenta en el proximo tick",
+                    source_key[0],
+                    source_key[1],
+                )
+                for schedule in group:
+                    schedule.next_due = now + self.min_poll_seconds
+                continue
+
+            for schedule, has_changes in zip(group, pending):
+                if has_changes or schedule.needs_run:
+                    running[executor.submit(self.run_table, schedule, max_lsn)] = (schedule, max_lsn)
+                    continue
+                try:
+                    self.heartbeat(schedule, now)
+                except Exception:
+                    self.logger.exception(
+                        "CDC daemon | no se pudo registrar heartbeat de %s",
+                        schedule.config.config_name,
+                    )
+                self.reschedule(schedule, 0, now)
+
+        for future in as_completed(running):
+            schedule, max_lsn = running[future]
+            try:
+                result = future.result()
+            except Exception:
+                # procesar_tabla_cdc ya dejo el estado failed en etl.cdc_state.
+                schedule.needs_run = True
+                schedule.interval_seconds = float(schedule.config.poll_seconds)
+                schedule.next_due = now + schedule.interval_seconds
+                continue
+
+            schedule.caught_up_lsn = max_lsn
+            # Tras un snapshot el estado queda en snapshot_lsn, no en max_lsn: se drena en el proximo tick.
+            schedule.needs_run = result.get("status") == "snapshot"
+            schedule.last_heartbeat = now
+            self.reschedule(schedule, int(result.get("rows_read", 0)), now)
+
+    def run(self, max_runtime_seconds: float | None = None) -> None:
+        started = monotonic()
+        self.refresh_configs()
+        if not self.schedules:
+            raise RuntimeError("No hay configuraciones CDC habilitadas para el daemon.")
+
+        self.logger.info(
+            "CDC daemon iniciado | tablas=%s | workers=%s | min_poll=%ss | inicio=%s",
+            len(self.schedules),
+            self.max_workers,
+            self.min_poll_seconds,
+            datetime.now().isoformat(timespec="seconds"),
+        )
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while max_runtime_seconds is None or monotonic() - started < max_runtime_seconds:
+                    if monotonic() - self.last_config_refresh >= self.config_refresh_seconds:
+                        try:
+                            self.refresh_configs()
+                        except Exception:
+                            self.logger.exception("CDC daemon | no se pudo refrescar la configuracion")
+
+                    self.tick(executor)
+
+                    if not self.schedules:
+                        sleep(self.config_refresh_seconds)
+                        continue
+                    next_due = min(schedule.next_due for schedule in self.schedules.values())
+                    sleep(max(0.5, min(next_due - monotonic(), self.config_refresh_seconds)))
+        finally:
+            self.sql_pool.close_all()
+            self.pg_pool.close_all()
+            self.logger.info("CDC daemon detenido")
+
+
+def cdc_daemon(
+    config_names: str | None = None,
+    max_workers: int | None = None,
+    min_poll_seconds: float = 5.0,
+    backoff_factor: float = 2.0,
+    heartbeat_seconds: float = 60.0,
+    config_refresh_seconds: float = 300.0,
+    activity_lookback_minutes: int = 60,
+    max_runtime_seconds: float | None = None,
+) -> None:
+    logger = logging.getLogger("cdc_daemon")
+    parsed_names = tuple(name.strip() for name in (config_names or "").split(",") if name.strip()) or None
+    daemon = CdcDaemon(
+        config_names=parsed_names,
+        max_workers=max(1, max_workers or get_env_int("CDC_MAX_WORKERS", 4)),
+        min_poll_seconds=max(1.0, min_poll_seconds),
+        backoff_factor=max(1.1, backoff_factor),
+        heartbeat_seconds=heartbeat_seconds,
+        config_refresh_seconds=config_refresh_seconds,
+        activity_lookback_minutes=activity_lookback_minutes,
+        logger=logger,
+    )
+    daemon.run(max_runtime_seconds=max_runtime_seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Daemon CDC SQL Server -> PostgreSQL con polling adaptativo")
+    parser.add_argument("--config-names", default=None, help="Lista separada por coma; default: todas las habilitadas")
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--min-poll-seconds", type=float, default=5.0)
+    parser.add_argument("--backoff-factor", type=float, default=2.0)
+    parser.add_argument("--heartbeat-seconds", type=float, default=60.0)
+    parser.add_argument("--config-refresh-seconds", type=float, default=300.0)
+    parser.add_argument("--activity-lookback-minutes", type=int, default=60)
+    parser.add_argument("--max-runtime-seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    try:
+        cdc_daemon(
+            config_names=args.config_names,
+            max_workers=args.max_workers,
+            min_poll_seconds=args.min_poll_seconds,
+            backoff_factor=args.backoff_factor,
+            heartbeat_seconds=args.heartbeat_seconds,
+            config_refresh_seconds=args.config_refresh_seconds,
+            activity_lookback_minutes=args.activity_lookback_minutes,
+            max_runtime_seconds=args.max_runtime_seconds,
+        )
+    except KeyboardInterrupt:
+        logging.getLogger("cdc_daemon").info("CDC daemon interrumpido por el usuario")
@@ -1,19 +1,27 @@
 from __future__ import annotations
 
+import hashlib
+import io
 import os
 import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from dataclasses import dataclass
-from datetime import datetime, timezone
+from operator import itemgetter
+from datetime import date, datetime, time as datetime_time, timezone
+from decimal import Decimal
 from pathlib import Path
 from time import perf_counter
-from typing import Any, Iterable
+from typing import Any, Callable, Iterable, Iterator
 
 import psycopg2
 import pyodbc
 from dotenv import load_dotenv
 from prefect import flow, get_run_logger
 from psycopg2 import sql
-from psycopg2.extras import execute_values
+from psycopg2.extras import Json
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
@@ -23,6 +31,33 @@ if str(PROJECT_ROOT) not in sys.path:
 ENV_PATH = os.environ.get("ETL_ENV_PATH", str(PROJECT_ROOT / ".env"))
 load_dotenv(ENV_PATH)
 
+TABLE_CONFIG_COLUMNS = (
+    "config_name",
+    "source_server",
+    "source_database",
+    "source_schema",
+    "source_table",
+    "capture_instance",
+    "source_driver_env",
+    "source_port_env",
+    "source_user_env",
+    "source_password_env",
+    "target_schema",
+    "target_table",
+    "pk_columns",
+    "enabled",
+    "mode",
+    "poll_seconds",
+    "batch_size",
+    "notes",
+    "max_window_changes",
+    "max_window_minutes",
+)
+
+def table_config_select(alias: str) -> str:
+    return ", ".join(f"{alias}.{column}" for column in TABLE_CONFIG_COLUMNS)
+
+
 @dataclass(frozen=True)
 class TableConfig:
     config_name: str
@@ -43,6 +78,12 @@ class TableConfig:
     poll_seconds: int
     batch_size: int
     notes: str | None
+    max_window_changes: int | None = None
+    max_window_minutes: int | None = None
+
+    @property
+    def source_key(self) -> tuple[str, str]:
+        return (self.source_server, self.source_database)
 
     @property
     def source_label(self) -> str:
@@ -54,6 +95,32 @@ class TableConfig:
         )
 
 
+RUN_PHASES = (
+    "read_lsn_window",
+    "fetch",
+    "collapse",
+    "apply_deletes",
+    "apply_upserts",
+    "commit",
+)
+
+
+class PhaseTimer:
+    def __init__(self) -> None:
+        self.totals_ms: dict[str, float] = {phase: 0.0 for phase in RUN_PHASES}
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.totals_ms[phase] += (perf_counter() - started) * 1000
+
+    def as_ms(self) -> dict[str, int]:
+        return {phase: int(value) for phase, value in self.totals_ms.items()}
+
+
 def require_env(name: str) -> str:
     value = os.getenv(name)
     if not value:
@@ -139,6 +206,8 @@ def parse_table_config(row: tuple[Any, ...]) -> TableConfig:
         poll_seconds=row[15],
         batch_size=row[16],
         notes=row[17],
+        max_window_changes=row[18],
+        max_window_minutes=row[19],
     )
 
 
@@ -149,6 +218,40 @@ def format_lsn(lsn: bytes | None) -> str | None:
     return "0x" + lsn.hex().upper()
 
 
+# snapshot_last_pk se guarda en jsonb: los tipos sin equivalente JSON se marcan para
+# que la PK retomada se compare en SQL Server con su tipo original y no como texto.
+PK_VALUE_DECODERS: dict[str, Callable[[str], Any]] = {
+    "datetime": datetime.fromisoformat,
+    "date": date.fromisoformat,
+    "time": datetime_time.fromisoformat,
+    "decimal": Decimal,
+    "bytes": bytes.fromhex,
+    "uuid": uuid.UUID,
+}
+
+
+def encode_pk_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$type": "datetime", "value": value.isoformat()}
+    if isinstance(value, date):
+        return {"$type": "date", "value": value.isoformat()}
+    if isinstance(value, datetime_time):
+        return {"$type": "time", "value": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"$type": "decimal", "value": str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {"$type": "bytes", "value": bytes(value).hex()}
+    if isinstance(value, uuid.UUID):
+        return {"$type": "uuid", "value": str(value)}
+    return value
+
+
+def decode_pk_value(value: Any) -> Any:
+    if isinstance(value, dict) and value.get("$type") in PK_VALUE_DECODERS:
+        return PK_VALUE_DECODERS[value["$type"]](value["value"])
+    return value
+
+
 def ensure_state_row(pg_conn: psycopg2.extensions.connection, config_name: str) -> None:
     with pg_conn.cursor() as cur:
         cur.execute(
@@ -162,68 +265,142 @@ def ensure_state_row(pg_conn: psycopg2.extensions.connection, config_name: str)
     pg_conn.commit()
 
 
-def get_table_config(pg_conn: psycopg2.extensions.connection, config_name: str) -> TableConfig:
-    with pg_conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT
-                config_name,
-                source_server,
-                source_database,
-                source_schema,
-                source_table,
-                capture_instance,
-                source_driver_env,
-                source_port_env,
-                source_user_env,
-                source_password_env,
-                target_schema,
-                target_table,
-                pk_columns,
-                enabled,
-                mode,
-                poll_seconds,
-                batch_size,
-                notes
-            FROM etl.cdc_table_config
-            WHERE config_name = %s
-            """,
-            (config_name,),
-        )
-        row = cur.fetchone()
-    if row is None:
-        raise RuntimeError(f"No existe configuracion CDC para: {config_name}")
-    return parse_table_config(row)
-
-
-def get_state(
+@dataclass(frozen=True)
+class RunMetadata:
+    config: TableConfig
+    config_updated_at: datetime
+    state: dict[str, Any]
+    target_columns: list[str]
+
+
+class MetadataCache:
+    """Columnas destino por (target_schema, target_table), validas mientras no cambie
+    cdc_table_config.updated_at. Si se altera la tabla destino, tocar updated_at."""
+
+    def __init__(self) -> None:
+        self._columns: dict[tuple[str, str], tuple[datetime, list[str]]] = {}
+        self._targets: dict[str, tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def cached_updated_at(self, config_name: str) -> datetime | None:
+        with self._lock:
+            target_key = self._targets.get(config_name)
+            entry = self._columns.get(target_key) if target_key else None
+        return entry[0] if entry else None
+
+    def get_columns(self, target_key: tuple[str, str], updated_at: datetime) -> list[str] | None:
+        with self._lock:
+            entry = self._columns.get(target_key)
+        if entry is None or entry[0] != updated_at:
+            return None
+        return entry[1]
+
+    def store(
+        self,
+        config_name: str,
+        target_key: tuple[str, str],
+        updated_at: datetime,
+        columns: list[str],
+    ) -> None:
+        with self._lock:
+            self._targets[config_name] = target_key
+            self._columns[target_key] = (updated_at, columns)
+
+
+METADATA_CACHE = MetadataCache()
+
+
+def load_run_metadata(
     pg_conn: psycopg2.extensions.connection,
     config_name: str,
-) -> dict[str, Any]:
+    cache: MetadataCache = METADATA_CACHE,
+) -> RunMetadata:
+    # Config, estado y (solo si el cache esta vencido) columnas destino en un unico round trip.
+    cached_updated_at = cache.cached_updated_at(config_name)
     with pg_conn.cursor() as cur:
         cur.execute(
-            """
+            f"""
             SELECT
-                last_start_lsn,
-                last_end_lsn,
-                last_status,
-                last_rowcount,
-                last_error
-            FROM etl.cdc_state
-            WHERE config_name = %s
+                {table_config_select("cfg")},
+                cfg.updated_at,
+                st.config_name IS NOT NULL AS has_state,
+                st.last_start_lsn,
+                st.last_end_lsn,
+                st.last_status,
+                st.last_rowcount,
+                st.last_error,
+                st.checkpoint_lsn,
+                st.checkpoint_seqval,
+                st.snapshot_lsn,
+                st.snapshot_last_pk,
+                st.snapshot_rows,
+                CASE
+                    WHEN cfg.updated_at IS DISTINCT FROM %s::timestamptz THEN (
+                        SELECT array_agg(c.column_name::text ORDER BY c.ordinal_position)
+                        FROM information_schema.columns c
+                        WHERE c.table_schema = cfg.target_schema
+                          AND c.table_name = cfg.target_table
+                    )
+                END AS target_columns
+            FROM etl.cdc_table_config cfg
+            LEFT JOIN etl.cdc_state st
+                ON st.config_name = cfg.config_name
+            WHERE cfg.config_name = %s
             """,
-            (config_name,),
+            (cached_updated_at, config_name),
         )
         row = cur.fetchone()
     if row is None:
-        raise RuntimeError(f"No existe estado CDC para: {config_name}")
-    return {
-        "last_start_lsn": normalize_lsn(row[0]),
-        "last_end_lsn": normalize_lsn(row[1]),
-        "last_status": row[2],
-        "last_rowcount": row[3],
-        "last_error": row[4],
+        raise RuntimeError(f"No existe configuracion CDC para: {config_name}")
+
+    offset = len(TABLE_CONFIG_COLUMNS)
+    config = parse_table_config(row[:offset])
+    config_updated_at = row[offset]
+    has_state = row[offset + 1]
+    target_key = (config.target_schema, config.target_table)
+
+    target_columns = row[offset + 13]
+    if target_columns is None:
+        target_columns = cache.get_columns(target_key, config_updated_at)
+    if target_columns is None:
+        # El cache apuntaba a otra tabla destino para este config_name.
+        target_columns = get_target_columns(pg_conn, config.target_schema, config.target_table)
+    if not target_columns:
+        raise RuntimeError(f"No existe la tabla destino {config.target_schema}.{config.target_table}")
+    cache.store(config_name, target_key, config_updated_at, list(target_columns))
+
+    if not has_state:
+        ensure_state_row(pg_conn, config_name)
+
+    state = {
+        "last_start_lsn": normalize_lsn(row[offset + 2]),
+        "last_end_lsn": normalize_lsn(row[offset + 3]),
+        "last_status": row[offset + 4] if has_state else "never_run",
+        "last_rowcount": row[offset + 5] if has_state else 0,
+        "last_error": row[offset + 6],
+        "checkpoint_lsn": normalize_lsn(row[offset + 7]),
+        "checkpoint_seqval": normalize_lsn(row[offset + 8]),
+        "snapshot_lsn": normalize_lsn(row[offset + 9]),
+        "snapshot_last_pk": (
+            [decode_pk_value(value) for value in row[offset + 10]] if row[offset + 10] is not None else None
+        ),
+        "snapshot_rows": row[offset + 11] or 0,
     }
+    return RunMetadata(
+        config=config,
+        config_updated_at=config_updated_at,
+        state=state,
+        target_columns=list(target_columns),
+    )
+
+
+def resolve_resume_lsn(state: dict[str, Any]) -> bytes | None:
+    candidates = [
+        lsn
+        for lsn in (state["last_end_lsn"], state["checkpoint_lsn"])
+        if lsn is not None
+    ]
+    return max(candidates) if candidates else None
 
 
 def update_state(
@@ -265,6 +442,188 @@ def update_state(
         )
 
 
+def mark_state_failed(
+    pg_conn: psycopg2.extensions.connection,
+    config_name: str,
+    *,
+    last_error: str,
+    last_started_at: datetime,
+    last_finished_at: datetime,
+) -> None:
+    # No toca LSNs: conserva last_end_lsn de las ventanas ya confirmadas y el checkpoint.
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE etl.cdc_state
+            SET last_status = 'failed',
+                last_rowcount = 0,
+                last_error = %s,
+                last_started_at = %s,
+                last_finished_at = %s,
+                updated_at = now()
+            WHERE config_name = %s
+            """,
+            (last_error, last_started_at, last_finished_at, config_name),
+        )
+
+
+def write_heartbeat(
+    pg_conn: psycopg2.extensions.connection,
+    config_name: str,
+    *,
+    heartbeat_at: datetime,
+) -> None:
+    # Sondeo sin cambios del daemon: refresca la marca temporal sin tocar LSNs ni run_log.
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE etl.cdc_state
+            SET last_status = 'idle',
+                last_rowcount = 0,
+                last_error = NULL,
+                last_started_at = %s,
+                last_finished_at = %s,
+                updated_at = now()
+            WHERE config_name = %s
+            """,
+            (heartbeat_at, heartbeat_at, config_name),
+        )
+
+
+def advance_state_window(
+    pg_conn: psycopg2.extensions.connection,
+    config_name: str,
+    last_end_lsn: bytes,
+) -> None:
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE etl.cdc_state
+            SET last_end_lsn = %s,
+                checkpoint_lsn = NULL,
+                checkpoint_seqval = NULL,
+                checkpoint_at = NULL,
+                updated_at = now()
+            WHERE config_name = %s
+            """,
+            (last_end_lsn, config_name),
+        )
+
+
+def save_snapshot_progress(
+    pg_conn: psycopg2.extensions.connection,
+    config_name: str,
+    *,
+    snapshot_lsn: bytes,
+    snapshot_last_pk: list[Any] | None,
+    snapshot_rows: int,
+) -> None:
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE etl.cdc_state
+            SET snapshot_lsn = %s,
+                snapshot_last_pk = %s,
+                snapshot_rows = %s,
+                snapshot_started_at = COALESCE(snapshot_started_at, now()),
+                updated_at = now()
+            WHERE config_name = %s
+            """,
+            (
+                snapshot_lsn,
+                Json([encode_pk_value(value) for value in snapshot_last_pk])
+                if snapshot_last_pk is not None
+                else None,
+                snapshot_rows,
+                config_name,
+            ),
+        )
+
+
+def clear_snapshot_progress(pg_conn: psycopg2.extensions.connection, config_name: str) -> None:
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE etl.cdc_state
+            SET snapshot_lsn = NULL,
+                snapshot_last_pk = NULL,
+                snapshot_rows = NULL,
+                snapshot_started_at = NULL
+            WHERE config_name = %s
+            """,
+            (config_name,),
+        )
+
+
+def save_checkpoint(
+    pg_conn: psycopg2.extensions.connection,
+    config_name: str,
+    *,
+    checkpoint_lsn: bytes,
+    checkpoint_seqval: bytes | None,
+) -> None:
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE etl.cdc_state
+            SET checkpoint_lsn = %s,
+                checkpoint_seqval = %s,
+                checkpoint_at = now()
+            WHERE config_name = %s
+            """,
+            (checkpoint_lsn, checkpoint_seqval, config_name),
+        )
+
+
+def clear_checkpoint(pg_conn: psycopg2.extensions.connection, config_name: str) -> None:
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE etl.cdc_state
+            SET checkpoint_lsn = NULL,
+                checkpoint_seqval = NULL,
+                checkpoint_at = NULL
+            WHERE config_name = %s
+            """,
+            (config_name,),
+        )
+
+
+def coalesce_idle_run(
+    pg_conn: psycopg2.extensions.connection,
+    config: TableConfig,
+    *,
+    to_lsn: bytes | None,
+    duration_ms: int,
+) -> bool:
+    # Corridas idle consecutivas del mismo dia se acumulan en la ultima fila idle
+    # (run_count / last_run_at) en lugar de insertar una fila por poll.
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE etl.cdc_run_log rl
+            SET
+                run_count = rl.run_count + 1,
+                last_run_at = now(),
+                to_lsn = %s,
+                duration_ms = COALESCE(rl.duration_ms, 0) + %s
+            FROM (
+                SELECT run_id, created_at, status
+                FROM etl.cdc_run_log
+                WHERE config_name = %s
+                  AND created_at >= current_date
+                ORDER BY run_id DESC
+                LIMIT 1
+            ) latest
+            WHERE rl.run_id = latest.run_id
+              AND rl.created_at = latest.created_at
+              AND latest.status = 'idle'
+            """,
+            (to_lsn, duration_ms, config.config_name),
+        )
+        return cur.rowcount > 0
+
+
 def insert_run_log(
     pg_conn: psycopg2.extensions.connection,
     config: TableConfig,
@@ -277,7 +636,20 @@ def insert_run_log(
     status: str,
     duration_ms: int,
     error_text: str | None,
+    rows_skipped: int = 0,
+    phase_ms: dict[str, int] | None = None,
+    source_commit_time: datetime | None = None,
+    replication_lag_ms: int | None = None,
 ) -> None:
+    if status == "idle" and coalesce_idle_run(
+        pg_conn,
+        config,
+        to_lsn=to_lsn,
+        duration_ms=duration_ms,
+    ):
+        return
+
+    phase_ms = phase_ms or {}
     with pg_conn.cursor() as cur:
         cur.execute(
             """
@@ -289,11 +661,20 @@ def insert_run_log(
                 rows_read,
                 rows_upserted,
                 rows_deleted,
+                rows_skipped,
                 status,
                 duration_ms,
-                error_text
+                error_text,
+                read_lsn_window_ms,
+                fetch_ms,
+                collapse_ms,
+                apply_deletes_ms,
+                apply_upserts_ms,
+                commit_ms,
+                source_commit_time,
+                replication_lag_ms
             )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """,
             (
                 config.config_name,
@@ -303,20 +684,67 @@ def insert_run_log(
                 rows_read,
                 rows_upserted,
                 rows_deleted,
+                rows_skipped,
                 status,
                 duration_ms,
                 error_text,
+                phase_ms.get("read_lsn_window"),
+                phase_ms.get("fetch"),
+                phase_ms.get("collapse"),
+                phase_ms.get("apply_deletes"),
+                phase_ms.get("apply_upserts"),
+                phase_ms.get("commit"),
+                source_commit_time,
+                replication_lag_ms,
             ),
         )
 
 
-def get_min_lsn(sql_conn: pyodbc.Connection, capture_instance: str) -> bytes:
+def read_lsn_window(
+    sql_conn: pyodbc.Connection,
+    capture_instance: str,
+    resume_lsn: bytes | None,
+) -> tuple[bytes, bytes, bytes | None]:
+    # min LSN, max LSN y siguiente LSN a procesar en un unico round trip a SQL Server.
     cur = sql_conn.cursor()
-    cur.execute("SELECT sys.fn_cdc_get_min_lsn(?)", capture_instance)
+    if resume_lsn is None:
+        cur.execute(
+            "SELECT sys.fn_cdc_get_min_lsn(?), sys.fn_cdc_get_max_lsn(), NULL",
+            capture_instance,
+        )
+    else:
+        cur.execute(
+            "SELECT sys.fn_cdc_get_min_lsn(?), sys.fn_cdc_get_max_lsn(), sys.fn_cdc_increment_lsn(?)",
+            capture_instance,
+            resume_lsn,
+        )
     row = cur.fetchone()
     if row is None or row[0] is None:
         raise RuntimeError(f"No se pudo obtener min LSN para {capture_instance}")
-    return row[0]
+    if row[1] is None:
+        raise RuntimeError("No se pudo obtener max LSN")
+    return row[0], row[1], row[2]
+
+
+def get_replication_lag(
+    sql_conn: pyodbc.Connection,
+    lsn: bytes,
+) -> tuple[datetime | None, int | None]:
+    # Hora de commit en origen del LSN aplicado y su atraso, ambos medidos con el reloj de SQL Server.
+    cur = sql_conn.cursor()
+    cur.execute(
+        """
+        SELECT
+            commit_time,
+            DATEDIFF_BIG(MILLISECOND, commit_time, SYSDATETIME())
+        FROM (SELECT sys.fn_cdc_map_lsn_to_time(?) AS commit_time) t
+        """,
+        lsn,
+    )
+    row = cur.fetchone()
+    if row is None or row[0] is None:
+        return None, None
+    return row[0], int(row[1])
 
 
 def get_max_lsn(sql_conn: pyodbc.Connection) -> bytes:
@@ -337,6 +765,58 @@ def increment_lsn(sql_conn: pyodbc.Connection, lsn: bytes) -> bytes:
     return row[0]
 
 
+def get_window_end_lsn(
+    sql_conn: pyodbc.Connection,
+    config: TableConfig,
+    from_lsn: bytes,
+    max_lsn: bytes,
+) -> bytes:
+    end_lsn = max_lsn
+    cur = sql_conn.cursor()
+
+    if config.max_window_changes:
+        # Recorre el indice clustered de la tabla _CT: el costo es TOP (n), no el backlog completo.
+        cur.execute(
+            f"""
+            SELECT MAX(w.__$start_lsn)
+            FROM (
+                SELECT TOP (?) __$start_lsn
+                FROM cdc.[{config.capture_instance}_CT]
+                WHERE __$start_lsn >= ?
+                  AND __$start_lsn <= ?
+                ORDER BY __$start_lsn, __$seqval
+            ) w
+            """,
+            config.max_window_changes,
+            from_lsn,
+            max_lsn,
+        )
+        row = cur.fetchone()
+        if row is not None and row[0] is not None and row[0] < end_lsn:
+            end_lsn = row[0]
+
+    if config.max_window_minutes:
+        cur.execute(
+            """
+            SELECT sys.fn_cdc_map_time_to_lsn(
+                'largest less than or equal',
+                DATEADD(
+                    MINUTE,
+                    ?,
+                    (SELECT MIN(tran_end_time) FROM cdc.lsn_time_mapping WHERE start_lsn >= ?)
+                )
+            )
+            """,
+            config.max_window_minutes,
+            from_lsn,
+        )
+        row = cur.fetchone()
+        if row is not None and row[0] is not None and from_lsn <= row[0] < end_lsn:
+            end_lsn = row[0]
+
+    return end_lsn
+
+
 def get_target_columns(
     pg_conn: psycopg2.extensions.connection,
     schema_name: str,
@@ -380,110 +860,300 @@ def get_fetch_size(config: TableConfig) -> int:
     return max(100, get_env_int("CDC_FETCH_SIZE", config.batch_size))
 
 
-def collapse_changes(
+def iter_transaction_batches(
+    cursor: pyodbc.Cursor,
+    fetch_size: int,
+    lsn_index: int,
+) -> Iterator[list[tuple[Any, ...]]]:
+    # Cada lote termina en un limite de transaccion: las filas del ultimo
+    # __$start_lsn leido quedan retenidas hasta ver el siguiente LSN, asi el
+    # checkpoint nunca apunta a una transaccion aplicada a medias.
+    carry: list[tuple[Any, ...]] = []
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            if carry:
+                yield carry
+            return
+
+        pending = carry + list(rows)
+        last_lsn = pending[-1][lsn_index]
+        split_at = len(pending)
+        while split_at > 0 and pending[split_at - 1][lsn_index] == last_lsn:
+            split_at -= 1
+
+        if split_at == 0:
+            carry = pending
+            continue
+
+        carry = pending[split_at:]
+        yield pending[:split_at]
+
+
+CONSTANT_COLUMNS = ("fuente_origen", "fecha_extraccion", "estado_sincronizacion")
+CDC_METADATA_COLUMNS = CONSTANT_COLUMNS + ("cdc_lsn",)
+
+
+@dataclass(frozen=True)
+class ProjectionPlan:
+    source_columns: tuple[str, ...]
+    columns: tuple[str, ...]
+    constant_columns: tuple[str, ...]
+    operation_index: int
+    values_getter: Callable[[Any], tuple[Any, ...]]
+    pk_getter: Callable[[Any], tuple[Any, ...]]
+
+    def constant_values(
+        self,
+        config: TableConfig,
+        extracted_at: datetime,
+        cdc_lsn: bytes | None = None,
+    ) -> tuple[Any, ...]:
+        values = {
+            "fuente_origen": config.source_label,
+            "fecha_extraccion": extracted_at,
+            "estado_sincronizacion": 0,
+            "cdc_lsn": cdc_lsn,
+        }
+        return tuple(values.get(column) for column in self.constant_columns)
+
+
+def tuple_getter(indexes: list[int]) -> Callable[[Any], tuple[Any, ...]]:
+    # itemgetter con un solo indice devuelve un escalar; se normaliza a tupla.
+    if not indexes:
+        return lambda row: ()
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda row: (row[index],)
+    return itemgetter(*indexes)
+
+
+def build_projection_plan(
     columns: list[str],
-    rows: Iterable[tuple[Any, ...]],
     config: TableConfig,
     target_columns: list[str],
-) -> tuple[list[dict[str, Any]], list[tuple[Any, ...]], int]:
-    extracted_at = datetime.now()
+) -> ProjectionPlan:
     normalized_columns = [column.lower() for column in columns]
-    pending: dict[tuple[Any, ...], tuple[str, dict[str, Any] | tuple[Any, ...]]] = {}
+    source_index = {column: idx for idx, column in enumerate(normalized_columns)}
+
+    missing_pk = [column for column in config.pk_columns if column not in source_index]
+    if missing_pk:
+        raise RuntimeError(
+            f"Las columnas PK {missing_pk} no existen en el origen {config.source_label}"
+        )
+
+    # Las columnas con origen en la fila CDC van primero y las constantes al final,
+    # asi cada fila destino se arma con un solo itemgetter mas una tupla fija.
+    # Sin columnas __$ (lectura snapshot de la tabla origen) cdc_lsn pasa a ser constante.
+    mapped_columns: list[str] = []
+    mapped_indexes: list[int] = []
+    constant_columns: list[str] = []
+    for column in target_columns:
+        if column == "cdc_lsn" and "__$start_lsn" in source_index:
+            mapped_columns.append(column)
+            mapped_indexes.append(source_index["__$start_lsn"])
+        elif column not in CONSTANT_COLUMNS and column in source_index:
+            mapped_columns.append(column)
+            mapped_indexes.append(source_index[column])
+        else:
+            constant_columns.append(column)
+
+    return ProjectionPlan(
+        source_columns=tuple(normalized_columns),
+        columns=tuple(mapped_columns + constant_columns),
+        constant_columns=tuple(constant_columns),
+        operation_index=source_index.get("__$operation", -1),
+        values_getter=tuple_getter(mapped_indexes),
+        pk_getter=tuple_getter([source_index[column] for column in config.pk_columns]),
+    )
+
+
+def collapse_changes(
+    plan: ProjectionPlan,
+    rows: Iterable[tuple[Any, ...]],
+    config: TableConfig,
+) -> tuple[list[tuple[Any, ...]], list[tuple[Any, ...]], int]:
+    operation_index = plan.operation_index
+    values_getter = plan.values_getter
+    pk_getter = plan.pk_getter
+    # Ultimo cambio por PK: None marca un delete, una tupla es el upsert proyectado.
+    pending: dict[tuple[Any, ...], tuple[Any, ...] | None] = {}
     rowcount = 0
 
     for row in rows:
         rowcount += 1
-        row_map = {
-            normalized_columns[idx]: row[idx]
-            for idx in range(len(normalized_columns))
-        }
-        operation = row_map["__$operation"]
-        pk_value = tuple(row_map[column] for column in config.pk_columns)
-
+        operation = row[operation_index]
         if operation == 1:
-            pending[pk_value] = ("delete", pk_value)
-            continue
+            pending[pk_getter(row)] = None
+        elif operation == 2 or operation == 4:
+            pending[pk_getter(row)] = values_getter(row)
 
-        if operation not in (2, 4):
-            continue
-
-        payload: dict[str, Any] = {}
-        for column in target_columns:
-            if column == "fuente_origen":
-                payload[column] = config.source_label
-            elif column == "fecha_extraccion":
-                payload[column] = extracted_at
-            elif column == "cdc_lsn":
-                payload[column] = normalize_lsn(row_map["__$start_lsn"])
-            elif column == "estado_sincronizacion":
-                payload[column] = 0
-            else:
-                payload[column] = row_map.get(column)
-
-        pending[pk_value] = ("upsert", payload)
-
-    upserts: list[dict[str, Any]] = []
+    constants = plan.constant_values(config, datetime.now())
+    upserts: list[tuple[Any, ...]] = []
     deletes: list[tuple[Any, ...]] = []
-
-    for action, data in pending.values():
-        if action == "upsert":
-            upserts.append(data)  # type: ignore[arg-type]
+    for pk_value, values in pending.items():
+        if values is None:
+            deletes.append(pk_value)
         else:
-            deletes.append(data)  # type: ignore[arg-type]
+            upserts.append(values + constants)
 
     return upserts, deletes, rowcount
 
 
-def create_temp_like_target(
+COPY_TEXT_ESCAPES = str.maketrans({"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t"})
+
+
+def format_copy_value(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        return value.translate(COPY_TEXT_ESCAPES)
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        # bytea en formato hex; la barra se duplica por el escape del formato texto de COPY.
+        return "\\\\x" + bytes(value).hex()
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return str(value).translate(COPY_TEXT_ESCAPES)
+
+
+def copy_rows_to_table(
     cur: psycopg2.extensions.cursor,
-    temp_table_name: str,
-    target_schema: str,
-    target_table: str,
+    table_name: str,
+    columns: Iterable[str],
+    rows: Iterable[tuple[Any, ...]],
+    schema: str | None = None,
 ) -> None:
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join([format_copy_value(value) for value in row]))
+        buffer.write("\n")
+    buffer.seek(0)
+    cur.copy_expert(
+        sql.SQL("COPY {} ({}) FROM STDIN").format(
+            sql.Identifier(schema, table_name) if schema else sql.Identifier(table_name),
+            sql.SQL(", ").join(sql.Identifier(column) for column in columns),
+        ),
+        buffer,
+    )
+
+
+PG_MAX_IDENTIFIER_LENGTH = 63
+
+
+def pg_identifier(name: str) -> str:
+    # PostgreSQL trunca identificadores a 63 bytes; se acorta con un hash para que el
+    # nombre buscado en el catalogo sea el mismo que el creado y no choque con otro.
+    if len(name.encode("utf-8")) <= PG_MAX_IDENTIFIER_LENGTH:
+        return name
+    digest = hashlib.md5(name.encode("utf-8")).hexdigest()[:8]
+    return f"{name.encode('utf-8')[:PG_MAX_IDENTIFIER_LENGTH - 9].decode('utf-8', 'ignore')}_{digest}"
+
+
+def staging_table_name(prefix: str, config: TableConfig) -> str:
+    return pg_identifier(f"{prefix}__{config.target_schema}__{config.target_table}")
+
+
+def staging_table_names(config: TableConfig) -> tuple[str, str]:
+    return (
+        staging_table_name("tmp_cdc_upsert", config),
+        staging_table_name("tmp_cdc_delete", config),
+    )
+
+
+def fetch_temp_table_columns(cur: Any, table_name: str) -> list[tuple[str, str]]:
     cur.execute(
-        sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(temp_table_name))
+        """
+        SELECT a.attname::text, format_type(a.atttypid, a.atttypmod)
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        WHERE c.relnamespace = pg_my_temp_schema()
+          AND c.relname = %s
+          AND a.attnum > 0
+          AND NOT a.attisdropped
+        ORDER BY a.attnum
+        """,
+        (table_name,),
     )
+    return [(row[0], row[1]) for row in cur.fetchall()]
+
+
+def fetch_table_columns(cur: Any, schema: str, table_name: str) -> list[tuple[str, str]]:
     cur.execute(
-        sql.SQL(
-            "CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP"
-        ).format(
-            sql.Identifier(temp_table_name),
-            sql.Identifier(target_schema, target_table),
-        )
+        """
+        SELECT a.attname::text, format_type(a.atttypid, a.atttypmod)
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s
+          AND c.relname = %s
+          AND a.attnum > 0
+          AND NOT a.attisdropped
+        ORDER BY a.attnum
+        """,
+        (schema, table_name),
     )
+    return [(row[0], row[1]) for row in cur.fetchall()]
+
+
+def prepare_staging_tables(
+    pg_conn: psycopg2.extensions.connection,
+    config: TableConfig,
+) -> None:
+    # Tablas temporales de sesion: se crean una vez por conexion y se vacian con
+    # TRUNCATE en cada lote, sin DDL repetido sobre el catalogo. Como la conexion
+    # viene de un pool, se recrean si sus columnas ya no coinciden con el destino
+    # (por ejemplo, si la tabla destino se altero con la conexion abierta).
+    upsert_table, delete_table = staging_table_names(config)
+    with pg_conn.cursor() as cur:
+        target_columns = fetch_table_columns(cur, config.target_schema, config.target_table)
+        target_types = dict(target_columns)
+        delete_columns = [(column, target_types.get(column)) for column in config.pk_columns]
+
+        if fetch_temp_table_columns(cur, upsert_table) != target_columns:
+            cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier("pg_temp", upsert_table)))
+            cur.execute(
+                sql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS)").format(
+                    sql.Identifier(upsert_table),
+                    sql.Identifier(config.target_schema, config.target_table),
+                )
+            )
+        if fetch_temp_table_columns(cur, delete_table) != delete_columns:
+            cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier("pg_temp", delete_table)))
+            cur.execute(
+                sql.SQL("CREATE TEMP TABLE {} AS SELECT {} FROM {} WHERE 1 = 0").format(
+                    sql.Identifier(delete_table),
+                    sql.SQL(", ").join(sql.Identifier(column) for column in config.pk_columns),
+                    sql.Identifier(config.target_schema, config.target_table),
+                )
+            )
+    pg_conn.commit()
 
 
 def apply_upserts(
     pg_conn: psycopg2.extensions.connection,
     config: TableConfig,
-    target_columns: list[str],
-    rows: list[dict[str, Any]],
-) -> int:
+    target_columns: tuple[str, ...],
+    rows: list[tuple[Any, ...]],
+) -> tuple[int, int]:
     if not rows:
-        return 0
+        return 0, 0
 
-    temp_table = "tmp_cdc_upsert"
-    insert_values = [
-        tuple(row[column] for column in target_columns)
-        for row in rows
-    ]
+    temp_table, _ = staging_table_names(config)
     update_columns = [
         column for column in target_columns
         if column not in config.pk_columns
     ]
+    # Las columnas de metadata CDC cambian en cada evento; solo los datos de
+    # negocio deciden si la fila realmente cambio.
+    compare_columns = [
+        column for column in update_columns
+        if column not in CDC_METADATA_COLUMNS
+    ]
 
     with pg_conn.cursor() as cur:
-        create_temp_like_target(cur, temp_table, config.target_schema, config.target_table)
-
-        execute_values(
-            cur,
-            sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
-                sql.Identifier(temp_table),
-                sql.SQL(", ").join(sql.Identifier(column) for column in target_columns),
-            ).as_string(pg_conn),
-            insert_values,
-            page_size=max(100, config.batch_size),
-        )
+        copy_rows_to_table(cur, temp_table, target_columns, rows)
 
         if update_columns:
             conflict_action = sql.SQL("DO UPDATE SET {}").format(
@@ -495,13 +1165,25 @@ def apply_upserts(
                     for column in update_columns
                 )
             )
+            if compare_columns:
+                conflict_action = sql.SQL("{} WHERE ({}) IS DISTINCT FROM ({})").format(
+                    conflict_action,
+                    sql.SQL(", ").join(
+                        sql.SQL("target.{}").format(sql.Identifier(column))
+                        for column in compare_columns
+                    ),
+                    sql.SQL(", ").join(
+                        sql.SQL("EXCLUDED.{}").format(sql.Identifier(column))
+                        for column in compare_columns
+                    ),
+                )
         else:
             conflict_action = sql.SQL("DO NOTHING")
 
         cur.execute(
             sql.SQL(
                 """
-                INSERT INTO {} ({})
+                INSERT INTO {} AS target ({})
                 SELECT {} FROM {}
                 ON CONFLICT ({})
                 {}
@@ -515,8 +1197,10 @@ def apply_upserts(
                 conflict_action,
             )
         )
+        written = cur.rowcount
+        cur.execute(sql.SQL("TRUNCATE {}").format(sql.Identifier(temp_table)))
 
-    return len(rows)
+    return written, len(rows) - written
 
 
 def apply_deletes(
@@ -527,83 +1211,339 @@ def apply_deletes(
     if not keys:
         return 0
 
-    temp_table = "tmp_cdc_delete"
+    _, temp_table = staging_table_names(config)
     with pg_conn.cursor() as cur:
-        cur.execute(
-            sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(temp_table))
-        )
+        copy_rows_to_table(cur, temp_table, config.pk_columns, keys)
+
         cur.execute(
             sql.SQL(
-                "CREATE TEMP TABLE {} AS SELECT {} FROM {} WHERE 1 = 0"
+                """
+                DELETE FROM {} AS target
+                USING {} AS src
+                WHERE {}
+                """
             ).format(
+                sql.Identifier(config.target_schema, config.target_table),
                 sql.Identifier(temp_table),
+                sql.SQL(" AND ").join(
+                    sql.SQL("target.{} = src.{}").format(
+                        sql.Identifier(column),
+                        sql.Identifier(column),
+                    )
+                    for column in config.pk_columns
+                ),
+            )
+        )
+        cur.execute(sql.SQL("TRUNCATE {}").format(sql.Identifier(temp_table)))
+
+    return len(keys)
+
+
+def snapshot_keys_table(config: TableConfig) -> str:
+    return staging_table_name("cdc_snapshot_keys", config)
+
+
+def snapshot_keys_table_exists(pg_conn: psycopg2.extensions.connection, config: TableConfig) -> bool:
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            "SELECT to_regclass(%s) IS NOT NULL",
+            (sql.Identifier("etl", snapshot_keys_table(config)).as_string(pg_conn),),
+        )
+        return cur.fetchone()[0]
+
+
+def prepare_snapshot_keys_table(
+    pg_conn: psycopg2.extensions.connection,
+    config: TableConfig,
+    *,
+    reset: bool,
+) -> None:
+    # Tabla persistente (no temporal ni unlogged): debe sobrevivir reinicios junto con la marca de agua.
+    keys_table = snapshot_keys_table(config)
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            sql.SQL("CREATE TABLE IF NOT EXISTS {} AS SELECT {} FROM {} WHERE 1 = 0").format(
+                sql.Identifier("etl", keys_table),
                 sql.SQL(", ").join(sql.Identifier(column) for column in config.pk_columns),
                 sql.Identifier(config.target_schema, config.target_table),
             )
         )
-
-        execute_values(
-            cur,
-            sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
-                sql.Identifier(temp_table),
+        cur.execute(
+            sql.SQL("CREATE UNIQUE INDEX IF NOT EXISTS {} ON {} ({})").format(
+                sql.Identifier(pg_identifier(f"{keys_table}_uq")),
+                sql.Identifier("etl", keys_table),
                 sql.SQL(", ").join(sql.Identifier(column) for column in config.pk_columns),
-            ).as_string(pg_conn),
-            keys,
-            page_size=max(100, config.batch_size),
+            )
         )
+        if reset:
+            cur.execute(sql.SQL("TRUNCATE {}").format(sql.Identifier("etl", keys_table)))
+
+
+def build_keyset_predicate(pk_columns: tuple[str, ...], last_pk: list[Any] | None) -> tuple[str, list[Any]]:
+    if not last_pk:
+        return "1 = 1", []
+    # a >= ? AND (a > ? OR (b >= ? AND (b > ? OR (c > ?)))): la primera columna acota el
+    # rango y SQL Server puede hacer seek sobre el indice de la PK en lugar de recorrerlo
+    # desde el inicio en cada pagina. Se evalua en SQL Server con su propia collation.
+    last_depth = len(pk_columns) - 1
+    predicate = f"[{pk_columns[last_depth]}] > ?"
+    params: list[Any] = [last_pk[last_depth]]
+    for depth in range(last_depth - 1, -1, -1):
+        column = pk_columns[depth]
+        predicate = f"[{column}] >= ? AND ([{column}] > ? OR ({predicate}))"
+        params = [last_pk[depth], last_pk[depth], *params]
+    return predicate, params
+
+
+def ejecutar_snapshot(
+    config: TableConfig,
+    *,
+    pg_conn: psycopg2.extensions.connection,
+    sql_conn: pyodbc.Connection,
+    target_columns: list[str],
+    state: dict[str, Any],
+    min_lsn: bytes,
+    max_lsn: bytes,
+    logger: Any,
+    started_at: datetime,
+    started_perf: float,
+) -> dict[str, Any]:
+    config_name = config.config_name
+    snapshot_lsn = state["snapshot_lsn"]
+    last_pk = state["snapshot_last_pk"]
+    snapshot_rows = state["snapshot_rows"]
+
+    if snapshot_lsn is not None and snapshot_lsn < min_lsn:
+        logger.warning(
+            "Snapshot CDC vencido | config=%s | snapshot_lsn=%s < min_lsn=%s; se reinicia desde cero",
+            config_name,
+            format_lsn(snapshot_lsn),
+            format_lsn(min_lsn),
+        )
+        snapshot_lsn = None
 
+    if snapshot_lsn is not None and not snapshot_keys_table_exists(pg_conn, config):
+        # Sin las claves ya copiadas, el DELETE final borraria filas vigentes del destino.
+        logger.warning(
+            "Snapshot CDC sin tabla de claves | config=%s | tabla=etl.%s; se reinicia desde cero",
+            config_name,
+            snapshot_keys_table(config),
+        )
+        snapshot_lsn = None
+
+    reset = snapshot_lsn is None
+    if reset:
+        snapshot_lsn = max_lsn
+        last_pk = None
+        snapshot_rows = 0
+
+    prepare_staging_tables(pg_conn, config)
+    prepare_snapshot_keys_table(pg_conn, config, reset=reset)
+    save_snapshot_progress(
+        pg_conn,
+        config_name,
+        snapshot_lsn=snapshot_lsn,
+        snapshot_last_pk=last_pk,
+        snapshot_rows=snapshot_rows,
+    )
+    pg_conn.commit()
+
+    logger.info(
+        "Snapshot CDC %s | config=%s | snapshot_lsn=%s | filas_previas=%s | ultima_pk=%s",
+        "iniciado" if reset else "retomado",
+        config_name,
+        format_lsn(snapshot_lsn),
+        snapshot_rows,
+        last_pk,
+    )
+
+    chunk_size = get_fetch_size(config)
+    keys_table = snapshot_keys_table(config)
+    order_by = ", ".join(f"[{column}]" for column in config.pk_columns)
+    rows_upserted = 0
+    rows_skipped = 0
+    plan: ProjectionPlan | None = None
+    chunk_number = 0
+
+    while True:
+        predicate, params = build_keyset_predicate(config.pk_columns, last_pk)
+        cur = sql_conn.cursor()
         cur.execute(
+            f"""
+            SELECT TOP (?) *
+            FROM [{config.source_schema}].[{config.source_table}]
+            WHERE {predicate}
+            ORDER BY {order_by}
+            """,
+            chunk_size,
+            *params,
+        )
+        columns = [column[0] for column in cur.description]
+        rows = cur.fetchall()
+        cur.close()
+        if not rows:
+            break
+
+        chunk_number += 1
+        if plan is None:
+            plan = build_projection_plan(columns, config, target_columns)
+
+        constants = plan.constant_values(config, datetime.now(), cdc_lsn=snapshot_lsn)
+        upserts = [plan.values_getter(row) + constants for row in rows]
+        keys = [plan.pk_getter(row) for row in rows]
+        last_pk = list(keys[-1])
+
+        with pg_conn.cursor() as pg_cur:
+            copy_rows_to_table(pg_cur, keys_table, config.pk_columns, keys, schema="etl")
+        upserted_count, skipped_count = apply_upserts(pg_conn, config, plan.columns, upserts)
+        snapshot_rows += len(rows)
+        save_snapshot_progress(
+            pg_conn,
+            config_name,
+            snapshot_lsn=snapshot_lsn,
+            snapshot_last_pk=last_pk,
+            snapshot_rows=snapshot_rows,
+        )
+        pg_conn.commit()
+        rows_upserted += upserted_count
+        rows_skipped += skipped_count
+
+        logger.info(
+            "Snapshot CDC chunk | config=%s | chunk=%s | filas_chunk=%s | filas_total=%s | ultima_pk=%s",
+            config_name,
+            chunk_number,
+            len(rows),
+            snapshot_rows,
+            last_pk,
+        )
+
+    # Filas del destino que ya no existen en el origen.
+    with pg_conn.cursor() as pg_cur:
+        pg_cur.execute(
             sql.SQL(
                 """
                 DELETE FROM {} AS target
-                USING {} AS src
-                WHERE {}
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {} AS k WHERE {}
+                )
                 """
             ).format(
                 sql.Identifier(config.target_schema, config.target_table),
-                sql.Identifier(temp_table),
+                sql.Identifier("etl", keys_table),
                 sql.SQL(" AND ").join(
-                    sql.SQL("target.{} = src.{}").format(
-                        sql.Identifier(column),
-                        sql.Identifier(column),
-                    )
+                    sql.SQL("k.{} = target.{}").format(sql.Identifier(column), sql.Identifier(column))
                     for column in config.pk_columns
                 ),
             )
         )
+        rows_deleted = pg_cur.rowcount
+        pg_cur.execute(sql.SQL("TRUNCATE {}").format(sql.Identifier("etl", keys_table)))
+
+    finished_at = utc_now()
+    duration_ms = int((perf_counter() - started_perf) * 1000)
+    update_state(
+        pg_conn,
+        config_name,
+        last_start_lsn=snapshot_lsn,
+        last_end_lsn=snapshot_lsn,
+        last_status="snapshot",
+        last_rowcount=snapshot_rows,
+        last_error=None,
+        last_started_at=started_at,
+        last_finished_at=finished_at,
+    )
+    clear_snapshot_progress(pg_conn, config_name)
+    clear_checkpoint(pg_conn, config_name)
+    insert_run_log(
+        pg_conn,
+        config,
+        from_lsn=None,
+        to_lsn=snapshot_lsn,
+        rows_read=snapshot_rows,
+        rows_upserted=rows_upserted,
+        rows_deleted=rows_deleted,
+        status="snapshot",
+        duration_ms=duration_ms,
+        error_text=None,
+        rows_skipped=rows_skipped,
+    )
+    pg_conn.commit()
 
-    return len(keys)
+    logger.info(
+        "Snapshot CDC completo | config=%s | snapshot_lsn=%s | filas=%s | upserts=%s | skipped=%s | deletes=%s",
+        config_name,
+        format_lsn(snapshot_lsn),
+        snapshot_rows,
+        rows_upserted,
+        rows_skipped,
+        rows_deleted,
+    )
+    return {
+        "status": "snapshot",
+        "to_lsn": format_lsn(snapshot_lsn),
+        "rows_read": snapshot_rows,
+        "rows_upserted": rows_upserted,
+        "rows_skipped": rows_skipped,
+        "rows_deleted": rows_deleted,
+    }
 
 
-@flow(name="cdc_replicar_tabla", persist_result=False)
-def replicar_tabla_cdc(
-    config_name: str = "pilot_t050_articulos",
-    bootstrap_mode: str = "current_max_lsn",
+def procesar_tabla_cdc(
+    config_name: str,
+    *,
+    pg_conn: psycopg2.extensions.connection,
+    sql_conn: pyodbc.Connection,
+    bootstrap_mode: str,
+    logger: Any,
+    max_lsn: bytes | None = None,
+    metadata: RunMetadata | None = None,
 ) -> dict[str, Any]:
-    logger = get_run_logger()
     started_at = utc_now()
     started_perf = perf_counter()
     current_phase = "init"
 
-    pg_conn = open_pg_conn()
-    ensure_state_row(pg_conn, config_name)
-    config = get_table_config(pg_conn, config_name)
-    if not config.enabled:
-        raise RuntimeError(f"La configuracion {config_name} esta deshabilitada")
-
-    target_columns = get_target_columns(pg_conn, config.target_schema, config.target_table)
-    state = get_state(pg_conn, config_name)
+    if metadata is None:
+        metadata = load_run_metadata(pg_conn, config_name)
+    config = metadata.config
+    target_columns = metadata.target_columns
+    state = metadata.state
     state_last_end_lsn = normalize_lsn(state["last_end_lsn"])
-    state_last_start_lsn = normalize_lsn(state["last_start_lsn"])
+    resume_lsn = resolve_resume_lsn(state)
+    # Inicio de la ultima ventana confirmada; es el from_lsn del run_log si la corrida falla.
+    failed_from_lsn = state_last_end_lsn
     fetch_size = get_fetch_size(config)
+    timer = PhaseTimer()
 
-    sql_conn = open_sqlserver_conn(config)
     try:
         current_phase = "read_lsn_window"
-        min_lsn = get_min_lsn(sql_conn, config.capture_instance)
-        max_lsn = get_max_lsn(sql_conn)
+        with timer.measure("read_lsn_window"):
+            min_lsn, source_max_lsn, next_lsn = read_lsn_window(
+                sql_conn,
+                config.capture_instance,
+                resume_lsn,
+            )
+        if max_lsn is None:
+            max_lsn = source_max_lsn
+
+        snapshot_requested = bootstrap_mode == "snapshot" and (
+            resume_lsn is None or resume_lsn < min_lsn
+        )
+        if state["snapshot_lsn"] is not None or snapshot_requested:
+            current_phase = "snapshot"
+            return ejecutar_snapshot(
+                config,
+                pg_conn=pg_conn,
+                sql_conn=sql_conn,
+                target_columns=target_columns,
+                state=state,
+                min_lsn=min_lsn,
+                max_lsn=max_lsn,
+                logger=logger,
+                started_at=started_at,
+                started_perf=started_perf,
+            )
 
-        if state_last_end_lsn is None and bootstrap_mode == "current_max_lsn":
+        if resume_lsn is None and bootstrap_mode == "current_max_lsn":
             finished_at = utc_now()
             duration_ms = int((perf_counter() - started_perf) * 1000)
             update_state(
@@ -628,6 +1568,7 @@ def replicar_tabla_cdc(
                 status="bootstrapped",
                 duration_ms=duration_ms,
                 error_text=None,
+                phase_ms=timer.as_ms(),
             )
             pg_conn.commit()
             logger.info(
@@ -637,24 +1578,33 @@ def replicar_tabla_cdc(
             )
             return {"status": "bootstrapped", "lsn": format_lsn(max_lsn)}
 
-        if state_last_end_lsn is None:
+        if resume_lsn is None:
             from_lsn = min_lsn
         else:
-            if state_last_end_lsn < min_lsn:
+            if resume_lsn < min_lsn:
                 raise RuntimeError(
                     "El ultimo LSN procesado quedo fuera de la ventana CDC. "
-                    "Se requiere reseed de la tabla."
+                    "Se requiere reseed de la tabla (bootstrap_mode='snapshot')."
+                )
+            from_lsn = next_lsn
+            if resume_lsn != state_last_end_lsn:
+                logger.info(
+                    "CDC retoma desde checkpoint | config=%s | checkpoint_lsn=%s | checkpoint_seqval=%s",
+                    config.config_name,
+                    format_lsn(resume_lsn),
+                    format_lsn(state["checkpoint_seqval"]),
                 )
-            from_lsn = increment_lsn(sql_conn, state_last_end_lsn)
 
         if from_lsn > max_lsn:
             finished_at = utc_now()
             duration_ms = int((perf_counter() - started_perf) * 1000)
+            # max_lsn puede ser una foto compartida anterior al estado (p. ej. si otra
+            # corrida ya avanzo): last_end_lsn nunca retrocede.
             update_state(
                 pg_conn,
                 config_name,
                 last_start_lsn=from_lsn,
-                last_end_lsn=max_lsn,
+                last_end_lsn=max(resume_lsn, max_lsn) if resume_lsn is not None else max_lsn,
                 last_status="idle",
                 last_rowcount=0,
                 last_error=None,
@@ -672,11 +1622,13 @@ def replicar_tabla_cdc(
                 status="idle",
                 duration_ms=duration_ms,
                 error_text=None,
+                phase_ms=timer.as_ms(),
             )
             pg_conn.commit()
             logger.info("No hay cambios pendientes para %s", config.config_name)
             return {"status": "idle", "rows_read": 0, "rows_upserted": 0, "rows_deleted": 0}
 
+        failed_from_lsn = from_lsn
         logger.info(
             "CDC inicio lectura | config=%s | from_lsn=%s | to_lsn=%s | fetch_size=%s",
             config.config_name,
@@ -685,56 +1637,110 @@ def replicar_tabla_cdc(
             fetch_size,
         )
 
-        current_phase = "open_cdc_cursor"
-        columns, cdc_cursor = open_cdc_cursor(sql_conn, config.capture_instance, from_lsn, max_lsn)
+        current_phase = "prepare_staging_tables"
+        prepare_staging_tables(pg_conn, config)
 
         batch_number = 0
+        window_number = 0
         rows_read = 0
         rows_upserted = 0
+        rows_skipped = 0
         rows_deleted = 0
+        window_from_lsn = from_lsn
+        plan: ProjectionPlan | None = None
 
         while True:
-            current_phase = f"fetch_batch_{batch_number + 1}"
-            change_rows = cdc_cursor.fetchmany(fetch_size)
-            if not change_rows:
-                break
-
-            batch_number += 1
-            current_phase = f"collapse_batch_{batch_number}"
-            upserts, deletes, batch_rows_read = collapse_changes(
-                columns,
-                change_rows,
-                config,
-                target_columns,
-            )
-            rows_read += batch_rows_read
+            window_number += 1
+            current_phase = f"read_window_{window_number}"
+            with timer.measure("read_lsn_window"):
+                window_to_lsn = get_window_end_lsn(sql_conn, config, window_from_lsn, max_lsn)
+            if window_to_lsn != max_lsn or window_number > 1:
+                logger.info(
+                    "CDC ventana | config=%s | window=%s | from_lsn=%s | to_lsn=%s",
+                    config.config_name,
+                    window_number,
+                    format_lsn(window_from_lsn),
+                    format_lsn(window_to_lsn),
+                )
 
-            logger.info(
-                "CDC lote leido | config=%s | batch=%s | rows_read_batch=%s | upserts_batch=%s | deletes_batch=%s",
-                config.config_name,
-                batch_number,
-                batch_rows_read,
-                len(upserts),
-                len(deletes),
-            )
+            current_phase = "open_cdc_cursor"
+            with timer.measure("fetch"):
+                columns, cdc_cursor = open_cdc_cursor(
+                    sql_conn,
+                    config.capture_instance,
+                    window_from_lsn,
+                    window_to_lsn,
+                )
+            if plan is None or plan.source_columns != tuple(column.lower() for column in columns):
+                plan = build_projection_plan(columns, config, target_columns)
+            lsn_index = plan.source_columns.index("__$start_lsn")
+            seqval_index = plan.source_columns.index("__$seqval")
+
+            batches = iter_transaction_batches(cdc_cursor, fetch_size, lsn_index)
+            while True:
+                current_phase = f"fetch_batch_{batch_number + 1}"
+                with timer.measure("fetch"):
+                    change_rows = next(batches, None)
+                if change_rows is None:
+                    break
+
+                batch_number += 1
+                current_phase = f"collapse_batch_{batch_number}"
+                with timer.measure("collapse"):
+                    upserts, deletes, batch_rows_read = collapse_changes(plan, change_rows, config)
+                rows_read += batch_rows_read
+
+                logger.info(
+                    "CDC lote leido | config=%s | batch=%s | rows_read_batch=%s | upserts_batch=%s | deletes_batch=%s",
+                    config.config_name,
+                    batch_number,
+                    batch_rows_read,
+                    len(upserts),
+                    len(deletes),
+                )
 
-            current_phase = f"apply_batch_{batch_number}"
-            deleted_count = apply_deletes(pg_conn, config, deletes)
-            upserted_count = apply_upserts(pg_conn, config, target_columns, upserts)
-            pg_conn.commit()
+                current_phase = f"apply_batch_{batch_number}"
+                with timer.measure("apply_deletes"):
+                    deleted_count = apply_deletes(pg_conn, config, deletes)
+                with timer.measure("apply_upserts"):
+                    upserted_count, skipped_count = apply_upserts(pg_conn, config, plan.columns, upserts)
+                with timer.measure("commit"):
+                    save_checkpoint(
+                        pg_conn,
+                        config_name,
+                        checkpoint_lsn=normalize_lsn(change_rows[-1][lsn_index]),
+                        checkpoint_seqval=normalize_lsn(change_rows[-1][seqval_index]),
+                    )
+                    pg_conn.commit()
+
+                rows_deleted += deleted_count
+                rows_upserted += upserted_count
+                rows_skipped += skipped_count
+
+                logger.info(
+                    "CDC lote aplicado | config=%s | batch=%s | rows_read_total=%s | upserts_total=%s | skipped_total=%s | deletes_total=%s",
+                    config.config_name,
+                    batch_number,
+                    rows_read,
+                    rows_upserted,
+                    rows_skipped,
+                    rows_deleted,
+                )
+            cdc_cursor.close()
 
-            rows_deleted += deleted_count
-            rows_upserted += upserted_count
+            if window_to_lsn >= max_lsn:
+                break
 
-            logger.info(
-                "CDC lote aplicado | config=%s | batch=%s | rows_read_total=%s | upserts_total=%s | deletes_total=%s",
-                config.config_name,
-                batch_number,
-                rows_read,
-                rows_upserted,
-                rows_deleted,
-            )
+            current_phase = f"persist_window_{window_number}"
+            with timer.measure("commit"):
+                advance_state_window(pg_conn, config_name, window_to_lsn)
+                pg_conn.commit()
+            with timer.measure("read_lsn_window"):
+                window_from_lsn = increment_lsn(sql_conn, window_to_lsn)
+            failed_from_lsn = window_from_lsn
 
+        current_phase = "read_replication_lag"
+        source_commit_time, replication_lag_ms = get_replication_lag(sql_conn, max_lsn)
         finished_at = utc_now()
         duration_ms = int((perf_counter() - started_perf) * 1000)
         current_phase = "persist_success_state"
@@ -749,6 +1755,7 @@ def replicar_tabla_cdc(
             last_started_at=started_at,
             last_finished_at=finished_at,
         )
+        clear_checkpoint(pg_conn, config_name)
         insert_run_log(
             pg_conn,
             config,
@@ -760,17 +1767,24 @@ def replicar_tabla_cdc(
             status="success",
             duration_ms=duration_ms,
             error_text=None,
+            rows_skipped=rows_skipped,
+            phase_ms=timer.as_ms(),
+            source_commit_time=source_commit_time,
+            replication_lag_ms=replication_lag_ms,
         )
         pg_conn.commit()
 
         logger.info(
-            "CDC aplicado | config=%s | from_lsn=%s | to_lsn=%s | rows_read=%s | upserts=%s | deletes=%s",
+            "CDC aplicado | config=%s | from_lsn=%s | to_lsn=%s | rows_read=%s | upserts=%s | skipped=%s | deletes=%s | lag_ms=%s | fases_ms=%s",
             config.config_name,
             format_lsn(from_lsn),
             format_lsn(max_lsn),
             rows_read,
             rows_upserted,
+            rows_skipped,
             rows_deleted,
+            replication_lag_ms,
+            timer.as_ms(),
         )
         return {
             "status": "success",
@@ -778,7 +1792,9 @@ def replicar_tabla_cdc(
             "to_lsn": format_lsn(max_lsn),
             "rows_read": rows_read,
             "rows_upserted": rows_upserted,
+            "rows_skipped": rows_skipped,
             "rows_deleted": rows_deleted,
+            "replication_lag_ms": replication_lag_ms,
         }
 
     except Exception as exc:
@@ -789,13 +1805,9 @@ def replicar_tabla_cdc(
 
         with open_pg_conn() as error_conn:
             ensure_state_row(error_conn, config_name)
-            update_state(
+            mark_state_failed(
                 error_conn,
                 config_name,
-                last_start_lsn=state_last_start_lsn,
-                last_end_lsn=state_last_end_lsn,
-                last_status="failed",
-                last_rowcount=0,
                 last_error=error_text,
                 last_started_at=started_at,
                 last_finished_at=finished_at,
@@ -803,7 +1815,7 @@ def replicar_tabla_cdc(
             insert_run_log(
                 error_conn,
                 config,
-                from_lsn=state_last_end_lsn,
+                from_lsn=failed_from_lsn,
                 to_lsn=None,
                 rows_read=0,
                 rows_upserted=0,
@@ -815,12 +1827,185 @@ def replicar_tabla_cdc(
             error_conn.commit()
         logger.error("Error en CDC %s: %s", config_name, error_text)
         raise
+
+
+@flow(name="cdc_replicar_tabla", persist_result=False)
+def replicar_tabla_cdc(
+    config_name: str = "pilot_t050_articulos",
+    bootstrap_mode: str = "current_max_lsn",
+) -> dict[str, Any]:
+    logger = get_run_logger()
+
+    pg_conn = open_pg_conn()
+    try:
+        metadata = load_run_metadata(pg_conn, config_name)
+        if not metadata.config.enabled:
+            raise RuntimeError(f"La configuracion {config_name} esta deshabilitada")
+
+        sql_conn = open_sqlserver_conn(metadata.config)
+        try:
+            return procesar_tabla_cdc(
+                config_name,
+                pg_conn=pg_conn,
+                sql_conn=sql_conn,
+                bootstrap_mode=bootstrap_mode,
+                logger=logger,
+                metadata=metadata,
+            )
+        finally:
+            sql_conn.close()
     finally:
-        sql_conn.close()
         pg_conn.close()
 
 
+class ConnectionPool:
+    """Reutiliza conexiones entre tablas; cada conexion la usa un solo hilo a la vez."""
+
+    def __init__(self) -> None:
+        self._idle: dict[Any, list[Any]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self, key: Any, opener: Callable[[], Any]) -> Iterator[Any]:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            conn = idle.pop() if idle else None
+        if conn is None:
+            conn = opener()
+        try:
+            yield conn
+        except BaseException:
+            # Una conexion que vio un error (timeout, cursor abortado) no se recicla.
+            close_quietly(conn)
+            raise
+        self.release(key, conn)
+
+    def release(self, key: Any, conn: Any) -> None:
+        with self._lock:
+            self._idle.setdefault(key, []).append(conn)
+
+    def close_all(self) -> None:
+        with self._lock:
+            connections = [conn for idle in self._idle.values() for conn in idle]
+            self._idle.clear()
+        for conn in connections:
+            close_quietly(conn)
+
+
+def close_quietly(conn: Any) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def load_enabled_configs(
+    pg_conn: psycopg2.extensions.connection,
+    config_names: tuple[str, ...] | None = None,
+) -> list[TableConfig]:
+    where_clauses = ["enabled = true", "mode = 'cdc'"]
+    params: list[Any] = []
+    if config_names:
+        where_clauses.append("config_name = ANY(%s)")
+        params.append(list(config_names))
+
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT {table_config_select("cfg")}
+            FROM etl.cdc_table_config cfg
+            WHERE {" AND ".join(where_clauses)}
+            ORDER BY config_name
+            """,
+            params,
+        )
+        rows = cur.fetchall()
+    return [parse_table_config(row) for row in rows]
+
+
+def group_configs_by_source(
+    configs: Iterable[TableConfig],
+) -> dict[tuple[str, str], list[TableConfig]]:
+    groups: dict[tuple[str, str], list[TableConfig]] = {}
+    for config in configs:
+        groups.setdefault(config.source_key, []).append(config)
+    return groups
+
+
+@flow(name="cdc_replicar_todas", persist_result=False)
+def replicar_todas_cdc(
+    config_names: str | None = None,
+    max_workers: int | None = None,
+    bootstrap_mode: str = "current_max_lsn",
+) -> dict[str, Any]:
+    logger = get_run_logger()
+    parsed_names = tuple(name.strip() for name in (config_names or "").split(",") if name.strip()) or None
+    workers = max(1, max_workers or get_env_int("CDC_MAX_WORKERS", 4))
+
+    pg_pool = ConnectionPool()
+    sql_pool = ConnectionPool()
+    try:
+        with pg_pool.acquire("pg", open_pg_conn) as pg_conn:
+            configs = load_enabled_configs(pg_conn, parsed_names)
+        if not configs:
+            raise RuntimeError("No hay configuraciones CDC habilitadas para replicar.")
+
+        groups = group_configs_by_source(configs)
+        snapshots: dict[tuple[str, str], bytes] = {}
+        for source_key, group in groups.items():
+            with sql_pool.acquire(source_key, lambda: open_sqlserver_conn(group[0])) as sql_conn:
+                snapshots[source_key] = get_max_lsn(sql_conn)
+            logger.info(
+                "CDC snapshot max_lsn | source=%s.%s | tablas=%s | max_lsn=%s",
+                source_key[0],
+                source_key[1],
+                len(group),
+                format_lsn(snapshots[source_key]),
+            )
+
+        def run_one(config: TableConfig) -> dict[str, Any]:
+            with pg_pool.acquire("pg", open_pg_conn) as pg_conn, sql_pool.acquire(
+                config.source_key,
+                lambda: open_sqlserver_conn(config),
+            ) as sql_conn:
+                return procesar_tabla_cdc(
+                    config.config_name,
+                    pg_conn=pg_conn,
+                    sql_conn=sql_conn,
+                    bootstrap_mode=bootstrap_mode,
+                    logger=logger,
+                    max_lsn=snapshots[config.source_key],
+                )
+
+        results: dict[str, dict[str, Any]] = {}
+        with ThreadPoolExecutor(max_workers=min(workers, len(configs))) as executor:
+            futures = {executor.submit(run_one, config): config for config in configs}
+            for future in as_completed(futures):
+                config = futures[future]
+                try:
+                    results[config.config_name] = future.result()
+                except Exception as exc:
+                    results[config.config_name] = {"status": "failed", "error": str(exc)}
+    finally:
+        sql_pool.close_all()
+        pg_pool.close_all()
+
+    failed = sorted(name for name, result in results.items() if result["status"] == "failed")
+    logger.info(
+        "CDC ciclo completo | tablas=%s | fallidas=%s | workers=%s",
+        len(results),
+        len(failed),
+        workers,
+    )
+    if failed:
+        raise RuntimeError(f"Fallo la replicacion CDC de: {', '.join(failed)}")
+    return results
+
+
 if __name__ == "__main__":
     config_name = sys.argv[1] if len(sys.argv) > 1 else "pilot_t050_articulos"
     bootstrap_mode = sys.argv[2] if len(sys.argv) > 2 else "current_max_lsn"
-    replicar_tabla_cdc(config_name=config_name, bootstrap_mode=bootstrap_mode)
+    if config_name == "all":
+        replicar_todas_cdc(bootstrap_mode=bootstrap_mode)
+    else:
+        replicar_tabla_cdc(config_name=config_name, bootstrap_mode=bootstrap_mode)
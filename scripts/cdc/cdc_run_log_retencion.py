@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any
+
+from prefect import flow, get_run_logger
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from scripts.cdc.cdc_monitor import open_pg_conn  # noqa: E402
+
+
+@flow(name="cdc_run_log_retencion", log_prints=True)
+def mantener_cdc_run_log(
+    keep_months: int = 3,
+    rollup_days: int = 2,
+    months_ahead: int = 2,
+) -> dict[str, Any]:
+    # Requiere postgres/146_partition_cdc_run_log.sql.
+    logger = get_run_logger()
+    today = date.today()
+    rolled_up: dict[str, int] = {}
+
+    with open_pg_conn() as pg_conn:
+        with pg_conn.cursor() as cur:
+            cur.execute(
+                "SELECT etl.fn_cdc_ensure_run_log_partitions(%s, %s)",
+                (today, months_ahead),
+            )
+            created_partitions = cur.fetchone()[0]
+
+            for offset in range(rollup_days, 0, -1):
+                run_date = today - timedelta(days=offset)
+                cur.execute("SELECT etl.fn_cdc_rollup_run_log(%s)", (run_date,))
+                rolled_up[run_date.isoformat()] = cur.fetchone()[0]
+
+            cur.execute("SELECT etl.fn_cdc_purge_run_log(%s)", (keep_months,))
+            dropped_partitions = cur.fetchone()[0]
+        pg_conn.commit()
+
+    logger.info(
+        "Mantenimiento cdc_run_log | particiones_creadas=%s | rollup=%s | particiones_eliminadas=%s",
+        created_partitions,
+        rolled_up,
+        dropped_partitions,
+    )
+    return {
+        "created_partitions": created_partitions,
+        "rolled_up": rolled_up,
+        "dropped_partitions": dropped_partitions,
+    }
+
+
+if __name__ == "__main__":
+    mantener_cdc_run_log()
@@ -0,0 +1,74 @@
+# bench_particiones_base_stock.py
+#
+# Mide como escala el tiempo de carga de SP_BASE_STOCK_EXTEND segun la cantidad de
+# workers de replace_table_from_partitioned_query. Carga una tabla de benchmark
+# (no toca src.base_stock_sucursal) y usa las mismas variables de entorno que
+# obtener_base_stock.py.
+
+import argparse
+import logging
+import sys
+
+from etl_chunk_utils import replace_table_from_partitioned_query
+from obtener_base_stock import (
+    ESQUEMA_BASE_STOCK,
+    READ_CHUNK_SIZE,
+    SP_NAME,
+    constantes_base_stock,
+    listar_sucursales_particion,
+    open_pg_conn_local,
+    sql_engine,
+)
+
+
+def run_benchmark(workers_list, table_name, chunk_size, limit_sucursales):
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+    bench_logger = logging.getLogger("bench_particiones_base_stock")
+
+    sucursales = listar_sucursales_particion()
+    if limit_sucursales:
+        sucursales = sucursales[:limit_sucursales]
+
+    results = []
+    for workers in workers_list:
+        metrics = replace_table_from_partitioned_query(
+            query=f"EXEC {SP_NAME} @C_SUCU_EMPR = ?",
+            partition_values=sucursales,
+            sql_engine=sql_engine,
+            pg_conn_factory=open_pg_conn_local,
+            table_name=table_name,
+            schema_dict=ESQUEMA_BASE_STOCK,
+            logger=bench_logger,
+            read_chunk_size=chunk_size,
+            constant_values=constantes_base_stock(),
+            strip_columns=("lote",),
+            max_workers=workers,
+        )
+        results.append((workers, metrics["rows"], metrics["seconds"]))
+        print(
+            f"workers={workers:>2} | filas={metrics['rows']:>10,} | "
+            f"{metrics['seconds']:8.2f}s | {metrics['rows'] / metrics['seconds']:12,.0f} filas/s",
+            flush=True,
+        )
+
+    base_seconds = results[0][2]
+    print(f"\nsucursales={len(sucursales)} | tabla={table_name}")
+    for workers, _, seconds in results:
+        print(f"workers={workers:>2} | speedup vs {results[0][0]} worker(s): {base_seconds / seconds:6.2f}x")
+
+    with open_pg_conn_local() as conn, conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {table_name}")
+        conn.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de extraccion particionada de SP_BASE_STOCK_EXTEND")
+    parser.add_argument("--workers", default="1,2,4,8", help="lista separada por comas")
+    parser.add_argument("--table", default="src.bench_base_stock_sucursal")
+    parser.add_argument("--chunk-size", type=int, default=READ_CHUNK_SIZE)
+    parser.add_argument("--limit-sucursales", type=int, default=0)
+    args = parser.parse_args()
+    workers_list = [int(value) for value in args.workers.split(",") if value.strip()]
+    if not workers_list:
+        sys.exit("--workers vacio")
+    run_benchmark(workers_list, args.table, args.chunk_size, args.limit_sucursales)
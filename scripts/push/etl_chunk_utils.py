@@ -1,12 +1,20 @@
 import csv
+import hashlib
 import io
 import logging
+import math
 import os
+import queue
+import re
 import sys
-from datetime import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
 from pathlib import Path
 from time import perf_counter
-from typing import Callable, Dict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import pandas as pd
 import psycopg2 as pg2
@@ -14,6 +22,17 @@ from sqlalchemy import create_engine
 
 
 DataFrameTransform = Callable[[pd.DataFrame, int, logging.Logger], pd.DataFrame]
+ValueCoercer = Callable[[Any], Any]
+
+LOAD_ENGINES = ("pandas", "stream")
+LOAD_STRATEGIES = ("recreate", "shadow_swap")
+SHADOW_SUFFIX = "__new"
+RETIRED_SUFFIX = "__old"
+PG_IDENTIFIER_MAX = 63
+INDEXDEF_PATTERN = re.compile(r"^(CREATE (?:UNIQUE )?INDEX) \S+ ON (?:ONLY )?\S+ ")
+COPY_READ_SIZE = 1 << 20
+QUEUE_PUT_TIMEOUT_SECONDS = 0.5
+COPY_TEXT_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
 
 
 def setup_script_logger(logger_name: str, log_filename: str) -> logging.Logger:
@@ -88,6 +107,40 @@ def create_table_statement(schema_dict: Dict[str, str], table_name: str) -> str:
     return f"CREATE TABLE {table_name} ({columns_sql})"
 
 
+def create_temp_table_statement(schema_dict: Dict[str, str], table_name: str) -> str:
+    return (
+        create_table_statement(schema_dict, table_name).replace("CREATE TABLE", "CREATE TEMP TABLE", 1)
+        + " ON COMMIT DROP"
+    )
+
+
+def insert_deduplicated(
+    cur,
+    *,
+    source_table: str,
+    target_table: str,
+    columns: Sequence[str],
+    key_columns: Sequence[str],
+    order_by: str,
+) -> int:
+    """Inserta en target_table una fila por key_columns, la primera segun order_by.
+
+    Pensado para staging temporal: el descarte ocurre en la misma pasada de carga y
+    target_table nunca recibe filas duplicadas. Devuelve las filas insertadas.
+    """
+    columns_sql = ", ".join([f'"{quote_ident(col)}"' for col in columns])
+    keys_sql = ", ".join([f'"{quote_ident(col.lower())}"' for col in key_columns])
+    cur.execute(
+        f"""
+        INSERT INTO {target_table} ({columns_sql})
+        SELECT DISTINCT ON ({keys_sql}) {columns_sql}
+        FROM {source_table}
+        ORDER BY {keys_sql}, {order_by}
+        """
+    )
+    return cur.rowcount if cur.rowcount is not None else 0
+
+
 def align_dataframe_to_schema(df: pd.DataFrame, schema_dict: Dict[str, str]) -> pd.DataFrame:
     aligned = df.copy()
     aligned.columns = [str(col).lower() for col in aligned.columns]
@@ -120,6 +173,564 @@ def copy_dataframe_to_postgres(cur, table_name: str, df: pd.DataFrame) -> None:
     cur.copy_expert(copy_sql, buffer)
 
 
+def coerce_int_value(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return int(value)
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(number):
+        return None
+    return int(number)
+
+
+def coerce_float_value(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def coerce_decimal_value(value: Any) -> Optional[Decimal]:
+    if value is None or isinstance(value, Decimal):
+        return value
+    try:
+        number = Decimal(str(value).strip())
+    except InvalidOperation:
+        return None
+    return number if number.is_finite() else None
+
+
+def coerce_datetime_value(value: Any) -> Optional[date]:
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+
+def build_value_coercer(pg_type: str, strip: bool = False) -> ValueCoercer:
+    # Equivalente por valor a los coerce_*_column, segun el tipo declarado en schema_dict.
+    normalized = pg_type.strip().upper()
+    if normalized.startswith(("INT", "BIGINT", "SMALLINT")):
+        return coerce_int_value
+    if normalized.startswith(("DOUBLE", "FLOAT", "REAL")):
+        return coerce_float_value
+    if normalized.startswith(("NUMERIC", "DECIMAL")):
+        return coerce_decimal_value
+    if normalized.startswith(("TIMESTAMP", "DATE")):
+        return coerce_datetime_value
+    if strip:
+        return lambda value: None if value is None else str(value).strip()
+    return lambda value: None if value is None else str(value)
+
+
+def format_copy_text_value(value: Any) -> str:
+    if value is None or value is pd.NA or value is pd.NaT:
+        return "\\N"
+    if isinstance(value, float):
+        return repr(value) if math.isfinite(value) else "\\N"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).translate(COPY_TEXT_ESCAPES)
+
+
+class IteratorTextReader(io.TextIOBase):
+    """Objeto tipo archivo que entrega a COPY los bloques generados por un iterador."""
+
+    def __init__(self, blocks: Iterator[str]):
+        self._blocks = blocks
+        self._current = ""
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> str:
+        if size is None or size < 0:
+            remaining = self._current[self._position:]
+            self._current, self._position = "", 0
+            return remaining + "".join(self._blocks)
+
+        while self._position >= len(self._current):
+            block = next(self._blocks, None)
+            if block is None:
+                return ""
+            self._current, self._position = block, 0
+
+        start = self._position
+        self._position = min(start + size, len(self._current))
+        return self._current[start:self._position]
+
+
+def iter_in_background(
+    source: Iterable[Any],
+    *,
+    max_queued: int,
+    thread_name: str,
+) -> Iterator[Any]:
+    """Consume source en un hilo lector y entrega sus elementos por una cola acotada.
+
+    El hilo que itera (escritor) conserva la conexion y la transaccion de PostgreSQL;
+    el lector solo extrae. Un error del lector se relanza en el escritor y, si el
+    escritor corta antes, el lector se detiene sin quedar bloqueado en la cola.
+    """
+    items: "queue.Queue[Tuple[str, Any]]" = queue.Queue(maxsize=max(1, max_queued))
+    stop = threading.Event()
+
+    def put(kind: str, payload: Any) -> bool:
+        while not stop.is_set():
+            try:
+                items.put((kind, payload), timeout=QUEUE_PUT_TIMEOUT_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in source:
+                if not put("item", item):
+                    return
+        except BaseException as exc:  # noqa: BLE001 - se relanza en el hilo escritor
+            put("error", exc)
+            return
+        put("done", None)
+
+    reader = threading.Thread(target=produce, name=thread_name, daemon=True)
+    reader.start()
+    try:
+        while True:
+            kind, payload = items.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise payload
+            yield payload
+    finally:
+        stop.set()
+        reader.join()
+
+
+def iter_fetchmany(cursor, read_chunk_size: int) -> Iterator[Sequence[Any]]:
+    while True:
+        raw_rows = cursor.fetchmany(read_chunk_size)
+        if not raw_rows:
+            return
+        yield raw_rows
+
+
+def open_query_cursor(sql_engine, query: str, params: Sequence[Any] = ()):
+    sql_conn = sql_engine.raw_connection()
+    cursor = sql_conn.cursor()
+    cursor.execute(query, *params)
+    # Los SP sin SET NOCOUNT ON devuelven primero conteos de filas sin result set.
+    while cursor.description is None and cursor.nextset():
+        pass
+    if cursor.description is None:
+        sql_conn.close()
+        raise RuntimeError(f"La consulta no devolvio un result set: {query}")
+    return sql_conn, cursor
+
+
+def iter_copy_blocks(
+    raw_chunks: Iterable[Sequence[Any]],
+    *,
+    raw_columns: List[str],
+    schema_dict: Dict[str, str],
+    transform_chunk: Optional[DataFrameTransform],
+    constant_values: Dict[str, Any],
+    strip_columns: Iterable[str],
+    logger: logging.Logger,
+    stats: Dict[str, int],
+    hash_exclude: Optional[Sequence[str]] = None,
+) -> Iterator[str]:
+    # Con hash_exclude, cada linea agrega al final el md5 de las columnas no excluidas
+    # (ya formateadas para COPY), para comparar contenido en el modo delta.
+    target_columns = list(schema_dict)
+    hash_positions: Optional[List[int]] = None
+    if hash_exclude is not None:
+        excluded = {column.lower() for column in hash_exclude}
+        hash_positions = [idx for idx, column in enumerate(target_columns) if column not in excluded]
+
+    def render_line(values: List[str]) -> str:
+        line = "\t".join(values)
+        if hash_positions is None:
+            return line
+        digest = hashlib.md5("\x1f".join([values[idx] for idx in hash_positions]).encode("utf-8")).hexdigest()
+        return f"{line}\t{digest}"
+
+    if transform_chunk is None:
+        source_index = {column.lower(): idx for idx, column in enumerate(raw_columns)}
+        constants = {column.lower(): value for column, value in constant_values.items()}
+        strip_set = {column.lower() for column in strip_columns}
+        plan: List[Tuple[Optional[int], Any]] = []
+        for column in target_columns:
+            if column in constants:
+                plan.append((None, format_copy_text_value(constants[column])))
+            elif column in source_index:
+                plan.append((source_index[column], build_value_coercer(schema_dict[column], column in strip_set)))
+            else:
+                logger.warning("Columna ausente en origen; se cargará como NULL: %s", column)
+                plan.append((None, "\\N"))
+
+    for chunk_index, raw_rows in enumerate(raw_chunks, start=1):
+        if transform_chunk is None:
+            lines = [
+                render_line(
+                    [
+                        format_copy_text_value(handler(row[idx])) if idx is not None else handler
+                        for idx, handler in plan
+                    ]
+                )
+                for row in raw_rows
+            ]
+        else:
+            frame = pd.DataFrame.from_records([tuple(row) for row in raw_rows], columns=raw_columns)
+            for column, value in constant_values.items():
+                frame[column] = value
+            transformed = transform_chunk(frame, chunk_index, logger)
+            if transformed.empty:
+                logger.warning(
+                    "Chunk %s descartado luego de la transformación; se continúa",
+                    chunk_index,
+                )
+                continue
+            aligned = align_dataframe_to_schema(transformed, schema_dict)
+            lines = [
+                render_line([format_copy_text_value(value) for value in row])
+                for row in aligned.itertuples(index=False, name=None)
+            ]
+
+        stats["rows"] += len(lines)
+        stats["chunks"] += 1
+        logger.info(
+            "Chunk %s enviado a COPY | filas=%s | acumulado=%s",
+            chunk_index,
+            len(lines),
+            stats["rows"],
+        )
+        yield "\n".join(lines) + "\n"
+
+
+def load_query_with_pandas(
+    cur,
+    *,
+    query: str,
+    sql_engine,
+    table_name: str,
+    schema_dict: Dict[str, str],
+    transform_chunk: Optional[DataFrameTransform],
+    logger: logging.Logger,
+    read_chunk_size: int,
+    overlap_io: bool = False,
+    queue_chunks: int = 4,
+) -> Tuple[int, int]:
+    total_rows = 0
+    total_chunks = 0
+    raw_chunks: Iterable[pd.DataFrame] = pd.read_sql(query, sql_engine, chunksize=read_chunk_size)
+    if overlap_io:
+        raw_chunks = iter_in_background(raw_chunks, max_queued=queue_chunks, thread_name="etl-read-sql")
+
+    try:
+        for chunk_index, raw_chunk in enumerate(raw_chunks, start=1):
+            raw_rows = len(raw_chunk)
+            logger.info(
+                "Chunk %s recibido desde SQL Server con %s filas",
+                chunk_index,
+                raw_rows,
+            )
+
+            transformed = raw_chunk
+            if transform_chunk is not None:
+                transformed = transform_chunk(raw_chunk.copy(), chunk_index, logger)
+            if transformed.empty:
+                logger.warning(
+                    "Chunk %s descartado luego de la transformación; se continúa",
+                    chunk_index,
+                )
+                continue
+
+            aligned = align_dataframe_to_schema(transformed, schema_dict)
+            copy_dataframe_to_postgres(cur, table_name, aligned)
+
+            chunk_rows = len(aligned)
+            total_rows += chunk_rows
+            total_chunks += 1
+            logger.info(
+                "Chunk %s copiado a PostgreSQL | filas=%s | acumulado=%s",
+                chunk_index,
+                chunk_rows,
+                total_rows,
+            )
+    finally:
+        if overlap_io:
+            # Si la carga falla, detiene el hilo lector antes de salir.
+            raw_chunks.close()
+    return total_rows, total_chunks
+
+
+def load_query_with_stream(
+    cur,
+    *,
+    query: str,
+    sql_engine,
+    table_name: str,
+    schema_dict: Dict[str, str],
+    transform_chunk: Optional[DataFrameTransform],
+    logger: logging.Logger,
+    read_chunk_size: int,
+    constant_values: Dict[str, Any],
+    strip_columns: Iterable[str],
+    overlap_io: bool = False,
+    queue_chunks: int = 4,
+    query_params: Sequence[Any] = (),
+    hash_column: Optional[str] = None,
+    hash_exclude: Sequence[str] = (),
+) -> Tuple[int, int]:
+    # Un unico COPY FROM STDIN alimentado por fetchmany de pyodbc; sin to_csv ni read_sql.
+    stats = {"rows": 0, "chunks": 0}
+    sql_conn, sql_cursor = open_query_cursor(sql_engine, query, query_params)
+    raw_chunks: Iterator[Sequence[Any]] = iter_fetchmany(sql_cursor, read_chunk_size)
+    try:
+        if overlap_io:
+            raw_chunks = iter_in_background(raw_chunks, max_queued=queue_chunks, thread_name="etl-fetchmany")
+        blocks = iter_copy_blocks(
+            raw_chunks,
+            raw_columns=[str(column[0]) for column in sql_cursor.description],
+            schema_dict=schema_dict,
+            transform_chunk=transform_chunk,
+            constant_values=constant_values,
+            strip_columns=strip_columns,
+            logger=logger,
+            stats=stats,
+            hash_exclude=hash_exclude if hash_column else None,
+        )
+        copy_columns = list(schema_dict) + ([hash_column] if hash_column else [])
+        columns_sql = ", ".join([f'"{quote_ident(col)}"' for col in copy_columns])
+        cur.copy_expert(
+            f"COPY {table_name} ({columns_sql}) FROM STDIN",
+            IteratorTextReader(blocks),
+            size=COPY_READ_SIZE,
+        )
+    finally:
+        # Si COPY falla, detiene el hilo lector antes de cerrar la conexion que usa.
+        raw_chunks.close()
+        sql_conn.close()
+    return stats["rows"], stats["chunks"]
+
+
+def split_table_name(table_name: str) -> Tuple[str, str]:
+    schema, _, table = table_name.rpartition(".")
+    return (schema or "public"), table
+
+
+def shadow_table_name(table_name: str, suffix: str = SHADOW_SUFFIX) -> str:
+    schema, table = split_table_name(table_name)
+    return f"{schema}.{table[: PG_IDENTIFIER_MAX - len(suffix)]}{suffix}"
+
+
+def dedup_staging_name(table_name: str) -> str:
+    return f"tmp_dedup__{split_table_name(table_name)[1]}"[:PG_IDENTIFIER_MAX]
+
+
+def log_source_duplicates(
+    logger: logging.Logger,
+    table_name: str,
+    key_columns: Sequence[str],
+    duplicate_rows: int,
+    partition_value: Any = None,
+) -> None:
+    if duplicate_rows <= 0:
+        return
+    logger.warning(
+        "El origen trajo filas duplicadas por clave | tabla_destino=%s | clave=%s | particion=%s | descartadas=%s",
+        table_name,
+        ",".join(key_columns),
+        partition_value if partition_value is not None else "-",
+        duplicate_rows,
+    )
+
+
+def shadow_object_name(name: str) -> str:
+    return f"{name[: PG_IDENTIFIER_MAX - len(SHADOW_SUFFIX)]}{SHADOW_SUFFIX}"
+
+
+def copy_indexes_to_shadow(cur, table_name: str, shadow_name: str) -> List[Tuple[str, str]]:
+    # Replica en la sombra los indices de la tabla viva con nombre temporal; devuelve
+    # (nombre_temporal, nombre_final) para renombrarlos despues del swap. Los indices
+    # que respaldan una constraint (PK, UNIQUE, EXCLUDE) los recrea copy_constraints_to_shadow.
+    cur.execute(
+        """
+        SELECT idx.relname, pg_get_indexdef(idx.oid)
+        FROM pg_index ix
+        JOIN pg_class idx ON idx.oid = ix.indexrelid
+        WHERE ix.indrelid = to_regclass(%s)
+          AND NOT EXISTS (
+              SELECT 1
+              FROM pg_constraint con
+              WHERE con.conrelid = ix.indrelid
+                AND con.conindid = ix.indexrelid
+          )
+        ORDER BY idx.relname
+        """,
+        (table_name,),
+    )
+    renames: List[Tuple[str, str]] = []
+    for index_name, index_def in cur.fetchall():
+        temp_name = shadow_object_name(index_name)
+        cur.execute(INDEXDEF_PATTERN.sub(rf'\1 "{quote_ident(temp_name)}" ON {shadow_name} ', index_def, count=1))
+        renames.append((temp_name, index_name))
+    return renames
+
+
+def copy_constraints_to_shadow(cur, table_name: str, shadow_name: str) -> List[Tuple[str, str]]:
+    # PK, UNIQUE, EXCLUDE, CHECK y FK de la tabla viva con nombre temporal (los de PK y
+    # UNIQUE comparten nombre con su indice); devuelve (nombre_temporal, nombre_final).
+    cur.execute(
+        """
+        SELECT con.conname, pg_get_constraintdef(con.oid)
+        FROM pg_constraint con
+        WHERE con.conrelid = to_regclass(%s)
+          AND con.contype IN ('p', 'u', 'x', 'c', 'f')
+        ORDER BY CASE con.contype WHEN 'p' THEN 0 WHEN 'u' THEN 1 ELSE 2 END, con.conname
+        """,
+        (table_name,),
+    )
+    renames: List[Tuple[str, str]] = []
+    for constraint_name, constraint_def in cur.fetchall():
+        temp_name = shadow_object_name(constraint_name)
+        cur.execute(f'ALTER TABLE {shadow_name} ADD CONSTRAINT "{quote_ident(temp_name)}" {constraint_def}')
+        renames.append((temp_name, constraint_name))
+    return renames
+
+
+def copy_grants_to_shadow(cur, table_name: str, shadow_name: str) -> int:
+    schema, table = split_table_name(table_name)
+    cur.execute(
+        """
+        SELECT grantee, string_agg(DISTINCT privilege_type, ', ')
+        FROM information_schema.role_table_grants
+        WHERE table_schema = %s
+          AND table_name = %s
+          AND grantee <> current_user
+        GROUP BY grantee
+        """,
+        (schema, table),
+    )
+    grants = cur.fetchall()
+    for grantee, privileges in grants:
+        target = "PUBLIC" if grantee == "PUBLIC" else f'"{quote_ident(grantee)}"'
+        cur.execute(f"GRANT {privileges} ON {shadow_name} TO {target}")
+    return len(grants)
+
+
+def load_dependent_views(cur, table_name: str) -> List[Tuple[str, str]]:
+    cur.execute(
+        """
+        SELECT DISTINCT dep.oid::regclass::text, dep.relkind, pg_get_viewdef(dep.oid)
+        FROM pg_depend d
+        JOIN pg_rewrite rw ON rw.oid = d.objid
+        JOIN pg_class dep ON dep.oid = rw.ev_class
+        WHERE d.classid = 'pg_rewrite'::regclass
+          AND d.refobjid = to_regclass(%s)
+          AND dep.oid <> d.refobjid
+        """,
+        (table_name,),
+    )
+    views: List[Tuple[str, str]] = []
+    for view_name, relkind, view_def in cur.fetchall():
+        if relkind != "v":
+            raise RuntimeError(
+                f"{table_name} tiene dependientes que no se pueden recrear en el swap: {view_name}. "
+                "Usar load_strategy='recreate' o eliminar la vista materializada."
+            )
+        views.append((view_name, view_def))
+    return views
+
+
+def publish_shadow_table(
+    conn,
+    table_name: str,
+    shadow_name: str,
+    *,
+    logger: logging.Logger,
+    lock_timeout: str = "30s",
+) -> None:
+    """Reemplaza table_name por shadow_name ya cargada y confirmada.
+
+    Constraints, indices, grants y ANALYZE se preparan sobre la sombra sin bloquear la tabla viva;
+    el swap es un RENAME en una transaccion corta que recrea las vistas dependientes.
+    """
+    schema, table = split_table_name(table_name)
+    retired_name = shadow_table_name(table_name, RETIRED_SUFFIX)
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table_name,))
+        live_exists = cur.fetchone()[0]
+        index_renames: List[Tuple[str, str]] = []
+        constraint_renames: List[Tuple[str, str]] = []
+        if live_exists:
+            constraint_renames = copy_constraints_to_shadow(cur, table_name, shadow_name)
+            index_renames = copy_indexes_to_shadow(cur, table_name, shadow_name)
+            granted = copy_grants_to_shadow(cur, table_name, shadow_name)
+            logger.info(
+                "Sombra preparada | tabla=%s | constraints=%s | indices=%s | grants=%s",
+                shadow_name,
+                len(constraint_renames),
+                len(index_renames),
+                granted,
+            )
+        cur.execute(f"ANALYZE {shadow_name}")
+    conn.commit()
+
+    swap_started = perf_counter()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT set_config('lock_timeout', %s, true)", (lock_timeout,))
+            dependent_views: List[Tuple[str, str]] = []
+            if live_exists:
+                dependent_views = load_dependent_views(cur, table_name)
+                cur.execute(f"DROP TABLE IF EXISTS {retired_name}")
+                cur.execute(f'ALTER TABLE {table_name} RENAME TO "{quote_ident(split_table_name(retired_name)[1])}"')
+            cur.execute(f'ALTER TABLE {shadow_name} RENAME TO "{quote_ident(table)}"')
+            for view_name, view_def in dependent_views:
+                cur.execute(f"CREATE OR REPLACE VIEW {view_name} AS {view_def}")
+            if live_exists:
+                cur.execute(f"DROP TABLE {retired_name}")
+            for temp_name, final_name in constraint_renames:
+                cur.execute(
+                    f'ALTER TABLE {table_name} RENAME CONSTRAINT "{quote_ident(temp_name)}" '
+                    f'TO "{quote_ident(final_name)}"'
+                )
+            for temp_name, final_name in index_renames:
+                cur.execute(
+                    f'ALTER INDEX "{quote_ident(schema)}"."{quote_ident(temp_name)}" '
+                    f'RENAME TO "{quote_ident(final_name)}"'
+                )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        logger.exception("Fallo el swap de %s; la tabla viva queda sin cambios", table_name)
+        raise
+
+    logger.info(
+        "Swap completado | tabla=%s | vistas_recreadas=%s | duracion_swap=%.3fs",
+        table_name,
+        len(dependent_views),
+        perf_counter() - swap_started,
+    )
+
+
 def replace_table_from_query_chunks(
     *,
     query: str,
@@ -127,74 +738,545 @@ def replace_table_from_query_chunks(
     pg_conn_factory: Callable[[], pg2.extensions.connection],
     table_name: str,
     schema_dict: Dict[str, str],
-    transform_chunk: DataFrameTransform,
+    transform_chunk: Optional[DataFrameTransform] = None,
     logger: logging.Logger,
     read_chunk_size: int = 25000,
+    engine: str = "pandas",
+    constant_values: Optional[Dict[str, Any]] = None,
+    strip_columns: Sequence[str] = (),
+    overlap_io: bool = False,
+    queue_chunks: int = 4,
+    load_strategy: str = "recreate",
+    dedup_key: Sequence[str] = (),
+    dedup_order_by: str = "",
 ) -> Dict[str, float]:
+    """Recrea table_name con el resultado de query.
+
+    engine="pandas" lee con pd.read_sql y copia cada chunk como CSV.
+    engine="stream" lee con fetchmany de pyodbc y envia las filas a un unico COPY;
+    sin transform_chunk aplica constant_values y las coerciones de schema_dict por
+    valor, sin DataFrame. Con transform_chunk arma un DataFrame por chunk para el callback.
+
+    overlap_io=True lee SQL Server en un hilo aparte y deja hasta queue_chunks chunks
+    en cola mientras este hilo transforma y copia; la carga sigue siendo una sola
+    transaccion sobre pg_conn.
+
+    load_strategy="recreate" hace DROP ... CASCADE + CREATE de la tabla viva dentro de
+    la transaccion de carga. load_strategy="shadow_swap" carga {tabla}__new sin tocar
+    la tabla viva y la publica con publish_shadow_table.
+
+    Con dedup_key el COPY va a una staging temporal y a la tabla de carga pasa una
+    fila por clave (la primera segun dedup_order_by); el resultado informa cuantas
+    filas duplicadas trajo el origen en "duplicates".
+    """
+    if engine not in LOAD_ENGINES:
+        raise ValueError(f"engine invalido: {engine}. Opciones: {', '.join(LOAD_ENGINES)}")
+    if load_strategy not in LOAD_STRATEGIES:
+        raise ValueError(
+            f"load_strategy invalido: {load_strategy}. Opciones: {', '.join(LOAD_STRATEGIES)}"
+        )
+    load_table = shadow_table_name(table_name) if load_strategy == "shadow_swap" else table_name
+    copy_table = dedup_staging_name(table_name) if dedup_key else load_table
+    duplicate_rows = 0
+
     started_at = perf_counter()
-    total_rows = 0
-    total_chunks = 0
 
     logger.info(
-        "Iniciando extracción desde SQL Server | tabla_destino=%s | chunk_size=%s",
+        "Iniciando extracción desde SQL Server | tabla_destino=%s | chunk_size=%s | engine=%s | overlap_io=%s",
         table_name,
         read_chunk_size,
+        engine,
+        overlap_io,
     )
 
     with pg_conn_factory() as conn:
         try:
             with conn.cursor() as cur:
-                cur.execute(f"DROP TABLE IF EXISTS {table_name} CASCADE")
-                cur.execute(create_table_statement(schema_dict, table_name))
-                logger.info("Tabla destino recreada: %s", table_name)
-
-                for chunk_index, raw_chunk in enumerate(
-                    pd.read_sql(query, sql_engine, chunksize=read_chunk_size),
-                    start=1,
-                ):
-                    raw_rows = len(raw_chunk)
-                    logger.info(
-                        "Chunk %s recibido desde SQL Server con %s filas",
-                        chunk_index,
-                        raw_rows,
+                if load_strategy == "shadow_swap":
+                    cur.execute(f"DROP TABLE IF EXISTS {load_table}")
+                else:
+                    cur.execute(f"DROP TABLE IF EXISTS {load_table} CASCADE")
+                cur.execute(create_table_statement(schema_dict, load_table))
+                logger.info("Tabla de carga recreada: %s", load_table)
+                if dedup_key:
+                    cur.execute(f"DROP TABLE IF EXISTS {copy_table}")
+                    cur.execute(create_temp_table_statement(schema_dict, copy_table))
+
+                if engine == "stream":
+                    total_rows, total_chunks = load_query_with_stream(
+                        cur,
+                        query=query,
+                        sql_engine=sql_engine,
+                        table_name=copy_table,
+                        schema_dict=schema_dict,
+                        transform_chunk=transform_chunk,
+                        logger=logger,
+                        read_chunk_size=read_chunk_size,
+                        constant_values=constant_values or {},
+                        strip_columns=strip_columns,
+                        overlap_io=overlap_io,
+                        queue_chunks=queue_chunks,
+                    )
+                else:
+                    total_rows, total_chunks = load_query_with_pandas(
+                        cur,
+                        query=query,
+                        sql_engine=sql_engine,
+                        table_name=copy_table,
+                        schema_dict=schema_dict,
+                        transform_chunk=transform_chunk,
+                        logger=logger,
+                        read_chunk_size=read_chunk_size,
+                        overlap_io=overlap_io,
+                        queue_chunks=queue_chunks,
                     )
 
-                    transformed = transform_chunk(raw_chunk.copy(), chunk_index, logger)
-                    if transformed.empty:
-                        logger.warning(
-                            "Chunk %s descartado luego de la transformación; se continúa",
-                            chunk_index,
-                        )
-                        continue
-
-                    aligned = align_dataframe_to_schema(transformed, schema_dict)
-                    copy_dataframe_to_postgres(cur, table_name, aligned)
-
-                    chunk_rows = len(aligned)
-                    total_rows += chunk_rows
-                    total_chunks += 1
-                    logger.info(
-                        "Chunk %s copiado a PostgreSQL | filas=%s | acumulado=%s",
-                        chunk_index,
-                        chunk_rows,
-                        total_rows,
+                if dedup_key:
+                    loaded_rows = insert_deduplicated(
+                        cur,
+                        source_table=copy_table,
+                        target_table=load_table,
+                        columns=list(schema_dict),
+                        key_columns=dedup_key,
+                        order_by=dedup_order_by or "1",
                     )
+                    duplicate_rows = total_rows - loaded_rows
+                    total_rows = loaded_rows
+                    log_source_duplicates(logger, table_name, dedup_key, duplicate_rows)
 
             conn.commit()
         except Exception:
             conn.rollback()
-            logger.exception("Se revirtió la transacción de carga sobre %s", table_name)
+            logger.exception("Se revirtió la transacción de carga sobre %s", load_table)
             raise
 
+        if load_strategy == "shadow_swap":
+            publish_shadow_table(conn, table_name, load_table, logger=logger)
+
     elapsed = perf_counter() - started_at
     logger.info(
-        "Carga finalizada | tabla_destino=%s | filas=%s | chunks=%s | duracion=%.2fs",
+        "Carga finalizada | tabla_destino=%s | filas=%s | chunks=%s | duplicados_origen=%s | duracion=%.2fs | filas_seg=%.0f",
         table_name,
         total_rows,
         total_chunks,
+        duplicate_rows,
+        elapsed,
+        total_rows / elapsed if elapsed > 0 else 0.0,
+    )
+    return {"rows": total_rows, "chunks": total_chunks, "seconds": elapsed, "duplicates": duplicate_rows}
+
+
+def fetch_partition_values(sql_engine, query: str) -> List[Any]:
+    sql_conn = sql_engine.raw_connection()
+    try:
+        cursor = sql_conn.cursor()
+        cursor.execute(query)
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        sql_conn.close()
+
+
+def load_partition_with_retry(
+    *,
+    partition_value: Any,
+    query: str,
+    sql_engine,
+    pg_conn_factory: Callable[[], pg2.extensions.connection],
+    load_table: str,
+    schema_dict: Dict[str, str],
+    transform_chunk: Optional[DataFrameTransform],
+    logger: logging.Logger,
+    read_chunk_size: int,
+    constant_values: Dict[str, Any],
+    strip_columns: Sequence[str],
+    max_retries: int,
+    retry_backoff_seconds: float,
+    dedup_key: Sequence[str] = (),
+    dedup_order_by: str = "",
+) -> Tuple[int, int, int, int]:
+    # Cada particion copia y confirma en su propia transaccion; un reintento solo
+    # repite esa particion porque el intento fallido no dejo filas confirmadas.
+    # Con dedup_key la staging temporal es de la sesion del worker, asi que el
+    # descarte de duplicados solo ve filas de esta particion.
+    copy_table = dedup_staging_name(load_table) if dedup_key else load_table
+    attempt = 0
+    while True:
+        attempt += 1
+        conn = None
+        try:
+            # Dentro del try: un fallo al conectar es el error transitorio mas comun.
+            conn = pg_conn_factory()
+            with conn.cursor() as cur:
+                if dedup_key:
+                    cur.execute(create_temp_table_statement(schema_dict, copy_table))
+                rows, chunks = load_query_with_stream(
+                    cur,
+                    query=query,
+                    sql_engine=sql_engine,
+                    table_name=copy_table,
+                    schema_dict=schema_dict,
+                    transform_chunk=transform_chunk,
+                    logger=logger,
+                    read_chunk_size=read_chunk_size,
+                    constant_values=constant_values,
+                    strip_columns=strip_columns,
+                    query_params=(partition_value,),
+                )
+                duplicate_rows = 0
+                if dedup_key:
+                    loaded_rows = insert_deduplicated(
+                        cur,
+                        source_table=copy_table,
+                        target_table=load_table,
+                        columns=list(schema_dict),
+                        key_columns=dedup_key,
+                        order_by=dedup_order_by or "1",
+                    )
+                    duplicate_rows = rows - loaded_rows
+                    rows = loaded_rows
+            conn.commit()
+            log_source_duplicates(logger, load_table, dedup_key, duplicate_rows, partition_value)
+            return rows, chunks, attempt, duplicate_rows
+        except Exception as exc:
+            if conn is not None and not conn.closed:
+                try:
+                    conn.rollback()
+                except Exception:
+                    # Con la conexion rota el rollback falla; no debe ocultar el error original.
+                    logger.debug("No se pudo hacer rollback de la particion %s", partition_value, exc_info=True)
+            if attempt > max_retries:
+                raise
+            logger.warning(
+                "Particion %s fallo en intento %s/%s: %s; se reintenta en %.0fs",
+                partition_value,
+                attempt,
+                max_retries + 1,
+                exc,
+                retry_backoff_seconds * attempt,
+            )
+            time.sleep(retry_backoff_seconds * attempt)
+        finally:
+            if conn is not None and not conn.closed:
+                conn.close()
+
+
+def replace_table_from_partitioned_query(
+    *,
+    query: str,
+    partition_values: Sequence[Any],
+    sql_engine,
+    pg_conn_factory: Callable[[], pg2.extensions.connection],
+    table_name: str,
+    schema_dict: Dict[str, str],
+    logger: logging.Logger,
+    transform_chunk: Optional[DataFrameTransform] = None,
+    read_chunk_size: int = 25000,
+    constant_values: Optional[Dict[str, Any]] = None,
+    strip_columns: Sequence[str] = (),
+    max_workers: int = 4,
+    max_retries: int = 2,
+    retry_backoff_seconds: float = 5.0,
+    dedup_key: Sequence[str] = (),
+    dedup_order_by: str = "",
+) -> Dict[str, Any]:
+    """Recrea table_name ejecutando query una vez por valor de particion, en paralelo.
+
+    query lleva un unico parametro "?" (p. ej. "EXEC dbo.SP @C_SUCU_EMPR = ?").
+    Cada worker usa su propia conexion a SQL Server y a PostgreSQL y copia con el
+    engine "stream" sobre la misma tabla sombra; la tabla viva solo cambia en el
+    swap final, y si alguna particion agota sus reintentos no se publica nada.
+
+    dedup_key descarta duplicados dentro de cada particion como en
+    replace_table_from_query_chunks; la clave debe incluir la columna de particion.
+    """
+    if not partition_values:
+        raise ValueError("partition_values no puede estar vacio")
+
+    started_at = perf_counter()
+    load_table = shadow_table_name(table_name)
+    total_partitions = len(partition_values)
+    logger.info(
+        "Iniciando extracción particionada | tabla_destino=%s | particiones=%s | workers=%s | chunk_size=%s",
+        table_name,
+        total_partitions,
+        max_workers,
+        read_chunk_size,
+    )
+
+    with pg_conn_factory() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {load_table}")
+            cur.execute(create_table_statement(schema_dict, load_table))
+        conn.commit()
+        logger.info("Tabla de carga recreada: %s", load_table)
+
+        partition_rows: Dict[Any, int] = {}
+        failed: Dict[Any, str] = {}
+        total_chunks = 0
+        duplicate_rows = 0
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="etl-particion") as executor:
+            futures = {
+                executor.submit(
+                    load_partition_with_retry,
+                    partition_value=value,
+                    query=query,
+                    sql_engine=sql_engine,
+                    pg_conn_factory=pg_conn_factory,
+                    load_table=load_table,
+                    schema_dict=schema_dict,
+                    transform_chunk=transform_chunk,
+                    logger=logger,
+                    read_chunk_size=read_chunk_size,
+                    constant_values=constant_values or {},
+                    strip_columns=strip_columns,
+                    max_retries=max_retries,
+                    retry_backoff_seconds=retry_backoff_seconds,
+                    dedup_key=dedup_key,
+                    dedup_order_by=dedup_order_by,
+                ): value
+                for value in partition_values
+            }
+            for future in as_completed(futures):
+                value = futures[future]
+                try:
+                    rows, chunks, attempts, duplicates = future.result()
+                except Exception as exc:
+                    failed[value] = str(exc)
+                    logger.error("Particion %s sin cargar luego de reintentos: %s", value, exc)
+                    continue
+                partition_rows[value] = rows
+                total_chunks += chunks
+                duplicate_rows += duplicates
+                logger.info(
+                    "Particion %s completada (%s/%s) | filas=%s | intentos=%s | acumulado=%s",
+                    value,
+                    len(partition_rows) + len(failed),
+                    total_partitions,
+                    rows,
+                    attempts,
+                    sum(partition_rows.values()),
+                )
+
+        if failed:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP TABLE IF EXISTS {load_table}")
+            conn.commit()
+            raise RuntimeError(
+                f"Carga particionada de {table_name} incompleta; particiones fallidas: "
+                + ", ".join(str(value) for value in failed)
+            )
+
+        publish_shadow_table(conn, table_name, load_table, logger=logger)
+
+    total_rows = sum(partition_rows.values())
+    elapsed = perf_counter() - started_at
+    logger.info(
+        "Carga particionada finalizada | tabla_destino=%s | filas=%s | particiones=%s | workers=%s | "
+        "duplicados_origen=%s | duracion=%.2fs",
+        table_name,
+        total_rows,
+        total_partitions,
+        max_workers,
+        duplicate_rows,
+        elapsed,
+    )
+    return {
+        "rows": total_rows,
+        "chunks": total_chunks,
+        "seconds": elapsed,
+        "partitions": partition_rows,
+        "duplicates": duplicate_rows,
+    }
+
+
+def ensure_delta_target(
+    conn,
+    table_name: str,
+    delta_schema: Dict[str, str],
+    hash_column: str,
+    key_columns: Sequence[str],
+    *,
+    logger: logging.Logger,
+    lock_timeout: str = "30s",
+) -> None:
+    """Prepara table_name para el modo delta en una transaccion corta y confirmada.
+
+    El DDL (crear tabla, agregar hash_column, indice unico por clave) solo se ejecuta
+    si falta: ALTER TABLE toma ACCESS EXCLUSIVE antes de evaluar IF NOT EXISTS, asi
+    que no debe quedar dentro de la transaccion larga de la carga.
+    """
+    schema, table = split_table_name(table_name)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT set_config('lock_timeout', %s, true)", (lock_timeout,))
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table_name,))
+            if not cur.fetchone()[0]:
+                cur.execute(create_table_statement(delta_schema, table_name))
+                logger.info("Tabla destino creada para modo delta: %s", table_name)
+
+            cur.execute(
+                """
+                SELECT 1
+                FROM information_schema.columns
+                WHERE table_schema = %s AND table_name = %s AND column_name = %s
+                """,
+                (schema, table, hash_column),
+            )
+            if cur.fetchone() is None:
+                cur.execute(f'ALTER TABLE {table_name} ADD COLUMN "{quote_ident(hash_column)}" TEXT')
+                logger.info("Columna %s agregada a %s", hash_column, table_name)
+
+            cur.execute(
+                """
+                SELECT array_agg(att.attname::text)
+                FROM pg_index ix
+                JOIN pg_attribute att ON att.attrelid = ix.indrelid AND att.attnum = ANY(ix.indkey)
+                WHERE ix.indrelid = to_regclass(%s)
+                  AND ix.indisunique
+                GROUP BY ix.indexrelid
+                """,
+                (table_name,),
+            )
+            unique_keys = [set(row[0]) for row in cur.fetchall()]
+            if set(key_columns) not in unique_keys:
+                index_name = f"{table[: PG_IDENTIFIER_MAX - len('_delta_uq')]}_delta_uq"
+                key_list_sql = ", ".join([f'"{quote_ident(col)}"' for col in key_columns])
+                cur.execute(f'CREATE UNIQUE INDEX "{quote_ident(index_name)}" ON {table_name} ({key_list_sql})')
+                logger.info("Indice unico por clave creado en %s: %s", table_name, index_name)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        logger.exception("No se pudo preparar %s para la sincronización delta", table_name)
+        raise
+
+
+def sync_table_delta_from_query(
+    *,
+    query: str,
+    sql_engine,
+    pg_conn_factory: Callable[[], pg2.extensions.connection],
+    table_name: str,
+    schema_dict: Dict[str, str],
+    key_columns: Sequence[str],
+    logger: logging.Logger,
+    transform_chunk: Optional[DataFrameTransform] = None,
+    read_chunk_size: int = 25000,
+    constant_values: Optional[Dict[str, Any]] = None,
+    strip_columns: Sequence[str] = (),
+    hash_exclude: Sequence[str] = (),
+    hash_column: str = "row_hash",
+    overlap_io: bool = False,
+) -> Dict[str, Any]:
+    """Sincroniza table_name con query aplicando solo altas, cambios y bajas.
+
+    Cada fila entrante lleva el md5 de sus columnas (salvo hash_exclude, p. ej. la
+    fecha de extraccion) en hash_column. Las filas se copian a una staging temporal
+    y se comparan contra el hash guardado en destino por key_columns; las filas sin
+    cambios no se reescriben. El DDL del destino va antes en una transaccion corta
+    (ver ensure_delta_target); la carga se aplica en una sola transaccion.
+    """
+    started_at = perf_counter()
+    staging_table = f"tmp_delta__{split_table_name(table_name)[1]}"
+    keys = [column.lower() for column in key_columns]
+    key_match = " AND ".join([f'tgt."{quote_ident(col)}" = stg."{quote_ident(col)}"' for col in keys])
+    all_columns = list(schema_dict) + [hash_column]
+    columns_sql = ", ".join([f'"{quote_ident(col)}"' for col in all_columns])
+    update_sql = ", ".join(
+        [f'"{quote_ident(col)}" = stg."{quote_ident(col)}"' for col in all_columns if col not in keys]
+    )
+    delta_schema = {**schema_dict, hash_column: "TEXT"}
+
+    logger.info(
+        "Iniciando sincronización delta | tabla_destino=%s | claves=%s | chunk_size=%s",
+        table_name,
+        ",".join(keys),
+        read_chunk_size,
+    )
+
+    with pg_conn_factory() as conn:
+        ensure_delta_target(conn, table_name, delta_schema, hash_column, keys, logger=logger)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP TABLE IF EXISTS {staging_table}")
+                cur.execute(create_temp_table_statement(delta_schema, staging_table))
+                total_rows, total_chunks = load_query_with_stream(
+                    cur,
+                    query=query,
+                    sql_engine=sql_engine,
+                    table_name=staging_table,
+                    schema_dict=schema_dict,
+                    transform_chunk=transform_chunk,
+                    logger=logger,
+                    read_chunk_size=read_chunk_size,
+                    constant_values=constant_values or {},
+                    strip_columns=strip_columns,
+                    overlap_io=overlap_io,
+                    hash_column=hash_column,
+                    hash_exclude=hash_exclude,
+                )
+                key_list_sql = ", ".join([f'"{quote_ident(col)}"' for col in keys])
+                cur.execute(f"CREATE INDEX ON {staging_table} ({key_list_sql})")
+                cur.execute(f"ANALYZE {staging_table}")
+
+                cur.execute(
+                    f"""
+                    DELETE FROM {table_name} tgt
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM {staging_table} stg WHERE {key_match}
+                    )
+                    """
+                )
+                deleted_rows = cur.rowcount
+                cur.execute(
+                    f"""
+                    UPDATE {table_name} tgt
+                    SET {update_sql}
+                    FROM {staging_table} stg
+                    WHERE {key_match}
+                      AND tgt."{quote_ident(hash_column)}" IS DISTINCT FROM stg."{quote_ident(hash_column)}"
+                    """
+                )
+                updated_rows = cur.rowcount
+                cur.execute(
+                    f"""
+                    INSERT INTO {table_name} ({columns_sql})
+                    SELECT {", ".join([f'stg."{quote_ident(col)}"' for col in all_columns])}
+                    FROM {staging_table} stg
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM {table_name} tgt WHERE {key_match}
+                    )
+                    """
+                )
+                inserted_rows = cur.rowcount
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.exception("Se revirtió la sincronización delta sobre %s", table_name)
+            raise
+
+    elapsed = perf_counter() - started_at
+    unchanged_rows = max(total_rows - updated_rows - inserted_rows, 0)
+    logger.info(
+        "Sincronización delta finalizada | tabla_destino=%s | filas_origen=%s | insertadas=%s | "
+        "actualizadas=%s | eliminadas=%s | sin_cambios=%s | duracion=%.2fs",
+        table_name,
+        total_rows,
+        inserted_rows,
+        updated_rows,
+        deleted_rows,
+        unchanged_rows,
         elapsed,
     )
-    return {"rows": total_rows, "chunks": total_chunks, "seconds": elapsed}
+    return {
+        "rows": total_rows,
+        "chunks": total_chunks,
+        "seconds": elapsed,
+        "inserted": inserted_rows,
+        "updated": updated_rows,
+        "deleted": deleted_rows,
+        "unchanged": unchanged_rows,
+    }
 
 
 def quote_ident(identifier: str) -> str:
@@ -1,12 +1,37 @@
 # flujo_push_datos_forecast.py
 
+import contextvars
+import importlib
 import os
 import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 from time import perf_counter
 
 from prefect import flow, get_run_logger, task
 
+MODOS_EJECUCION = ("subprocess", "in_process")
+MODO_EJECUCION_DEFAULT = os.getenv("FORECAST_PUSH_MODE", "subprocess").strip().lower()
+MAX_WORKERS_DEFAULT = int(os.getenv("FORECAST_PUSH_MAX_WORKERS", "3"))
+REINTENTOS_SCRIPT = 2
+ESPERA_REINTENTO_SEGUNDOS = 60
+
+# (script, flow que expone, scripts de los que depende). Cada script carga su propia
+# tabla src.*; en modo in_process un script solo arranca cuando terminaron OK todos sus
+# depende_de. obtener_base_stock depende de productos_vigentes porque ajustar_transferencias_cd
+# lee src.base_productos_vigentes, que ese script publica con un RENAME: en paralelo el swap
+# podia vencer su lock_timeout o el ajuste leer la tabla a medio publicar. La lista esta en
+# orden topologico, que es tambien el orden del modo subprocess.
+SCRIPTS_FORECAST = [
+    ("obtener_base_productos_vigentes.py", "capturar_base_articulos", ()),
+    ("obtener_base_stock.py", "capturar_base_stock", ("obtener_base_productos_vigentes.py",)),
+    ("obtener_oc_demoradas_proveedor.py", "capturar_oc_demoradas_proveedores", ()),
+    ("obtener_base_transferencias_pendientes.py", "capturar_transferencias_pendientes", ()),
+    ("obtener_base_productos_transito.py", "capturar_base_productos_transito", ()),
+]
+
 
 @task(log_prints=True, retries=2, retry_delay_seconds=60)
 def ejecutar_script(nombre: str, orden: int, total: int):
@@ -79,20 +104,142 @@ def ejecutar_script(nombre: str, orden: int, total: int):
         ) from exc
 
 
+def validar_grafo_scripts(scripts):
+    nombres = [nombre for nombre, _, _ in scripts]
+    for nombre, _, depende_de in scripts:
+        faltantes = [dep for dep in depende_de if dep not in nombres]
+        if faltantes:
+            raise ValueError(f"Dependencias no declaradas para {nombre}: {', '.join(faltantes)}")
+
+    pendientes = {nombre: set(depende_de) for nombre, _, depende_de in scripts}
+    while pendientes:
+        listos = [nombre for nombre, deps in pendientes.items() if not deps]
+        if not listos:
+            raise ValueError(f"Dependencia circular entre scripts: {', '.join(sorted(pendientes))}")
+        for nombre in listos:
+            del pendientes[nombre]
+        for deps in pendientes.values():
+            deps.difference_update(listos)
+
+
+def importar_flujo(nombre: str, funcion: str):
+    # Los scripts importan etl_chunk_utils como modulo de primer nivel.
+    scripts_dir = str(Path(__file__).resolve().parent)
+    if scripts_dir not in sys.path:
+        sys.path.insert(0, scripts_dir)
+    modulo = importlib.import_module(Path(nombre).stem)
+    return getattr(modulo, funcion)
+
+
+def ejecutar_flujo_en_proceso(nombre: str, flujo, logger):
+    inicio = perf_counter()
+    intento = 0
+    while True:
+        intento += 1
+        try:
+            flujo()
+            break
+        except Exception as exc:
+            if intento > REINTENTOS_SCRIPT:
+                raise
+            logger.warning(
+                "Script con error, se reintenta | nombre=%s | intento=%s/%s | error=%s",
+                nombre,
+                intento,
+                REINTENTOS_SCRIPT + 1,
+                exc,
+            )
+            time.sleep(ESPERA_REINTENTO_SEGUNDOS)
+
+    duracion = perf_counter() - inicio
+    logger.info("Script finalizado OK | nombre=%s | intentos=%s | duracion=%.2fs", nombre, intento, duracion)
+    return {"script": nombre, "seconds": duracion}
+
+
+def ejecutar_scripts_en_proceso(scripts, max_workers: int, logger):
+    """Corre los flows de scripts como subflows en hilos, respetando depende_de.
+
+    Los modulos se importan una sola vez antes de lanzar hilos, asi cada script arma
+    su logger y su engine una vez y sin competir por el import. Un script que falla
+    no corta a los demas; los que dependen de el quedan omitidos.
+    """
+    validar_grafo_scripts(scripts)
+    flujos = {nombre: importar_flujo(nombre, funcion) for nombre, funcion, _ in scripts}
+    dependencias = {nombre: set(depende_de) for nombre, _, depende_de in scripts}
+
+    resultados = {}
+    fallidos = {}
+    omitidos = []
+    pendientes = [nombre for nombre, _, _ in scripts]
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="forecast-push") as executor:
+        en_curso = {}
+        while pendientes or en_curso:
+            for nombre in list(pendientes):
+                deps = dependencias[nombre]
+                if deps & (set(fallidos) | set(omitidos)):
+                    pendientes.remove(nombre)
+                    omitidos.append(nombre)
+                    logger.error("Script omitido por dependencia fallida | nombre=%s", nombre)
+                elif deps <= set(resultados):
+                    pendientes.remove(nombre)
+                    logger.info("Iniciando script en proceso | nombre=%s", nombre)
+                    # Copia el contexto de Prefect para que cada flow quede como subflow de este.
+                    futuro = executor.submit(
+                        contextvars.copy_context().run,
+                        ejecutar_flujo_en_proceso,
+                        nombre,
+                        flujos[nombre],
+                        logger,
+                    )
+                    en_curso[futuro] = nombre
+
+            if not en_curso:
+                continue
+            terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                nombre = en_curso.pop(futuro)
+                try:
+                    resultados[nombre] = futuro.result()
+                except Exception as exc:
+                    fallidos[nombre] = str(exc)
+                    logger.error("Script con error | nombre=%s | error=%s", nombre, exc)
+
+    return resultados, fallidos, omitidos
+
+
 @flow(name="Push Datos para FORECAST", persist_result=False)
-def forecast_flow():
+def forecast_flow(modo: str = MODO_EJECUCION_DEFAULT, max_workers: int = MAX_WORKERS_DEFAULT):
     logger = get_run_logger()
     started_at = perf_counter()
+    modo = modo.strip().lower()
+    if modo not in MODOS_EJECUCION:
+        raise ValueError(f"modo invalido: {modo}. Opciones: {', '.join(MODOS_EJECUCION)}")
+
+    scripts = [nombre for nombre, _, _ in SCRIPTS_FORECAST]
 
-    scripts = [
-        "obtener_base_stock.py",
-        "obtener_oc_demoradas_proveedor.py",
-        "obtener_base_transferencias_pendientes.py",
-        "obtener_base_productos_transito.py",
-        "obtener_base_productos_vigentes.py"
-    ]
+    logger.info("Inicio flujo forecast | scripts=%s | modo=%s | max_workers=%s", len(scripts), modo, max_workers)
 
-    logger.info("Inicio flujo forecast | scripts=%s", len(scripts))
+    if modo == "in_process":
+        resultados, fallidos, omitidos = ejecutar_scripts_en_proceso(SCRIPTS_FORECAST, max_workers, logger)
+        duracion_total = perf_counter() - started_at
+        duracion_secuencial = sum(resultado["seconds"] for resultado in resultados.values())
+        logger.info(
+            "Flujo forecast finalizado | scripts_ok=%s | fallidos=%s | omitidos=%s | duracion_total=%.2fs | "
+            "suma_scripts=%.2fs",
+            len(resultados),
+            len(fallidos),
+            len(omitidos),
+            duracion_total,
+            duracion_secuencial,
+        )
+        if fallidos or omitidos:
+            raise RuntimeError(
+                "Flujo forecast incompleto | fallidos="
+                + (", ".join(sorted(fallidos)) or "-")
+                + " | omitidos="
+                + (", ".join(omitidos) or "-")
+            )
+        return
 
     resultados = []
     for posicion, script in enumerate(scripts, start=1):
@@ -4,24 +4,28 @@ import ast
 import os
 import re
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta
 from time import perf_counter
 
-import pandas as pd
 from dotenv import load_dotenv
 from prefect import flow, get_run_logger, task
 
 from etl_chunk_utils import (
-    align_dataframe_to_schema,
     build_sql_server_engine,
     coerce_datetime_column,
     coerce_float_column,
     coerce_int_column,
-    copy_dataframe_to_postgres,
     create_table_statement,
+    create_temp_table_statement,
+    fetch_partition_values,
+    insert_deduplicated,
+    load_query_with_stream,
     open_pg_conn,
+    publish_shadow_table,
+    replace_table_from_partitioned_query,
     replace_table_from_query_chunks,
     setup_script_logger,
+    shadow_table_name,
 )
 
 
@@ -44,11 +48,32 @@ DEFAULT_TABLE_DESTINO = os.getenv(
     "src.base_productos_vigentes",
 ).strip()
 READ_CHUNK_SIZE = int(os.getenv("ETL_CHUNK_SIZE_BASE_PRODUCTOS", "25000"))
+# Con mas de 1 worker el modo sqlserver_sp ejecuta el SP por sucursal en paralelo.
+PARTITION_WORKERS = int(os.getenv("ETL_PARTITION_WORKERS_BASE_PRODUCTOS", "1"))
+# Una fila por clave; ante duplicados del origen queda la extraccion mas reciente.
+DEDUP_KEY_COLUMNS = ("c_sucu_empr", "c_articulo", "c_proveedor_primario")
+DEDUP_ORDER_BY = "fecha_extraccion DESC NULLS LAST"
+TMP_TABLE_RESULTADO = "tmp_bp_resultado"
+TMP_TABLE_HIST_INCREMENTO = "tmp_bp_hist_incremento"
+SQL_QUERY_SUCURSALES_PARTICION = "SELECT DISTINCT C_SUCU_EMPR FROM repl.T100_EMPRESA_SUC ORDER BY C_SUCU_EMPR"
 DEFAULT_BASE_PRODUCTOS_SOURCE_MODE = os.getenv(
     "BASE_PRODUCTOS_SOURCE_MODE",
     "sqlserver_sp",
 ).strip().lower()
 
+# Cache persistente del modo hybrid_src. Las tablas chicas se recargan enteras cuando
+# su refresco supera CACHE_TTL_MINUTES; el historial T804 solo trae filas nuevas
+# desde el watermark, con una ventana de solapamiento para altas replicadas tarde.
+CACHE_SCHEMA = os.getenv("BASE_PRODUCTOS_CACHE_SCHEMA", "src").strip()
+CACHE_TTL_MINUTES = int(os.getenv("BASE_PRODUCTOS_CACHE_TTL_MINUTES", "60"))
+CACHE_HIST_OVERLAP_HOURS = int(os.getenv("BASE_PRODUCTOS_CACHE_HIST_OVERLAP_HOURS", "24"))
+CACHE_HIST_DESDE_INICIAL = datetime(1900, 1, 1)
+CACHE_TABLE_ESTADO = f"{CACHE_SCHEMA}.cache_bp_estado"
+CACHE_TABLE_SURTIDO = f"{CACHE_SCHEMA}.cache_bp_surtido"
+CACHE_TABLE_HIST_VIGENCIA = f"{CACHE_SCHEMA}.cache_bp_hist_vigencia"
+CACHE_TABLE_MARCA_BARRIO = f"{CACHE_SCHEMA}.cache_bp_marca_barrio"
+CACHE_TABLE_SUC_EXCLUIDAS = f"{CACHE_SCHEMA}.cache_bp_sucursales_excluidas"
+
 logger = setup_script_logger(
     "obtener_base_productos_vigentes",
     "replicacion_base_productos_vigentes.log",
@@ -78,21 +103,23 @@ def assert_sql_table_name(table_name: str) -> str:
 def resolve_runtime_options(payload):
     source_mode = DEFAULT_BASE_PRODUCTOS_SOURCE_MODE
     table_destino = DEFAULT_TABLE_DESTINO
+    cache_full_refresh = False
 
     if isinstance(payload, dict):
         if payload.get("mode") is not None:
             source_mode = str(payload["mode"]).strip().lower()
         if payload.get("target_table") is not None:
             table_destino = str(payload["target_table"]).strip()
+        cache_full_refresh = bool(payload.get("cache_full_refresh", False))
     elif isinstance(payload, str):
         source_mode = payload.strip().lower()
     elif payload is not None:
         raise ValueError(
             "Argumento no soportado. Usar string con el modo o dict con "
-            "{'mode': '...', 'target_table': 'schema.tabla'}."
+            "{'mode': '...', 'target_table': 'schema.tabla', 'cache_full_refresh': False}."
         )
 
-    return source_mode, assert_sql_table_name(table_destino)
+    return source_mode, assert_sql_table_name(table_destino), cache_full_refresh
 
 
 ESQUEMA_BASE_PRODUCTOS = {
@@ -129,19 +156,20 @@ ESQUEMA_BASE_PRODUCTOS = {
     "estado_sincronizacion": "INTEGER",
 }
 
-TMP_SCHEMA_SURTIDO = {"c_articulo": "INTEGER"}
-TMP_SCHEMA_HIST_VIGENCIA = {
+ESQUEMA_CACHE_SURTIDO = {"c_articulo": "INTEGER"}
+ESQUEMA_HIST_INCREMENTO = {
     "c_sucu_empr": "INTEGER",
     "c_articulo": "INTEGER",
     "fecha_alta_hist": "TIMESTAMP",
     "fecha_baja_hist": "TIMESTAMP",
+    "max_f_alta_sist": "TIMESTAMP",
 }
-TMP_SCHEMA_MARCA_BARRIO = {
+ESQUEMA_CACHE_MARCA_BARRIO = {
     "c_sucu_empr": "INTEGER",
     "c_articulo": "INTEGER",
     "m_habilitado_sucu": "VARCHAR(1)",
 }
-TMP_SCHEMA_SUC_EXCLUIDAS = {"c_sucu_empr": "INTEGER"}
+ESQUEMA_CACHE_SUC_EXCLUIDAS = {"c_sucu_empr": "INTEGER"}
 
 SQL_QUERY_SURTIDO = """
 SELECT DISTINCT
@@ -149,18 +177,18 @@ SELECT DISTINCT
 FROM repl.T060_STOCK st
 """
 
-SQL_QUERY_HIST_VIGENCIA = """
+# Sin filtro de surtido: el cache guarda el historial de todos los articulos y el
+# INSERT principal lo cruza con el surtido vigente, asi un articulo que vuelve al
+# surtido no pierde sus altas anteriores al watermark.
+SQL_QUERY_HIST_VIGENCIA_INCREMENTAL = """
 SELECT
     CAST(hist.C_SUCU_EMPR AS INT) AS c_sucu_empr,
     CAST(hist.C_ARTICULO AS INT) AS c_articulo,
     MAX(CASE WHEN hist.M_LISTO_PARA_VENTA_ACT = 'S' THEN hist.F_ALTA_SIST END) AS fecha_alta_hist,
-    MAX(CASE WHEN hist.M_LISTO_PARA_VENTA_ACT = 'N' THEN hist.F_ALTA_SIST END) AS fecha_baja_hist
+    MAX(CASE WHEN hist.M_LISTO_PARA_VENTA_ACT = 'N' THEN hist.F_ALTA_SIST END) AS fecha_baja_hist,
+    MAX(hist.F_ALTA_SIST) AS max_f_alta_sist
 FROM repl.T804_HIST_MARCA_LISTO_PARA_VENTA hist
-INNER JOIN (
-    SELECT DISTINCT C_ARTICULO
-    FROM repl.T060_STOCK
-) surtido
-    ON surtido.C_ARTICULO = hist.C_ARTICULO
+WHERE hist.F_ALTA_SIST > ?
 GROUP BY hist.C_SUCU_EMPR, hist.C_ARTICULO
 """
 
@@ -183,6 +211,57 @@ SELECT
 FROM dbo.SUCURSALES_EXCLUIDAS ex
 """
 
+# (cache_name, tabla, esquema, query, chunk_size) de los caches que se recargan enteros.
+CACHE_SNAPSHOTS = (
+    ("surtido", CACHE_TABLE_SURTIDO, ESQUEMA_CACHE_SURTIDO, SQL_QUERY_SURTIDO, READ_CHUNK_SIZE),
+    ("marca_barrio", CACHE_TABLE_MARCA_BARRIO, ESQUEMA_CACHE_MARCA_BARRIO, SQL_QUERY_MARCA_BARRIO, READ_CHUNK_SIZE),
+    ("sucursales_excluidas", CACHE_TABLE_SUC_EXCLUIDAS, ESQUEMA_CACHE_SUC_EXCLUIDAS, SQL_QUERY_SUC_EXCLUIDAS, 1000),
+)
+
+PG_DDL_CACHE_BASE_PRODUCTOS = f"""
+CREATE TABLE IF NOT EXISTS {CACHE_TABLE_ESTADO} (
+    cache_name VARCHAR(60) PRIMARY KEY,
+    watermark TIMESTAMP,
+    refreshed_at TIMESTAMPTZ NOT NULL,
+    rows_loaded BIGINT NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS {CACHE_TABLE_SURTIDO} (
+    c_articulo INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS {CACHE_TABLE_HIST_VIGENCIA} (
+    c_sucu_empr INTEGER NOT NULL,
+    c_articulo INTEGER NOT NULL,
+    fecha_alta_hist TIMESTAMP,
+    fecha_baja_hist TIMESTAMP,
+    PRIMARY KEY (c_sucu_empr, c_articulo)
+);
+CREATE TABLE IF NOT EXISTS {CACHE_TABLE_MARCA_BARRIO} (
+    c_sucu_empr INTEGER,
+    c_articulo INTEGER,
+    m_habilitado_sucu VARCHAR(1)
+);
+CREATE INDEX IF NOT EXISTS cache_bp_marca_barrio_sucu_art_idx
+    ON {CACHE_TABLE_MARCA_BARRIO} (c_sucu_empr, c_articulo);
+CREATE TABLE IF NOT EXISTS {CACHE_TABLE_SUC_EXCLUIDAS} (
+    c_sucu_empr INTEGER
+);
+CREATE INDEX IF NOT EXISTS cache_bp_sucursales_excluidas_sucu_idx
+    ON {CACHE_TABLE_SUC_EXCLUIDAS} (c_sucu_empr);
+"""
+
+# GREATEST ignora NULL, asi que re-aplicar filas de la ventana de solapamiento no
+# cambia el resultado; el WHERE evita reescribir filas que ya estaban al dia.
+PG_MERGE_HIST_VIGENCIA = f"""
+INSERT INTO {CACHE_TABLE_HIST_VIGENCIA} AS cache (c_sucu_empr, c_articulo, fecha_alta_hist, fecha_baja_hist)
+SELECT c_sucu_empr, c_articulo, fecha_alta_hist, fecha_baja_hist
+FROM {TMP_TABLE_HIST_INCREMENTO}
+ON CONFLICT (c_sucu_empr, c_articulo) DO UPDATE
+SET fecha_alta_hist = GREATEST(cache.fecha_alta_hist, EXCLUDED.fecha_alta_hist),
+    fecha_baja_hist = GREATEST(cache.fecha_baja_hist, EXCLUDED.fecha_baja_hist)
+WHERE cache.fecha_alta_hist IS DISTINCT FROM GREATEST(cache.fecha_alta_hist, EXCLUDED.fecha_alta_hist)
+   OR cache.fecha_baja_hist IS DISTINCT FROM GREATEST(cache.fecha_baja_hist, EXCLUDED.fecha_baja_hist)
+"""
+
 PG_INSERT_BASE_PRODUCTOS_HYBRID_TEMPLATE = """
 WITH vigencia AS (
     SELECT
@@ -206,12 +285,12 @@ WITH vigencia AS (
             ELSE NULL
         END AS fecha_baja
     FROM src.t051_articulos_sucursal suc
-    INNER JOIN tmp_bp_surtido sur
+    INNER JOIN {surtido_table} sur
         ON sur.c_articulo = suc.c_articulo
     INNER JOIN src.t050_articulos art
         ON art.c_articulo = suc.c_articulo
        AND art.m_baja = 'N'
-    LEFT JOIN tmp_bp_hist_vigencia hv
+    LEFT JOIN {hist_vigencia_table} hv
         ON hv.c_sucu_empr = suc.c_sucu_empr
        AND hv.c_articulo = suc.c_articulo
     WHERE suc.c_sucu_empr <> 300
@@ -317,11 +396,11 @@ SELECT
     CURRENT_TIMESTAMP AS fecha_extraccion,
     0 AS estado_sincronizacion
 FROM src.t051_articulos_sucursal suc
-INNER JOIN tmp_bp_surtido sur
+INNER JOIN {surtido_table} sur
     ON sur.c_articulo = suc.c_articulo
 INNER JOIN src.t050_articulos art
     ON art.c_articulo = suc.c_articulo
-LEFT JOIN tmp_bp_marca_barrio mb
+LEFT JOIN {marca_barrio_table} mb
     ON mb.c_sucu_empr = suc.c_sucu_empr
    AND mb.c_articulo = suc.c_articulo
 LEFT JOIN src.t052_articulos_proveedor prov
@@ -335,7 +414,7 @@ INNER JOIN vigencia v
    AND v.c_articulo = suc.c_articulo
 WHERE suc.c_sucu_empr NOT IN (
     SELECT ex.c_sucu_empr
-    FROM tmp_bp_sucursales_excluidas ex
+    FROM {sucursales_excluidas_table} ex
 )
   AND art.m_a_dar_de_baja <> 'S'
   AND suc.m_habilitado_sucu = 'S'
@@ -397,145 +476,204 @@ def transformar_chunk(df, chunk_index, task_logger):
     return df
 
 
-def create_temp_table_statement(schema_dict, table_name):
-    return (
-        create_table_statement(schema_dict, table_name)
-        .replace("CREATE TABLE", "CREATE TEMP TABLE", 1)
-        + " ON COMMIT DROP"
+def registrar_estado_cache(pg_cur, cache_name, watermark, rows_loaded):
+    pg_cur.execute(
+        f"""
+        INSERT INTO {CACHE_TABLE_ESTADO} (cache_name, watermark, refreshed_at, rows_loaded)
+        VALUES (%s, %s, now(), %s)
+        ON CONFLICT (cache_name) DO UPDATE
+        SET watermark = EXCLUDED.watermark,
+            refreshed_at = EXCLUDED.refreshed_at,
+            rows_loaded = EXCLUDED.rows_loaded
+        """,
+        (cache_name, watermark, rows_loaded),
     )
 
 
-def load_sqlserver_query_into_pg_temp(
+def refrescar_cache_snapshot(
+    conn,
     *,
-    pg_cur,
+    cache_name,
     table_name,
     schema_dict,
     query,
-    task_logger,
     chunk_size,
+    task_logger,
+    full_refresh=False,
 ):
-    pg_cur.execute(f"DROP TABLE IF EXISTS {table_name}")
-    pg_cur.execute(create_temp_table_statement(schema_dict, table_name))
-
-    total_rows = 0
-    total_chunks = 0
-    for chunk_index, raw_chunk in enumerate(
-        pd.read_sql(query, sql_engine, chunksize=chunk_size),
-        start=1,
-    ):
-        aligned = align_dataframe_to_schema(raw_chunk, schema_dict)
-        copy_dataframe_to_postgres(pg_cur, table_name, aligned)
-        total_rows += len(aligned)
-        total_chunks += 1
-
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT refreshed_at > now() - make_interval(mins => %s)
+            FROM {CACHE_TABLE_ESTADO}
+            WHERE cache_name = %s
+            """,
+            (CACHE_TTL_MINUTES, cache_name),
+        )
+        row = cur.fetchone()
+        if row and row[0] and not full_refresh:
+            task_logger.info("Cache vigente, sin recarga | cache=%s | tabla=%s", cache_name, table_name)
+            return 0
+
+        cur.execute(f"TRUNCATE {table_name}")
+        rows, chunks = load_query_with_stream(
+            cur,
+            query=query,
+            sql_engine=sql_engine,
+            table_name=table_name,
+            schema_dict=schema_dict,
+            transform_chunk=None,
+            logger=task_logger,
+            read_chunk_size=chunk_size,
+            constant_values={},
+            strip_columns=(),
+        )
+        cur.execute(f"ANALYZE {table_name}")
+        registrar_estado_cache(cur, cache_name, None, rows)
+    conn.commit()
+    task_logger.info("Cache recargado | cache=%s | tabla=%s | filas=%s", cache_name, table_name, rows)
+    return chunks
+
+
+def refrescar_cache_hist_vigencia(conn, task_logger, full_refresh=False):
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT watermark FROM {CACHE_TABLE_ESTADO} WHERE cache_name = %s",
+            ("hist_vigencia",),
+        )
+        row = cur.fetchone()
+        watermark = row[0] if row and not full_refresh else None
+        if watermark is None:
+            cur.execute(f"TRUNCATE {CACHE_TABLE_HIST_VIGENCIA}")
+            desde = CACHE_HIST_DESDE_INICIAL
+        else:
+            desde = watermark - timedelta(hours=CACHE_HIST_OVERLAP_HOURS)
+
+        cur.execute(f"DROP TABLE IF EXISTS {TMP_TABLE_HIST_INCREMENTO}")
+        cur.execute(create_temp_table_statement(ESQUEMA_HIST_INCREMENTO, TMP_TABLE_HIST_INCREMENTO))
+        rows, chunks = load_query_with_stream(
+            cur,
+            query=SQL_QUERY_HIST_VIGENCIA_INCREMENTAL,
+            sql_engine=sql_engine,
+            table_name=TMP_TABLE_HIST_INCREMENTO,
+            schema_dict=ESQUEMA_HIST_INCREMENTO,
+            transform_chunk=None,
+            logger=task_logger,
+            read_chunk_size=READ_CHUNK_SIZE,
+            constant_values={},
+            strip_columns=(),
+            query_params=(desde,),
+        )
+        cur.execute(PG_MERGE_HIST_VIGENCIA)
+        merged_rows = cur.rowcount if cur.rowcount is not None else 0
+        cur.execute(f"SELECT max(max_f_alta_sist) FROM {TMP_TABLE_HIST_INCREMENTO}")
+        nuevo_watermark = cur.fetchone()[0]
+        if watermark is not None and (nuevo_watermark is None or nuevo_watermark < watermark):
+            nuevo_watermark = watermark
+        if merged_rows:
+            cur.execute(f"ANALYZE {CACHE_TABLE_HIST_VIGENCIA}")
+        registrar_estado_cache(cur, "hist_vigencia", nuevo_watermark, merged_rows)
+    conn.commit()
     task_logger.info(
-        "Temp cargada desde SQL Server | tabla=%s | filas=%s | chunks=%s",
-        table_name,
-        total_rows,
-        total_chunks,
+        "Cache historial actualizado | desde=%s | claves_leidas=%s | claves_modificadas=%s | watermark=%s",
+        desde,
+        rows,
+        merged_rows,
+        nuevo_watermark,
     )
-    return total_rows, total_chunks
+    return chunks
 
 
-def crear_indices_temporales(pg_cur):
-    pg_cur.execute(
-        """
-        CREATE INDEX IF NOT EXISTS idx_tmp_bp_surtido_art
-            ON tmp_bp_surtido (c_articulo);
-        CREATE INDEX IF NOT EXISTS idx_tmp_bp_hist_vigencia_sucu_art
-            ON tmp_bp_hist_vigencia (c_sucu_empr, c_articulo);
-        CREATE INDEX IF NOT EXISTS idx_tmp_bp_marca_barrio_sucu_art
-            ON tmp_bp_marca_barrio (c_sucu_empr, c_articulo);
-        CREATE INDEX IF NOT EXISTS idx_tmp_bp_suc_excluidas_sucu
-            ON tmp_bp_sucursales_excluidas (c_sucu_empr);
-        """
-    )
+def refrescar_caches_hibrida(conn, task_logger, full_refresh=False):
+    with conn.cursor() as cur:
+        cur.execute(PG_DDL_CACHE_BASE_PRODUCTOS)
+    conn.commit()
+
+    sql_chunks = 0
+    for cache_name, table_name, schema_dict, query, chunk_size in CACHE_SNAPSHOTS:
+        sql_chunks += refrescar_cache_snapshot(
+            conn,
+            cache_name=cache_name,
+            table_name=table_name,
+            schema_dict=schema_dict,
+            query=query,
+            chunk_size=chunk_size,
+            task_logger=task_logger,
+            full_refresh=full_refresh,
+        )
+    sql_chunks += refrescar_cache_hist_vigencia(conn, task_logger, full_refresh=full_refresh)
+    return sql_chunks
 
 
-def cargar_base_productos_hibrida_impl(task_logger, table_destino: str):
+def cargar_base_productos_hibrida_impl(task_logger, table_destino: str, cache_full_refresh: bool = False):
     started_at = perf_counter()
-    sql_chunks = 0
+    table_carga = shadow_table_name(table_destino)
 
     with open_pg_conn_local() as conn:
         try:
-            with conn.cursor() as cur:
-                rows, chunks = load_sqlserver_query_into_pg_temp(
-                    pg_cur=cur,
-                    table_name="tmp_bp_surtido",
-                    schema_dict=TMP_SCHEMA_SURTIDO,
-                    query=SQL_QUERY_SURTIDO,
-                    task_logger=task_logger,
-                    chunk_size=READ_CHUNK_SIZE,
-                )
-                sql_chunks += chunks
-
-                _, chunks = load_sqlserver_query_into_pg_temp(
-                    pg_cur=cur,
-                    table_name="tmp_bp_hist_vigencia",
-                    schema_dict=TMP_SCHEMA_HIST_VIGENCIA,
-                    query=SQL_QUERY_HIST_VIGENCIA,
-                    task_logger=task_logger,
-                    chunk_size=READ_CHUNK_SIZE,
-                )
-                sql_chunks += chunks
-
-                _, chunks = load_sqlserver_query_into_pg_temp(
-                    pg_cur=cur,
-                    table_name="tmp_bp_marca_barrio",
-                    schema_dict=TMP_SCHEMA_MARCA_BARRIO,
-                    query=SQL_QUERY_MARCA_BARRIO,
-                    task_logger=task_logger,
-                    chunk_size=READ_CHUNK_SIZE,
-                )
-                sql_chunks += chunks
-
-                _, chunks = load_sqlserver_query_into_pg_temp(
-                    pg_cur=cur,
-                    table_name="tmp_bp_sucursales_excluidas",
-                    schema_dict=TMP_SCHEMA_SUC_EXCLUIDAS,
-                    query=SQL_QUERY_SUC_EXCLUIDAS,
-                    task_logger=task_logger,
-                    chunk_size=1000,
-                )
-                sql_chunks += chunks
-
-                crear_indices_temporales(cur)
+            sql_chunks = refrescar_caches_hibrida(conn, task_logger, full_refresh=cache_full_refresh)
 
-                cur.execute(f"DROP TABLE IF EXISTS {table_destino} CASCADE")
-                cur.execute(create_table_statement(ESQUEMA_BASE_PRODUCTOS, table_destino))
-                task_logger.info("Tabla destino recreada en modo hybrid: %s", table_destino)
+            with conn.cursor() as cur:
+                cur.execute(f"DROP TABLE IF EXISTS {table_carga}")
+                cur.execute(create_table_statement(ESQUEMA_BASE_PRODUCTOS, table_carga))
+                task_logger.info("Tabla sombra recreada en modo hybrid: %s", table_carga)
 
+                cur.execute(f"DROP TABLE IF EXISTS {TMP_TABLE_RESULTADO}")
+                cur.execute(create_temp_table_statement(ESQUEMA_BASE_PRODUCTOS, TMP_TABLE_RESULTADO))
                 cur.execute(
                     PG_INSERT_BASE_PRODUCTOS_HYBRID_TEMPLATE.format(
-                        table_name=table_destino,
+                        table_name=TMP_TABLE_RESULTADO,
+                        surtido_table=CACHE_TABLE_SURTIDO,
+                        hist_vigencia_table=CACHE_TABLE_HIST_VIGENCIA,
+                        marca_barrio_table=CACHE_TABLE_MARCA_BARRIO,
+                        sucursales_excluidas_table=CACHE_TABLE_SUC_EXCLUIDAS,
                     )
                 )
-                inserted_rows = cur.rowcount if cur.rowcount is not None else 0
+                source_rows = cur.rowcount if cur.rowcount is not None else 0
+                inserted_rows = insert_deduplicated(
+                    cur,
+                    source_table=TMP_TABLE_RESULTADO,
+                    target_table=table_carga,
+                    columns=list(ESQUEMA_BASE_PRODUCTOS),
+                    key_columns=DEDUP_KEY_COLUMNS,
+                    order_by=DEDUP_ORDER_BY,
+                )
+                duplicate_rows = source_rows - inserted_rows
+                if duplicate_rows:
+                    task_logger.warning(
+                        "El origen hybrid trajo filas duplicadas por clave | tabla_destino=%s | descartadas=%s",
+                        table_destino,
+                        duplicate_rows,
+                    )
 
             conn.commit()
         except Exception:
             conn.rollback()
             task_logger.exception(
                 "Se revirtió la transacción de carga hybrid sobre %s",
-                table_destino,
+                table_carga,
             )
             raise
 
+        publish_shadow_table(conn, table_destino, table_carga, logger=task_logger)
+
     elapsed = perf_counter() - started_at
     task_logger.info(
-        "Carga hybrid finalizada | tabla_destino=%s | filas=%s | chunks_sqlserver=%s | duracion=%.2fs",
+        "Carga hybrid finalizada | tabla_destino=%s | filas=%s | chunks_sqlserver=%s | duplicados_origen=%s | duracion=%.2fs",
         table_destino,
         inserted_rows,
         sql_chunks,
+        duplicate_rows,
         elapsed,
     )
-    return {"rows": inserted_rows, "chunks": sql_chunks, "seconds": elapsed}
+    return {"rows": inserted_rows, "chunks": sql_chunks, "seconds": elapsed, "duplicates": duplicate_rows}
 
 
 @task(name="cargar_base_productos_pg")
 def cargar_base_productos(
     source_mode: str = DEFAULT_BASE_PRODUCTOS_SOURCE_MODE,
     table_destino: str = DEFAULT_TABLE_DESTINO,
+    cache_full_refresh: bool = False,
 ):
     task_logger = get_run_logger()
     table_destino = assert_sql_table_name(table_destino)
@@ -546,6 +684,21 @@ def cargar_base_productos(
             SP_NAME,
             table_destino,
         )
+        if PARTITION_WORKERS > 1:
+            return replace_table_from_partitioned_query(
+                query=f"EXEC {SP_NAME} @C_SUCU_EMPR = ?",
+                partition_values=fetch_partition_values(sql_engine, SQL_QUERY_SUCURSALES_PARTICION),
+                sql_engine=sql_engine,
+                pg_conn_factory=open_pg_conn_local,
+                table_name=table_destino,
+                schema_dict=ESQUEMA_BASE_PRODUCTOS,
+                transform_chunk=transformar_chunk,
+                logger=task_logger, # pyright: ignore[reportArgumentType]
+                read_chunk_size=READ_CHUNK_SIZE,
+                max_workers=PARTITION_WORKERS,
+                dedup_key=DEDUP_KEY_COLUMNS,
+                dedup_order_by=DEDUP_ORDER_BY,
+            )
         return replace_table_from_query_chunks(
             query=f"EXEC {SP_NAME}",
             sql_engine=sql_engine,
@@ -555,6 +708,9 @@ def cargar_base_productos(
             transform_chunk=transformar_chunk,
             logger=task_logger, # pyright: ignore[reportArgumentType]
             read_chunk_size=READ_CHUNK_SIZE,
+            load_strategy="shadow_swap",
+            dedup_key=DEDUP_KEY_COLUMNS,
+            dedup_order_by=DEDUP_ORDER_BY,
         )
 
     if source_mode == "hybrid_src":
@@ -562,7 +718,7 @@ def cargar_base_productos(
             "Carga base_productos_vigentes en modo hybrid_src | src=PostgreSQL + remanentes SQL Server | tabla_destino=%s",
             table_destino,
         )
-        return cargar_base_productos_hibrida_impl(task_logger, table_destino)
+        return cargar_base_productos_hibrida_impl(task_logger, table_destino, cache_full_refresh)
 
     raise ValueError(
         "BASE_PRODUCTOS_SOURCE_MODE / mode invalido. Valores soportados: "
@@ -570,66 +726,30 @@ def cargar_base_productos(
     )
 
 
-@task(name="eliminar_duplicados_base_productos_vigentes")
-def eliminar_duplicados(table_destino: str = DEFAULT_TABLE_DESTINO):
-    task_logger = get_run_logger()
-    table_destino = assert_sql_table_name(table_destino)
-    query_delete_returning = f"""
-        WITH cte AS (
-            SELECT ctid,
-                   ROW_NUMBER() OVER (
-                       PARTITION BY c_sucu_empr, c_articulo, c_proveedor_primario
-                       ORDER BY fecha_extraccion DESC NULLS LAST
-                   ) AS rn
-            FROM {table_destino}
-        )
-        DELETE FROM {table_destino} b
-        USING cte
-        WHERE b.ctid = cte.ctid
-          AND cte.rn > 1
-        RETURNING 1;
-    """
-
-    try:
-        with open_pg_conn_local() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query_delete_returning)
-                eliminados = cur.rowcount
-            conn.commit()
-        task_logger.info(
-            "Depuración completada en %s | duplicados_eliminados=%s",
-            table_destino,
-            eliminados,
-        )
-        return eliminados
-    except Exception as exc:
-        task_logger.error("Error al eliminar duplicados: %s", exc)
-        raise
-
-
 @flow(name="obtener_base_productos_vigentes", persist_result=False)
 def capturar_base_articulos(
     source_mode: str = DEFAULT_BASE_PRODUCTOS_SOURCE_MODE,
     table_destino: str = DEFAULT_TABLE_DESTINO,
+    cache_full_refresh: bool = False,
 ):
     flow_logger = get_run_logger()
     table_destino = assert_sql_table_name(table_destino)
     try:
         load_result = cargar_base_productos.with_options(
             name="Carga Base Productos Vigentes",
-        ).submit(source_mode=source_mode, table_destino=table_destino).result()
-
-        deleted_rows = eliminar_duplicados.with_options(
-            name="Eliminar Duplicados Base Productos Vigentes",
-        ).submit(table_destino=table_destino).result()
+        ).submit(
+            source_mode=source_mode,
+            table_destino=table_destino,
+            cache_full_refresh=cache_full_refresh,
+        ).result()
 
         flow_logger.info(
-            "Flujo completado | tabla=%s | modo=%s | filas=%s | chunks=%s | duplicados_eliminados=%s | duracion_carga=%.2fs",
+            "Flujo completado | tabla=%s | modo=%s | filas=%s | chunks=%s | duplicados_origen=%s | duracion_carga=%.2fs",
             table_destino,
             source_mode,
             load_result["rows"],
             load_result["chunks"],
-            deleted_rows,
+            load_result["duplicates"],
             load_result["seconds"],
         )
     except Exception as exc:
@@ -640,6 +760,10 @@ def capturar_base_articulos(
 if __name__ == "__main__":
     args = sys.argv[1:]
     payload = ast.literal_eval(args[0]) if args else None
-    source_mode, table_destino = resolve_runtime_options(payload)
-    capturar_base_articulos(source_mode=source_mode, table_destino=table_destino)
+    source_mode, table_destino, cache_full_refresh = resolve_runtime_options(payload)
+    capturar_base_articulos(
+        source_mode=source_mode,
+        table_destino=table_destino,
+        cache_full_refresh=cache_full_refresh,
+    )
     logger.info("Proceso finalizado: obtener_base_productos_vigentes")
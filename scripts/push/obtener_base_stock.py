@@ -15,9 +15,12 @@ from etl_chunk_utils import (
     coerce_float_column,
     coerce_int_column,
     coerce_string_column,
+    fetch_partition_values,
     open_pg_conn,
+    replace_table_from_partitioned_query,
     replace_table_from_query_chunks,
     setup_script_logger,
+    sync_table_delta_from_query,
 )
 
 
@@ -37,6 +40,17 @@ PG_PASSWORD = os.getenv("PG_PASSWORD")
 SP_NAME = "[dbo].[SP_BASE_STOCK_EXTEND]"
 TABLE_DESTINO = "src.base_stock_sucursal"
 READ_CHUNK_SIZE = int(os.getenv("ETL_CHUNK_SIZE_BASE_STOCK", "20000"))
+# "stream" copia las filas de pyodbc directo a COPY; "pandas" usa transformar_chunk.
+LOAD_ENGINE = os.getenv("ETL_ENGINE_BASE_STOCK", "stream")
+# Lectura de SQL Server en un hilo aparte, solapada con el COPY (opt-in).
+OVERLAP_IO = os.getenv("ETL_OVERLAP_IO_BASE_STOCK", "0") == "1"
+# Con mas de 1 worker se ejecuta el SP por sucursal (@C_SUCU_EMPR) en paralelo.
+PARTITION_WORKERS = int(os.getenv("ETL_PARTITION_WORKERS_BASE_STOCK", "1"))
+SQL_QUERY_SUCURSALES_PARTICION = "SELECT DISTINCT C_SUCU_EMPR FROM repl.T100_EMPRESA_SUC ORDER BY C_SUCU_EMPR"
+# "full" reconstruye la tabla; "delta" aplica solo altas/cambios/bajas por hash de fila.
+LOAD_MODE = os.getenv("ETL_MODE_BASE_STOCK", "full").strip().lower()
+DELTA_KEY_COLUMNS = ("codigo_articulo", "codigo_sucursal")
+DELTA_HASH_EXCLUDE = ("fecha_extraccion", "estado_sincronizacion")
 
 logger = setup_script_logger(
     "obtener_base_stock",
@@ -167,18 +181,73 @@ def transformar_chunk(df, chunk_index, task_logger):
     return df
 
 
+def listar_sucursales_particion():
+    # Mismo universo que el INNER JOIN del SP contra repl.T100_EMPRESA_SUC.
+    return fetch_partition_values(sql_engine, SQL_QUERY_SUCURSALES_PARTICION)
+
+
+def constantes_base_stock():
+    return {
+        "fuente_origen": "SP_BASE_STOCK_DMZ",
+        "fecha_extraccion": datetime.now(),
+        "estado_sincronizacion": 0,
+    }
+
+
 @task(name="cargar_base_stock_sucursal_pg")
 def cargar_base_stock_sucursal_pg():
     task_logger = get_run_logger()
+    if LOAD_MODE == "delta":
+        return sync_table_delta_from_query(
+            query=f"EXEC {SP_NAME}",
+            sql_engine=sql_engine,
+            pg_conn_factory=open_pg_conn_local,
+            table_name=TABLE_DESTINO,
+            schema_dict=ESQUEMA_BASE_STOCK,
+            key_columns=DELTA_KEY_COLUMNS,
+            logger=task_logger,
+            read_chunk_size=READ_CHUNK_SIZE,
+            constant_values=constantes_base_stock(),
+            strip_columns=("lote",),
+            hash_exclude=DELTA_HASH_EXCLUDE,
+            overlap_io=OVERLAP_IO,
+        )
+
+    if PARTITION_WORKERS > 1:
+        return replace_table_from_partitioned_query(
+            query=f"EXEC {SP_NAME} @C_SUCU_EMPR = ?",
+            partition_values=listar_sucursales_particion(),
+            sql_engine=sql_engine,
+            pg_conn_factory=open_pg_conn_local,
+            table_name=TABLE_DESTINO,
+            schema_dict=ESQUEMA_BASE_STOCK,
+            logger=task_logger,
+            read_chunk_size=READ_CHUNK_SIZE,
+            constant_values=constantes_base_stock(),
+            strip_columns=("lote",),
+            max_workers=PARTITION_WORKERS,
+        )
+
+    if LOAD_ENGINE == "stream":
+        engine_options = {
+            "constant_values": constantes_base_stock(),
+            "strip_columns": ("lote",),
+        }
+    else:
+        engine_options = {"transform_chunk": transformar_chunk}
+
     metrics = replace_table_from_query_chunks(
         query=f"EXEC {SP_NAME}",
         sql_engine=sql_engine,
         pg_conn_factory=open_pg_conn_local,
         table_name=TABLE_DESTINO,
         schema_dict=ESQUEMA_BASE_STOCK,
-        transform_chunk=transformar_chunk,
         logger=task_logger,
         read_chunk_size=READ_CHUNK_SIZE,
+        engine=LOAD_ENGINE,
+        overlap_io=OVERLAP_IO,
+        load_strategy="shadow_swap",
+        **engine_options,
     )
     return metrics
 
@@ -221,7 +290,7 @@ WITH despachos_cd AS (
     HAVING SUM(s.transfer_pendiente) > 0
 )
 UPDATE src.base_stock_sucursal AS s
-SET transfer_pendiente = s.transfer_pendiente + d.despachos
+SET transfer_pendiente = s.transfer_pendiente + d.despachos{reset_hash}
 FROM despachos_cd AS d
 WHERE s.codigo_articulo = d.codigo_articulo
   AND s.codigo_sucursal = %s;
@@ -232,10 +301,13 @@ WHERE s.codigo_articulo = d.codigo_articulo
 def ajustar_transferencias_cd(mapeo_cd=(("41CD", 41), ("82CD", 82))):
     task_logger = get_run_logger()
     total_afectadas = 0
+    # En modo delta el ajuste invalida row_hash: la proxima corrida vuelve a traer la
+    # fila sin ajustar desde el SP y el ajuste no se aplica dos veces.
+    ajuste_sql = AJUSTE_SQL.format(reset_hash=", row_hash = NULL" if LOAD_MODE == "delta" else "")
     try:
         with open_pg_conn_local() as conn, conn.cursor() as cur:
             for cod_cd, sucursal_cd in mapeo_cd:
-                cur.execute(AJUSTE_SQL, (cod_cd, sucursal_cd))
+                cur.execute(ajuste_sql, (cod_cd, sucursal_cd))
                 afectadas = cur.rowcount if cur.rowcount is not None else 0
                 total_afectadas += afectadas
                 task_logger.info(